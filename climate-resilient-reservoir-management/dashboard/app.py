@@ -1,17 +1,38 @@
 import dash
-from dash import dcc, html, Input, Output, State, callback_context
+from dash import dcc, html, Input, Output, State, Patch, ClientsideFunction, callback, clientside_callback, callback_context
 import pandas as pd
-import plotly.express as px
-from sklearn.linear_model import LinearRegression
+import plotly.graph_objects as go
 import numpy as np
-import requests
 import json
 import os
+import sys
+import time
+from collections import namedtuple
 from datetime import datetime
+from functools import lru_cache
 from dotenv import load_dotenv
 
+# Import time is the first entry of the startup report
+IMPORT_STARTED = time.perf_counter()
+
+# The typed data store lives with the processing scripts
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts'))
+from store import read_table
+from climate_summary import month_lookup, precipitation_mm
+from raw_formats import SEA_ICE_AIR
+from scenarios import simulate_scenarios
+from model_registry import REGISTRY as MODEL_REGISTRY
+from model_artifacts import artifact_pattern, load_model_artifact
+from sites import DEFAULT_RESERVOIR, reservoir, scenario_model_name
+
 # Import layout components
 from layout import create_layout
+from series_pyramid import SeriesPyramid, BASIN_SERIES
+from scenario_table import build_scenario_table, prune_scenario_tables
+from llm_client import LLMClient, JobQueue
+from response_cache import ResponseCache, scenario_key
+from chat_sessions import ChatSessionStore
+from startup import Lazy, record_time, startup_report, run_in_background
 
 # Load environment variables from .env file
 load_dotenv()
@@ -20,13 +41,14 @@ load_dotenv()
 if not os.path.exists('assets'):
     os.makedirs('assets')
 
-# Create a bot icon file (only if it doesn't exist)
-bot_icon_path = os.path.join('assets', 'bot-icon.png')
-if not os.path.exists(bot_icon_path):
+def ensure_bot_icon():
+    """Draw a placeholder bot icon if there isn't one; PIL is only imported when it's needed"""
+    bot_icon_path = os.path.join('assets', 'bot-icon.png')
+    if os.path.exists(bot_icon_path):
+        return
     # This is a minimal effort to create a placeholder icon
     # Ideally, you would use a real icon file
     try:
-        import numpy as np
         from PIL import Image, ImageDraw
         
         # Create a simple bot icon
@@ -45,134 +67,133 @@ if not os.path.exists(bot_icon_path):
     except ImportError:
         print("Could not create bot icon. Please place a bot-icon.png file in the assets folder.")
 
-# Generate mock climate data for each month if needed
-def get_climate_data_for_month(month):
-    """Generate realistic climate data for a given month"""
-    # Parse month string (format: YYYY-MM)
+# Datasets that failed to load, by store table; the production /ready endpoint reports them
+LOAD_ERRORS = {}
+
+# Store tables are loaded on first use, or ahead of it by warm_up() on a background thread,
+# so importing this module and binding the server never wait for them
+PrecipitationData = namedtuple('PrecipitationData', ['pyramid', 'months'])
+
+def load_precipitation():
+    """
+    Daily/weekly/monthly precipitation levels and the month list for the dropdown.
+    There is no stand-in: if the table is missing the graph is empty and /ready reports the error.
+    """
     try:
-        year, month_num = map(int, month.split('-'))
-        month_name = datetime(year, month_num, 1).strftime('%B')
-    except:
-        month_name = "Unknown"
-        month_num = 1
-    
-    # Temperature data (seasonal variations)
-    base_temp = 15  # Base temperature in Celsius
-    season_variation = {
-        1: -5, 2: -4, 3: -2, 4: 2, 5: 5, 6: 8,
-        7: 10, 8: 9, 9: 5, 10: 0, 11: -3, 12: -5
-    }
-    
-    avg_temp = base_temp + season_variation.get(month_num, 0)
-    max_temp = avg_temp + np.random.uniform(3, 8)
-    min_temp = avg_temp - np.random.uniform(3, 8)
-    
-    # Precipitation data (seasonal variations)
-    base_precip = 50  # Base precipitation in mm
-    precip_variation = {
-        1: 1.2, 2: 1.1, 3: 1.3, 4: 1.4, 5: 1.2, 6: 0.8,
-        7: 0.6, 8: 0.7, 9: 0.9, 10: 1.1, 11: 1.3, 12: 1.4
-    }
-    
-    total_precip = base_precip * precip_variation.get(month_num, 1) * np.random.uniform(0.8, 1.2)
-    rainy_days = int(np.random.normal(10, 3))
-    rainy_days = max(1, min(30, rainy_days))  # Keep between 1 and 30
-    avg_daily_precip = total_precip / rainy_days if rainy_days > 0 else 0
-    
-    # Humidity and Wind
-    humidity = int(np.random.normal(70, 10))
-    humidity = max(30, min(100, humidity))  # Keep between 30 and 100
-    wind_speed = np.random.uniform(5, 15)
-    
+        df_precip = read_table('precip', columns=['STATION', 'DATE', 'PRCP'])
+        # 'DATE' is already a datetime in the store
+        df_precip['Precipitation'] = precipitation_mm(df_precip['PRCP'])
+    except Exception as e:
+        print(f"Error loading precipitation data: {e}")
+        LOAD_ERRORS['precip'] = str(e)
+        df_precip = pd.DataFrame({'STATION': pd.Series(dtype=str), 'DATE': pd.Series(dtype='datetime64[ns]'),
+                                  'Precipitation': pd.Series(dtype=np.float32)})
+
+    # Daily/weekly/monthly levels per station and for the basin, so any date range is one slice
+    pyramid = SeriesPyramid(df_precip)
+    return PrecipitationData(pyramid, pyramid.months())
+
+def load_climate_by_month():
+    """Monthly basin-wide climate summary, precomputed by data_processing.py ('climate_monthly')"""
+    try:
+        return month_lookup(read_table('climate_monthly'))
+    except Exception as e:
+        print(f"Error loading monthly climate summary: {e}")
+        LOAD_ERRORS['climate_monthly'] = str(e)
+        return {}
+
+def anomaly_lookup(temperature):
+    """{'YYYY-MM': global anomaly (°C)} from the air-temperature section of the Berkeley Earth table"""
+    air = temperature[temperature['SeaIce'] == SEA_ICE_AIR].dropna(subset=['Anomaly'])
+    return {f"{year}-{month:02d}": float(anomaly)
+            for year, month, anomaly in zip(air['Year'], air['Month'], air['Anomaly'])}
+
+def load_temperature_anomalies():
+    """
+    Global temperature anomalies, parsed once from the Berkeley Earth workbook by data_processing.py.
+    There is no stand-in: if the table is missing the chatbot leaves the anomaly out.
+    """
+    try:
+        return anomaly_lookup(read_table('temperature', columns=['SeaIce', 'Year', 'Month', 'Anomaly']))
+    except Exception as e:
+        print(f"Error loading temperature anomalies: {e}")
+        LOAD_ERRORS['temperature'] = str(e)
+        return {}
+
+PRECIPITATION = Lazy('precipitation', load_precipitation)
+CLIMATE_BY_MONTH = Lazy('climate_monthly', load_climate_by_month)
+TEMPERATURE_ANOMALY_BY_MONTH = Lazy('temperature', load_temperature_anomalies)
+
+def format_temperature(celsius):
+    # Stations without temperature sensors leave the month's temperatures missing
+    if celsius is None or np.isnan(celsius):
+        return "not recorded"
+    return f"{celsius:.1f}°C ({celsius * 1.8 + 32:.1f}°F)"
+
+def get_climate_data_for_month(month):
+    """Observed basin-wide climate for a 'YYYY-MM' month, or None if the month isn't in the data"""
+    row = CLIMATE_BY_MONTH.get().get(month)
+    if row is None:
+        return None
     return {
-        "month": month_name,
-        "year": year,
+        "month": datetime(int(row['year']), int(row['month']), 1).strftime('%B'),
+        "year": int(row['year']),
         "temperature": {
-            "average": avg_temp,
-            "max": max_temp,
-            "min": min_temp
+            "average": row['tavg_c'],
+            "max": row['tmax_c'],
+            "min": row['tmin_c']
         },
         "precipitation": {
-            "total": total_precip,
-            "rainy_days": rainy_days,
-            "average_daily": avg_daily_precip
+            "total": row['precip_total_mm'],
+            "rainy_days": int(row['rainy_days']),
+            "average_daily": row['precip_total_mm'] / row['observed_days'] if row['observed_days'] else 0.0
         },
-        "humidity": humidity,
-        "wind_speed": wind_speed
+        "global_anomaly": TEMPERATURE_ANOMALY_BY_MONTH.get().get(month),
     }
 
-# Load the cleaned precipitation data
-try:
-    df_precip = pd.read_csv('data/processed/precip_clean.csv')
-    # Clean up the data
-    # Convert 'DATE' to datetime and extract 'Month'
-    df_precip['DATE'] = pd.to_datetime(df_precip['DATE'], errors='coerce')
-    df_precip['Month'] = df_precip['DATE'].dt.to_period('M').astype(str)
-    df_precip['Precipitation'] = df_precip['PRCP'] / 10.0  # Convert tenths of mm to mm if needed
-except Exception as e:
-    print(f"Error loading precipitation data: {e}")
-    # Create mock data if the file doesn't exist
-    df_precip = pd.DataFrame({
-        'DATE': pd.date_range(start='2022-01-01', end='2023-12-31'),
-        'PRCP': np.random.uniform(0, 100, size=730),  # 2 years of daily data
-    })
-    df_precip['DATE'] = pd.to_datetime(df_precip['DATE'], errors='coerce')
-    df_precip['Month'] = df_precip['DATE'].dt.to_period('M').astype(str)
-    df_precip['Precipitation'] = df_precip['PRCP'] / 10.0
-
-# Ensure we have more than one month in the dropdown
-# This might be the issue - let's make sure we have unique months
-unique_months = sorted(df_precip['Month'].unique())
-print(f"Number of unique months: {len(unique_months)}")
-print(f"Example months: {unique_months[:5]}")
-
-# If there aren't enough months in the data, let's create some mock months
-if len(unique_months) <= 1:
-    # Generate a range of months for 2022-2023
-    all_months = []
-    for year in [2022, 2023]:
-        for month in range(1, 13):
-            all_months.append(f"{year}-{month:02d}")
-    unique_months = all_months
-
-# Load the climate projections dataset
-try:
-    climate_df = pd.read_csv('data/processed/temperature_clean.csv', delimiter=',', comment='%')
-    
-    # Clean up the data
-    climate_df.dropna(how='all', inplace=True)
-    climate_df.columns = ['Percent', 'Year', 'Month', 'Anomaly_1', 'Unc_1', 'Anomaly_2', 'Unc_2',
-                        'Anomaly_3', 'Unc_3', 'Anomaly_4', 'Unc_4', 'Anomaly_5', 'Unc_5']
-    climate_df.dropna(subset=['Anomaly_1', 'Year'], inplace=True)
-    climate_df['Anomaly_1'] = climate_df['Anomaly_1'].astype(float)
-except Exception as e:
-    print(f"Error loading temperature data: {e}")
-    # Create mock data if the file doesn't exist
-    climate_df = pd.DataFrame({
-        'Year': np.repeat(range(2022, 2024), 12),
-        'Month': np.tile(range(1, 13), 2),
-        'Anomaly_1': np.random.uniform(-2, 2, size=24)
-    })
+def format_climate_data(climate_data):
+    """Plain-text monthly climate summary for the chatbot system message"""
+    temperature = climate_data['temperature']
+    precipitation = climate_data['precipitation']
+    anomaly = climate_data['global_anomaly']
+    anomaly_line = "not available" if anomaly is None else f"{anomaly:+.2f}°C relative to 1951-1980"
+    return f"""
+                For {climate_data['month']} {climate_data['year']} (observed, basin-wide):
+                
+                Temperature:
+                - Average temperature: {format_temperature(temperature['average'])}
+                - Maximum temperature: {format_temperature(temperature['max'])}
+                - Minimum temperature: {format_temperature(temperature['min'])}
+                - Global temperature anomaly (Berkeley Earth): {anomaly_line}
+                
+                Precipitation:
+                - Total precipitation: {precipitation['total']:.1f} mm ({precipitation['total']/25.4:.2f} in)
+                - Number of rainy days: {precipitation['rainy_days']}
+                - Average daily precipitation: {precipitation['average_daily']:.2f} mm ({precipitation['average_daily']/25.4:.3f} in)
+                """
 
 # Check first in environment variables, then in .env file
 GROQ_API_KEY = os.environ.get('GROQ_API_KEY', '')
 if not GROQ_API_KEY:
     print("Warning: GROQ_API_KEY not found in environment variables. Checking .env file...")
 
-GROQ_API_URL = "https://api.groq.com/openai/v1/chat/completions"
+# Pooled keep-alive client with timeouts and retries; chat requests run on CHAT_JOBS threads
+LLM_CLIENT = LLMClient()
+CHAT_JOBS = JobQueue()
 
-def get_groq_response(messages):
-    """Get a response from the Groq API"""
-    api_key = os.environ.get('GROQ_API_KEY', '')
-    
-    if not api_key:
-        return "API key not found. Please check your .env file contains a GROQ_API_KEY value."
-    
-    headers = {
-        "Authorization": f"Bearer {api_key}",
-        "Content-Type": "application/json"
-    }
-    
+GROQ_MODEL = "llama3-8b-8192"  # You can change to other Groq models
+
+# Replies keyed on the normalized question, month, rounded sliders and model. Set
+# CHAT_CACHE_DB to a SQLite path to share the cache between worker processes.
+RESPONSE_CACHE = ResponseCache(db_path=os.environ.get('CHAT_CACHE_DB'))
+
+# Conversation history per browser session, windowed to a token budget before each request
+CHAT_SESSIONS = ChatSessionStore()
+
+API_KEY_MISSING_MESSAGE = "API key not found. Please check your .env file contains a GROQ_API_KEY value."
+
+def build_groq_payload(messages):
+    """Build the chat-completions payload, enriching the system message with climate data if asked for"""
     # Get the user's last message content
     user_message = ""
     for msg in messages:
@@ -192,149 +213,331 @@ def get_groq_response(messages):
             if "Currently selected month:" in content:
                 selected_month = content.split("Currently selected month:")[1].split("\n")[0].strip()
     
-    # If asking about climate data and we have a month, include that in our response
-    if month_mentioned and selected_month:
-        # Generate some realistic climate data for the month
-        climate_data = get_climate_data_for_month(selected_month)
-        
+    # If asking about climate data and we have that month's summary, include it in our response
+    climate_data = get_climate_data_for_month(selected_month) if month_mentioned and selected_month else None
+    if climate_data:
         # Add this to the system message
         enriched_system_message = None
         for i, msg in enumerate(messages):
             if msg["role"] == "system":
-                climate_info = f"""
-                For {climate_data['month']} {climate_data['year']}:
-                
-                Temperature:
-                - Average temperature: {climate_data['temperature']['average']:.1f}°C ({(climate_data['temperature']['average']*1.8+32):.1f}°F)
-                - Maximum temperature: {climate_data['temperature']['max']:.1f}°C ({(climate_data['temperature']['max']*1.8+32):.1f}°F)
-                - Minimum temperature: {climate_data['temperature']['min']:.1f}°C ({(climate_data['temperature']['min']*1.8+32):.1f}°F)
-                
-                Precipitation:
-                - Total precipitation: {climate_data['precipitation']['total']:.1f} mm ({climate_data['precipitation']['total']/25.4:.2f} in)
-                - Number of rainy days: {climate_data['precipitation']['rainy_days']}
-                - Average daily precipitation: {climate_data['precipitation']['average_daily']:.2f} mm ({climate_data['precipitation']['average_daily']/25.4:.3f} in)
-                
-                Other climate indicators:
-                - Relative humidity: {climate_data['humidity']}%
-                - Wind speed: {climate_data['wind_speed']:.1f} km/h
-                """
+                climate_info = format_climate_data(climate_data)
                 
                 messages[i]["content"] += "\n\nClimate data that you should incorporate into your response: " + climate_info
                 enriched_system_message = messages[i]["content"]
                 break
     
     payload = {
-        "model": "llama3-8b-8192",  # You can change to other Groq models
+        "model": GROQ_MODEL,
         "messages": messages,
         "temperature": 0.7,
         "max_tokens": 800
     }
     
+    return payload
+
+def stream_groq_response(messages, cache_key=None):
+    """Yield the Groq reply as it is generated; a reply that completes is cached under `cache_key`"""
+    if not LLM_CLIENT.api_key:
+        yield API_KEY_MISSING_MESSAGE
+        return
+    
+    chunks = []
     try:
-        response = requests.post(GROQ_API_URL, headers=headers, json=payload)
-        response.raise_for_status()  # Raise an exception for HTTP errors
-        return response.json()["choices"][0]["message"]["content"]
+        for chunk in LLM_CLIENT.stream(build_groq_payload(messages)):
+            chunks.append(chunk)
+            yield chunk
     except Exception as e:
-        return f"Error communicating with Groq API: {str(e)}"
+        yield f"Error communicating with Groq API: {str(e)}"
+        return
+    # Only reached when the stream finished: errors and cancelled replies are never cached
+    if cache_key is not None:
+        RESPONSE_CACHE.put(cache_key, ''.join(chunks))
 
 # Decision Support System (DSS) Simulation function
 def simulate_scenario(precip_change, temp_increase, crop_area_increase, tech_adapt):
-    inflow_change = 100 + precip_change * 0.5
-    outflow_change = 100 - temp_increase * 1.2
-    demand_change = 200 + crop_area_increase * 0.8
-    tech_effect = 1 - (tech_adapt / 100)
-    demand_change *= tech_effect
-    storage_change = inflow_change - outflow_change - demand_change
-    return inflow_change, outflow_change, demand_change, storage_change
-
-# Machine learning predictive model function
-def predict_water_resources(precip_change, temp_increase, crop_area_increase, tech_adapt):
+    """One scenario through the vectorized engine in scripts/scenarios.py"""
+    result = simulate_scenarios(precip_change, temp_increase, crop_area_increase, tech_adapt)
+    return tuple(float(value) for value in result)
+
+# Machine learning predictive model, fitted once on first use and shared by all callbacks
+PREDICTOR_NAME = 'water-resources'
+
+def fit_water_resources_model():
+    """Fit the scenario -> storage regression used by the dashboard"""
+    # sklearn takes about a second to import; only pay for it when the fallback is needed
+    from sklearn.linear_model import LinearRegression
     model = LinearRegression()
     X_train = np.array([[10, 1.5, 5, 30], [20, 2.0, 6, 40], [30, 3.0, 7, 50]])
     y_train = np.array([120, 130, 140])
     model.fit(X_train, y_train)
-    X_new = np.array([[precip_change, temp_increase, crop_area_increase, tech_adapt]])
-    prediction = model.predict(X_new)
+    return model
+
+# The slider regression model_runner.py fits to the default reservoir's storage model replaces
+# the baseline fit when it appears. It loads on first prediction (warm_up() makes one ahead of
+# the first request).
+MODEL_REGISTRY.watch(PREDICTOR_NAME, artifact_pattern(scenario_model_name(DEFAULT_RESERVOIR)),
+                     loader=load_model_artifact, fallback_factory=fit_water_resources_model, lazy=True)
+
+def predict_water_resources_batch(scenarios):
+    """Predict storage for an (n, 4) array of (precip, temp, crop, tech) scenarios"""
+    return MODEL_REGISTRY.predict(PREDICTOR_NAME, scenarios)
+
+def predict_water_resources(precip_change, temp_increase, crop_area_increase, tech_adapt):
+    prediction = predict_water_resources_batch([[precip_change, temp_increase, crop_area_increase, tech_adapt]])
     return prediction[0]
 
-# Create Dash app
-app = dash.Dash(__name__)
-app.title = "Climate Resilient Reservoir Management"
+# Figures kept in memory, keyed on series and date window; zooming back to a view already seen is free
+FIGURE_CACHE_SIZE = 256
+# Quick zoom buttons on the precipitation graph; each one fetches the matching pyramid level
+RANGE_BUTTONS = [
+    {'count': 1, 'label': '1m', 'step': 'month', 'stepmode': 'backward'},
+    {'count': 6, 'label': '6m', 'step': 'month', 'stepmode': 'backward'},
+    {'count': 1, 'label': '1y', 'step': 'year', 'stepmode': 'backward'},
+    {'count': 5, 'label': '5y', 'step': 'year', 'stepmode': 'backward'},
+    {'step': 'all'},
+]
 
-# Set up the layout
-app.layout = create_layout(unique_months)
+def month_window(month):
+    """First and last day ('YYYY-MM-DD') of a 'YYYY-MM' month"""
+    first = pd.Period(month, freq='M')
+    return str(first.start_time.date()), str(first.end_time.date())
+
+@lru_cache(maxsize=FIGURE_CACHE_SIZE)
+def build_series_figure(series, start, end, revision):
+    """
+    Build (once) the precipitation figure for one series between two dates (None = open-ended).
 
-# Callback to update graph and show simulation results
-@app.callback(
+    The data comes from the pyramid level that fits the pixel budget, drawn with WebGL traces;
+    weekly and monthly levels show the mean with a min/max envelope so peaks stay visible.
+    """
+    level, points = PRECIPITATION.get().pyramid.query(series, start, end)
+    name = 'Basin average' if series == BASIN_SERIES else series
+    figure = go.Figure()
+    if level != 'daily':
+        figure.add_trace(go.Scattergl(x=points['dates'], y=points['max'], mode='lines', line={'width': 0},
+                                      showlegend=False, hoverinfo='skip'))
+        figure.add_trace(go.Scattergl(x=points['dates'], y=points['min'], mode='lines', line={'width': 0},
+                                      fill='tonexty', fillcolor='rgba(41, 128, 185, 0.25)', name=f'{level} min–max'))
+    figure.add_trace(go.Scattergl(x=points['dates'], y=points['mean'], mode='lines', line={'color': '#2980b9'},
+                                  name=name if level == 'daily' else f'{name} ({level} mean)'))
+    figure.update_layout(
+        title=f'{level.capitalize()} Precipitation: {name}' if len(points['dates']) else 'No Data Available',
+        yaxis_title='Precipitation (mm)',
+        xaxis={'rangeselector': {'buttons': RANGE_BUTTONS}},
+        # Keeps the user's zoom while the data under it is swapped for a finer level
+        uirevision=revision,
+    )
+    return figure
+
+# Every slider position precomputed once into a static asset for client-side lookup
+SCENARIO_TABLE = Lazy('scenario_table', lambda: build_scenario_table(predict_water_resources_batch))
+
+def build_page_layout():
+    precipitation = PRECIPITATION.get()
+    return create_layout(precipitation.months, SCENARIO_TABLE.get(), precipitation.pyramid.stations)
+
+PAGE_LAYOUT = Lazy('layout', build_page_layout)
+
+def init_app(app):
+    """Give a Dash app the dashboard's title and layout; the callbacks below attach to it on its first request"""
+    app.title = "Climate Resilient Reservoir Management"
+    # The layout is built from the data on first page load; callbacks are validated against
+    # the same components built without data, so init_app never waits for the store
+    app.validation_layout = create_layout([])
+    app.layout = PAGE_LAYOUT.get
+    return app
+
+def warm_up(month_figures=FIGURE_CACHE_SIZE):
+    """
+    Load everything the first requests would otherwise load on demand, then print the startup report.
+
+    Safe to run on a background thread while the server is already accepting requests:
+    a request that needs a value still being built waits for that value only.
+    """
+    started = time.perf_counter()
+    ensure_bot_icon()
+    for value in (PRECIPITATION, CLIMATE_BY_MONTH, TEMPERATURE_ANOMALY_BY_MONTH):
+        value.get()
+    # Load the watched models and run one prediction through each
+    predict_started = time.perf_counter()
+    predict_water_resources(0, 0, 0, 0)
+    record_time('models', predict_started)
+    PAGE_LAYOUT.get()
+    # Basin figures for each month are cached per process
+    figures_started = time.perf_counter()
+    for month in PRECIPITATION.get().months[:month_figures]:
+        build_series_figure(BASIN_SERIES, *month_window(month), f"{BASIN_SERIES}|{month}")
+    record_time('month_figures', figures_started)
+    record_time('warm_up', started)
+    print(f"Dashboard warm-up finished: {startup_report()}")
+    if LOAD_ERRORS:
+        print(f"Store tables that failed to load: {', '.join(LOAD_ERRORS)}")
+
+def prune_stale_assets():
+    """
+    Remove scenario table blobs from earlier builds. Only call this from the process that
+    built the table for every server process (the dev server, or the preloaded gunicorn master).
+    """
+    if not SCENARIO_TABLE.loaded:
+        return
+    removed = prune_scenario_tables(SCENARIO_TABLE.get())
+    if removed:
+        print(f"Removed stale scenario tables: {', '.join(removed)}")
+
+def warm_up_and_prune():
+    warm_up()
+    prune_stale_assets()
+
+# The figure only depends on the month, station and zoom, so slider moves never rebuild or resend it.
+# Zooming, panning or a range button re-queries the pyramid for the new window.
+@callback(
     [Output('precipitation-graph', 'figure'),
-     Output('simulation-results', 'children')],
+     Output('month-summary', 'children')],
     [Input('month-dropdown', 'value'),
-     Input('precip-slider', 'value'),
+     Input('station-dropdown', 'value'),
+     Input('precipitation-graph', 'relayoutData')]
+)
+def update_graph(selected_month, series, relayout):
+    triggered = callback_context.triggered[0]['prop_id'].split('.')[0] if callback_context.triggered else None
+    series = series or BASIN_SERIES
+    revision = f"{series}|{selected_month}"
+
+    if triggered == 'precipitation-graph':
+        relayout = relayout or {}
+        if 'xaxis.range[0]' in relayout:
+            start, end = relayout['xaxis.range[0]'][:10], relayout['xaxis.range[1]'][:10]
+        elif relayout.get('xaxis.autorange'):
+            start, end = None, None
+        else:
+            # Legend clicks, drag-mode changes and the like need no new data
+            return dash.no_update, dash.no_update
+        return build_series_figure(series, start, end, revision), dash.no_update
+
+    if not selected_month:
+        return build_series_figure(series, None, None, revision), None
+    start, end = month_window(selected_month)
+    return build_series_figure(series, start, end, revision), month_summary_text(selected_month)
+
+def month_summary_text(selected_month):
+    """One-line observed climate summary shown under the precipitation graph"""
+    climate_data = get_climate_data_for_month(selected_month)
+    if climate_data is None:
+        return "No observed climate summary for this month."
+    temperature = climate_data['temperature']
+    precipitation = climate_data['precipitation']
+    return (f"Basin-wide: {precipitation['total']:.1f} mm over {precipitation['rainy_days']} rainy days · "
+            f"mean {format_temperature(temperature['average'])}, "
+            f"max {format_temperature(temperature['max'])}, min {format_temperature(temperature['min'])}")
+
+# Simulation results are looked up in the browser (assets/scenario_table.js), so slider
+# moves never reach the server
+clientside_callback(
+    ClientsideFunction(namespace='scenarios', function_name='render'),
+    Output('simulation-results', 'children'),
+    [Input('precip-slider', 'value'),
      Input('temp-slider', 'value'),
      Input('crop-slider', 'value'),
-     Input('tech-slider', 'value')]
+     Input('tech-slider', 'value'),
+     Input('scenario-table', 'data')]
 )
-def update_graph_and_simulation(selected_month, precip_change, temp_increase, crop_area_increase, tech_adapt):
-    if not selected_month:
-        # Return empty figure and prompt message
-        return px.line(title='No Data Available'), html.Div("Please select a month to view data.")
 
-    try:
-        filtered_df = df_precip[df_precip['Month'] == selected_month]
-    except:
-        # If the month does not exist in the actual data, create mock data
-        # This is a temporary fix until the real data issue is resolved
-        dates = pd.date_range(start=selected_month, periods=30)
-        filtered_df = pd.DataFrame({
-            'DATE': dates,
-            'Precipitation': np.random.uniform(0, 10, size=len(dates))
-        })
-
-    if filtered_df.empty:
-        # Create mock data if no data found
-        dates = pd.date_range(start=selected_month, periods=30)
-        filtered_df = pd.DataFrame({
-            'DATE': dates,
-            'Precipitation': np.random.uniform(0, 10, size=len(dates))
-        })
-
-    fig = px.line(filtered_df, x='DATE', y='Precipitation',
-                  title=f'Daily Precipitation in {selected_month}',
-                  labels={'Precipitation': 'Precipitation (mm)'})
-
-    inflow, outflow, demand, storage = simulate_scenario(precip_change, temp_increase, crop_area_increase, tech_adapt)
-    predicted_storage = predict_water_resources(precip_change, temp_increase, crop_area_increase, tech_adapt)
-
-    simulation_message = html.Div([
-        html.H4("Simulation Results"),
-        html.P(f"Inflow Change: {inflow:.2f} m³"),
-        html.P(f"Outflow Change: {outflow:.2f} m³"),
-        html.P(f"Agricultural Water Demand: {demand:.2f} m³"),
-        html.P(f"Storage Change: {storage:.2f} m³"),
-        html.P(f"Predicted Storage Level: {predicted_storage:.2f} m³")
-    ])
-
-    return fig, simulation_message
-
-# Callback for the chatbot
-@app.callback(
+def user_message_bubble(text):
+    """User message (right-aligned)"""
+    return html.Div([
+        html.Div(
+            text,
+            style={
+                'display': 'inline-block',
+                'maxWidth': '80%',
+                'backgroundColor': '#4da6ff', 
+                'color': 'white',
+                'padding': '10px', 
+                'borderRadius': '10px', 
+                'marginLeft': 'auto',
+                'textAlign': 'left'
+            }
+        )
+    ], style={'display': 'flex', 'justifyContent': 'flex-end', 'marginBottom': '10px'})
+
+def assistant_message_bubble(text, msg_id=None):
+    """Assistant message (left-aligned with bot icon); feedback buttons once the reply is final"""
+    children = [
+        html.Img(src='/assets/bot-icon.png', style={'width': '30px', 'height': '30px', 'marginRight': '10px', 'verticalAlign': 'top'}),
+        html.Div(
+            text,
+            style={
+                'display': 'inline-block',
+                'maxWidth': '80%',
+                'backgroundColor': '#d5f5e3', 
+                'padding': '10px', 
+                'borderRadius': '10px'
+            }
+        )
+    ]
+    if msg_id is not None:
+        children.append(html.Div([
+            html.Button('👍', id=f'thumbs-up-{msg_id}', className='feedback-btn', n_clicks=0,
+                      style={'border': 'none', 'background': 'none', 'cursor': 'pointer', 'fontSize': '16px'}),
+            html.Button('👎', id=f'thumbs-down-{msg_id}', className='feedback-btn', n_clicks=0,
+                      style={'border': 'none', 'background': 'none', 'cursor': 'pointer', 'fontSize': '16px', 'marginLeft': '5px'})
+        ], style={'marginTop': '5px'}))
+    return html.Div(children, style={'marginBottom': '15px'})
+
+# Callback for the chatbot. Submitting starts a streaming upstream call and returns at once
+# with a placeholder; each 'chat-poll' tick shows the tokens received so far until the reply
+# is complete, so a slow LLM never holds a Dash worker. Submitting again cancels the stream.
+# History lives in CHAT_SESSIONS on the server: the browser only keeps the session ID, and
+# the conversation panel is updated with Patch operations carrying just the changed bubbles.
+@callback(
     [Output('chatbot-conversation', 'children'),
-     Output('chat-history', 'data'),
-     Output('chatbot-input', 'value')],
-    [Input('chatbot-submit', 'n_clicks')],
+     Output('chat-session', 'data'),
+     Output('chatbot-input', 'value'),
+     Output('chat-job', 'data'),
+     Output('chat-poll', 'disabled')],
+    [Input('chatbot-submit', 'n_clicks'),
+     Input('chat-poll', 'n_intervals')],
     [State('chatbot-input', 'value'),
-     State('chatbot-conversation', 'children'),
-     State('chat-history', 'data'),
+     State('chat-session', 'data'),
+     State('chat-job', 'data'),
      State('month-dropdown', 'value'),
      State('precip-slider', 'value'),
      State('temp-slider', 'value'),
      State('crop-slider', 'value'),
      State('tech-slider', 'value')]
 )
-def update_chatbot(n_clicks, input_text, conversation, chat_history, 
+def update_chatbot(n_clicks, n_intervals, input_text, session_id, job_id,
                    selected_month, precip_change, temp_increase, crop_area_increase, tech_adapt):
+    triggered = callback_context.triggered[0]['prop_id'].split('.')[0] if callback_context.triggered else None
+    conversation = Patch()
+
+    if triggered == 'chat-poll':
+        status, ai_response = CHAT_JOBS.poll(job_id) if job_id else ('missing', None)
+        if status == 'pending':
+            if not ai_response:
+                return dash.no_update, dash.no_update, dash.no_update, dash.no_update, False
+            # Show the tokens received so far
+            conversation[-1] = assistant_message_bubble(ai_response + " ▌")
+            return conversation, dash.no_update, dash.no_update, dash.no_update, False
+        if status == 'missing':
+            return dash.no_update, dash.no_update, dash.no_update, None, True
+
+        # Save AI response to history; its position doubles as the ID for the thumbs up/down buttons
+        msg_id = CHAT_SESSIONS.append(session_id, "assistant", ai_response)
+
+        # Replace the "thinking" placeholder with the reply
+        conversation[-1] = assistant_message_bubble(ai_response, msg_id)
+        return conversation, dash.no_update, dash.no_update, None, True
+
     if n_clicks == 0 or not input_text:
-        return conversation, chat_history, ""
+        return dash.no_update, dash.no_update, dash.no_update, job_id, not job_id
+
+    session_id = CHAT_SESSIONS.ensure(session_id)
+
+    if job_id:
+        # A new question cancels the reply still streaming; keep what arrived so far
+        partial_response = CHAT_JOBS.cancel(job_id) or ""
+        msg_id = CHAT_SESSIONS.append(session_id, "assistant", partial_response)
+        conversation[-1] = assistant_message_bubble(partial_response + " [stopped]", msg_id)
     
     # Get current simulation state
     current_state = f"""
@@ -347,10 +550,7 @@ def update_chatbot(n_clicks, input_text, conversation, chat_history,
     """
     
     # Append user message to chat history
-    if not chat_history:
-        chat_history = []
-    
-    chat_history.append({"role": "user", "content": input_text})
+    CHAT_SESSIONS.append(session_id, "user", input_text)
     
     # Add system message with context
     system_message = {
@@ -362,56 +562,104 @@ def update_chatbot(n_clicks, input_text, conversation, chat_history,
                    f"Keep responses conversational but data-driven. Format data points neatly if sharing numbers."
     }
     
-    # Get response from Groq
-    messages_for_api = [system_message] + chat_history
-    ai_response = get_groq_response(messages_for_api)
-    
-    # Save AI response to history
-    chat_history.append({"role": "assistant", "content": ai_response})
-    
-    # Create a unique ID for thumbs up/down buttons for this message
-    msg_id = len(chat_history)
-    
-    # Update the conversation UI - user message (right-aligned)
-    conversation.append(html.Div([
-        html.Div(
-            input_text,
-            style={
-                'display': 'inline-block',
-                'maxWidth': '80%',
-                'backgroundColor': '#4da6ff', 
-                'color': 'white',
-                'padding': '10px', 
-                'borderRadius': '10px', 
-                'marginLeft': 'auto',
-                'textAlign': 'left'
-            }
-        )
-    ], style={'display': 'flex', 'justifyContent': 'flex-end', 'marginBottom': '10px'}))
+    conversation.append(user_message_bubble(input_text))
+
+    # Repeated questions under the same scenario are answered from the cache without an upstream call
+    cache_key = scenario_key(input_text, selected_month, precip_change, temp_increase,
+                             crop_area_increase, tech_adapt, GROQ_MODEL)
+    cached_response = RESPONSE_CACHE.get(cache_key)
+    if cached_response is not None:
+        msg_id = CHAT_SESSIONS.append(session_id, "assistant", cached_response)
+        conversation.append(assistant_message_bubble(cached_response, msg_id))
+        return conversation, session_id, "", None, True
+
+    # Stream the Groq reply in the background; only a token-budgeted window of the history goes upstream
+    messages_for_api = [system_message] + CHAT_SESSIONS.window(session_id)
+    job_id = CHAT_JOBS.submit_stream(stream_groq_response, messages_for_api, cache_key)
     
-    # Assistant message (left-aligned with bot icon)
-    conversation.append(html.Div([
-        html.Img(src='/assets/bot-icon.png', style={'width': '30px', 'height': '30px', 'marginRight': '10px', 'verticalAlign': 'top'}),
-        html.Div(
-            ai_response,
-            style={
-                'display': 'inline-block',
-                'maxWidth': '80%',
-                'backgroundColor': '#d5f5e3', 
-                'padding': '10px', 
-                'borderRadius': '10px'
-            }
-        ),
-        html.Div([
-            html.Button('👍', id=f'thumbs-up-{msg_id}', className='feedback-btn', n_clicks=0,
-                      style={'border': 'none', 'background': 'none', 'cursor': 'pointer', 'fontSize': '16px'}),
-            html.Button('👎', id=f'thumbs-down-{msg_id}', className='feedback-btn', n_clicks=0,
-                      style={'border': 'none', 'background': 'none', 'cursor': 'pointer', 'fontSize': '16px', 'marginLeft': '5px'})
-        ], style={'marginTop': '5px'})
-    ], style={'marginBottom': '15px'}))
+    conversation.append(assistant_message_bubble("…"))
     
-    return conversation, chat_history, ""  # Clear the input field
+    return conversation, session_id, "", job_id, False  # Clear the input field and start polling
+
+# Monte Carlo ensembles run one at a time from this background queue, each in a process pool
+# of ENSEMBLE_WORKERS; half the cores by default so a run never starves the request threads
+ENSEMBLE_JOBS = JobQueue(max_workers=1)
+ENSEMBLE_WORKERS = int(os.environ.get('DASHBOARD_ENSEMBLE_WORKERS', max(1, (os.cpu_count() or 2) // 2)))
+ENSEMBLE_MEMBERS = 1000
+ENSEMBLE_YEARS = 10
+
+def stream_ensemble(scenario):
+    """Yield ensemble progress snapshots; a failure is yielded as {'error': message}"""
+    try:
+        # The simulator pulls in numba when it is installed; import it with the first run instead of at startup
+        from ensemble import run_ensemble
+        yield from run_ensemble(scenario, members=ENSEMBLE_MEMBERS, years=ENSEMBLE_YEARS, n_workers=ENSEMBLE_WORKERS)
+    except Exception as e:
+        yield {'error': str(e)}
+
+def build_fan_chart(progress):
+    """Fan chart of month-end storage: 5-95 and 25-75 percentile bands around the median"""
+    from ensemble import PERCENTILES
+    low, q1, median, q3, high = (progress.bands[p] for p in PERCENTILES)
+    months = list(progress.months)
+    figure = go.Figure()
+    for lower, upper, name, color in [(low, high, '5–95th percentile', 'rgba(41, 128, 185, 0.2)'),
+                                      (q1, q3, '25–75th percentile', 'rgba(41, 128, 185, 0.4)')]:
+        figure.add_trace(go.Scatter(x=months, y=upper, mode='lines', line={'width': 0},
+                                    showlegend=False, hoverinfo='skip'))
+        figure.add_trace(go.Scatter(x=months, y=lower, mode='lines', line={'width': 0},
+                                    fill='tonexty', fillcolor=color, name=name))
+    figure.add_trace(go.Scatter(x=months, y=median, mode='lines', line={'color': '#2c3e50'}, name='Median'))
+    figure.update_layout(title=f'Projected {reservoir(DEFAULT_RESERVOIR).name} Storage ({progress.done} of {progress.total} members)',
+                         yaxis_title='Storage (AF)', xaxis_title='Month')
+    return figure
+
+# Run the ensemble in the background and redraw the fan chart on each 'ensemble-poll' tick
+# as member chunks finish. Starting a new run cancels the one in flight.
+@callback(
+    [Output('ensemble-graph', 'figure'),
+     Output('ensemble-status', 'children'),
+     Output('ensemble-job', 'data'),
+     Output('ensemble-poll', 'disabled')],
+    [Input('ensemble-run', 'n_clicks'),
+     Input('ensemble-poll', 'n_intervals')],
+    [State('ensemble-job', 'data'),
+     State('precip-slider', 'value'),
+     State('temp-slider', 'value'),
+     State('crop-slider', 'value'),
+     State('tech-slider', 'value')]
+)
+def update_ensemble(n_clicks, n_intervals, job_id, precip_change, temp_increase, crop_area_increase, tech_adapt):
+    triggered = callback_context.triggered[0]['prop_id'].split('.')[0] if callback_context.triggered else None
+
+    if triggered == 'ensemble-poll':
+        status, progress = ENSEMBLE_JOBS.poll(job_id, latest=True) if job_id else ('missing', None)
+        if status == 'missing':
+            return dash.no_update, dash.no_update, None, True
+        if isinstance(progress, dict):
+            return dash.no_update, f"Ensemble failed: {progress['error']}", None, True
+        if progress is None:
+            if status == 'pending':
+                return dash.no_update, dash.no_update, job_id, False
+            return dash.no_update, "Ensemble produced no results.", None, True
+        if status == 'pending':
+            return build_fan_chart(progress), f"Running… {progress.done}/{progress.total} members", job_id, False
+        return build_fan_chart(progress), f"Done: {progress.total} members", None, True
+
+    if not n_clicks:
+        return dash.no_update, dash.no_update, job_id, not job_id
+
+    if job_id:
+        ENSEMBLE_JOBS.cancel(job_id, latest=True)
+    scenario = (precip_change or 0, temp_increase or 0, crop_area_increase or 0, tech_adapt or 0)
+    job_id = ENSEMBLE_JOBS.submit_stream(stream_ensemble, scenario)
+    return dash.no_update, "Starting ensemble…", job_id, False
+
+record_time('import_app', IMPORT_STARTED)
 
-# Run the app
+# Run the development server (see wsgi.py for production serving)
 if __name__ == '__main__':
+    app = init_app(dash.Dash(__name__))
+    # The server binds straight away; data, models and figures load alongside it
+    run_in_background(warm_up_and_prune)
     app.run(debug=True)
\ No newline at end of file
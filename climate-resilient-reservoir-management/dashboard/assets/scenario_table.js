@@ -0,0 +1,83 @@
+// Client-side lookup of the precomputed scenario table (see dashboard/scenario_table.py).
+// The blob is fetched once per URL; after that a slider move is just an array index.
+(function () {
+  const tables = {};
+
+  function loadTable(manifest) {
+    if (!tables[manifest.url]) {
+      tables[manifest.url] = fetch(manifest.url)
+        .then(function (response) {
+          // Any transfer compression has already been undone by the browser
+          return response.arrayBuffer();
+        })
+        .then(function (buffer) {
+          const arrays = {};
+          Object.entries(manifest.arrays).forEach(function ([name, spec]) {
+            const length = spec.shape.reduce(function (a, b) { return a * b; }, 1);
+            const View = spec.dtype === 'uint16' ? Uint16Array : Float32Array;
+            arrays[name] = new View(buffer, spec.byte_offset, length);
+          });
+          return arrays;
+        });
+    }
+    return tables[manifest.url];
+  }
+
+  function axisIndex(manifest, name, value) {
+    const [min, max, step] = manifest.axes[name];
+    const count = Math.round((max - min) / step) + 1;
+    return Math.min(count - 1, Math.max(0, Math.round(((value || 0) - min) / step)));
+  }
+
+  function predicted(manifest, arrays, idx) {
+    if (manifest.predictor.layout === 'additive') {
+      return arrays.predicted_precip_change[idx[0]] + arrays.predicted_temp_increase[idx[1]] +
+        arrays.predicted_crop_area_increase[idx[2]] + arrays.predicted_tech_adapt[idx[3]];
+    }
+    const shape = manifest.arrays.predicted.shape;
+    const flat = ((idx[0] * shape[1] + idx[1]) * shape[2] + idx[2]) * shape[3] + idx[3];
+    return arrays.predicted[flat] * manifest.predictor.scale + manifest.predictor.offset;
+  }
+
+  function paragraph(text) {
+    return {type: 'P', namespace: 'dash_html_components', props: {children: text}};
+  }
+
+  window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    scenarios: {
+      render: function (precip, temp, crop, tech, manifest) {
+        if (!manifest) {
+          return window.dash_clientside.no_update;
+        }
+        return loadTable(manifest).then(function (arrays) {
+          const idx = [
+            axisIndex(manifest, 'precip_change', precip),
+            axisIndex(manifest, 'temp_increase', temp),
+            axisIndex(manifest, 'crop_area_increase', crop),
+            axisIndex(manifest, 'tech_adapt', tech),
+          ];
+          const techCount = manifest.arrays.demand.shape[1];
+          const inflow = arrays.inflow[idx[0]];
+          const outflow = arrays.outflow[idx[1]];
+          const demand = arrays.demand[idx[2] * techCount + idx[3]];
+          const storage = inflow - outflow - demand;
+
+          return {
+            type: 'Div',
+            namespace: 'dash_html_components',
+            props: {
+              children: [
+                {type: 'H4', namespace: 'dash_html_components', props: {children: 'Simulation Results'}},
+                paragraph('Inflow Change: ' + inflow.toFixed(2) + ' m³'),
+                paragraph('Outflow Change: ' + outflow.toFixed(2) + ' m³'),
+                paragraph('Agricultural Water Demand: ' + demand.toFixed(2) + ' m³'),
+                paragraph('Storage Change: ' + storage.toFixed(2) + ' m³'),
+                paragraph('Predicted Storage Level: ' + predicted(manifest, arrays, idx).toFixed(2) + ' m³'),
+              ],
+            },
+          };
+        });
+      },
+    },
+  });
+})();
@@ -0,0 +1,109 @@
+import time
+import uuid
+import threading
+
+# Rough tokens-per-character ratio for English text with Llama-style tokenizers
+CHARS_PER_TOKEN = 4
+# Per-message overhead (role, separators) in the chat template
+MESSAGE_OVERHEAD_TOKENS = 4
+
+DEFAULT_HISTORY_TOKENS = 3000
+DEFAULT_SUMMARY_TOKENS = 400
+SUMMARY_WORDS_PER_TURN = 30
+DEFAULT_SESSION_TTL = 24 * 3600  # seconds
+DEFAULT_MAX_SESSIONS = 10000
+
+
+def estimate_tokens(text):
+    return len(text) // CHARS_PER_TOKEN + MESSAGE_OVERHEAD_TOKENS
+
+
+def summarize_turn(message):
+    """One-line extractive summary of a message: its first SUMMARY_WORDS_PER_TURN words"""
+    words = message['content'].split()
+    text = ' '.join(words[:SUMMARY_WORDS_PER_TURN]) + (' …' if len(words) > SUMMARY_WORDS_PER_TURN else '')
+    speaker = 'User asked' if message['role'] == 'user' else 'Assistant answered'
+    return f"- {speaker}: {text}"
+
+
+class ChatSessionStore:
+    """
+    Server-side chat history, looked up by a session ID kept in the browser.
+
+    The browser no longer round-trips the conversation. What goes upstream is a
+    token-budgeted window: the most recent turns that fit `history_tokens`, with
+    everything older folded into a short running summary capped at `summary_tokens`.
+    Idle sessions expire after `ttl` seconds.
+    """
+
+    def __init__(self, history_tokens=DEFAULT_HISTORY_TOKENS, summary_tokens=DEFAULT_SUMMARY_TOKENS,
+                 ttl=DEFAULT_SESSION_TTL, max_sessions=DEFAULT_MAX_SESSIONS):
+        self.history_tokens = history_tokens
+        self.summary_tokens = summary_tokens
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def _expire(self, now):
+        stale = [sid for sid, session in self._sessions.items() if now - session['updated_at'] > self.ttl]
+        for sid in stale:
+            del self._sessions[sid]
+        if len(self._sessions) > self.max_sessions:
+            oldest = sorted(self._sessions, key=lambda sid: self._sessions[sid]['updated_at'])
+            for sid in oldest[:len(self._sessions) - self.max_sessions]:
+                del self._sessions[sid]
+
+    def _session(self, session_id):
+        now = time.time()
+        session = self._sessions.get(session_id)
+        if session is None:
+            self._expire(now)
+            session = self._sessions[session_id] = {'history': [], 'summary': [], 'count': 0}
+        session['updated_at'] = now
+        return session
+
+    def ensure(self, session_id=None):
+        """Return `session_id`, or a new ID if it is missing or has expired"""
+        with self._lock:
+            if session_id not in self._sessions:
+                session_id = uuid.uuid4().hex
+            self._session(session_id)
+        return session_id
+
+    def append(self, session_id, role, content):
+        """Add a message and return its 1-based position in the conversation"""
+        with self._lock:
+            session = self._session(session_id)
+            session['history'].append({'role': role, 'content': content})
+            # History is trimmed as turns are summarized, so IDs come from a separate counter
+            session['count'] += 1
+            return session['count']
+
+    def window(self, session_id):
+        """
+        Messages to send upstream: a summary of older turns plus the recent turns that fit the budget.
+        """
+        with self._lock:
+            session = self._session(session_id)
+            history = session['history']
+
+            used, start = 0, len(history)
+            while start > 0:
+                cost = estimate_tokens(history[start - 1]['content'])
+                if used + cost > self.history_tokens and start < len(history):
+                    break
+                used += cost
+                start -= 1
+
+            # Fold turns that just fell out of the window into the running summary and drop them
+            session['summary'].extend(summarize_turn(message) for message in history[:start])
+            del history[:start]
+            while session['summary'] and sum(estimate_tokens(line) for line in session['summary']) > self.summary_tokens:
+                session['summary'].pop(0)
+
+            messages = [dict(message) for message in history]
+            if session['summary']:
+                summary = "Summary of the earlier conversation:\n" + "\n".join(session['summary'])
+                messages.insert(0, {'role': 'system', 'content': summary})
+            return messages
@@ -0,0 +1,49 @@
+# gunicorn settings for the dashboard. Run from the project root:
+#
+#     gunicorn -c dashboard/gunicorn.conf.py
+#
+# Override the bind address, worker count and threads with DASHBOARD_BIND / DASHBOARD_WORKERS /
+# DASHBOARD_THREADS.
+# Set DASHBOARD_PRELOAD=0 to have every worker load its own copy of the data instead.
+import gc
+import os
+import sys
+
+pythonpath = 'dashboard'
+wsgi_app = 'wsgi:create_app()'
+bind = os.environ.get('DASHBOARD_BIND', '0.0.0.0:8050')
+
+# One worker, many threads. Chat and ensemble jobs, chat sessions and the in-memory reply
+# cache live in the process that started them, and the browser polls for them: with several
+# workers a poll routed to a different one finds nothing and the reply is lost. The callbacks
+# return immediately and CPU-heavy work (ensembles) runs in its own process pool, so threads
+# are enough to keep slow clients from blocking each other. Only raise DASHBOARD_WORKERS
+# behind a load balancer with sticky sessions.
+workers = int(os.environ.get('DASHBOARD_WORKERS', 1))
+worker_class = 'gthread'
+threads = int(os.environ.get('DASHBOARD_THREADS', 16))
+timeout = 120
+graceful_timeout = 30
+# No max_requests: recycling the worker would drop every session and job in flight
+
+# Import the app in the master (fast: it binds before any data is loaded) and warm the
+# caches there on a background thread; workers are forked from it once warm-up is done and
+# share those pages copy-on-write
+preload_app = os.environ.get('DASHBOARD_PRELOAD', '1') != '0'
+
+
+def when_ready(server):
+    if server.cfg.preload_app:
+        # The master built the scenario table blob for every worker, so it alone may delete old ones
+        sys.modules['wsgi'].READY.wait()
+        sys.modules['app'].prune_stale_assets()
+
+
+def pre_fork(server, worker):
+    if server.cfg.preload_app:
+        # Never fork mid-load: a worker would inherit half-built data and held locks.
+        # Connections queue on the bound socket in the meantime.
+        sys.modules['wsgi'].READY.wait()
+    # Keep the garbage collector in the workers from writing to (and so copying) the
+    # pages holding everything the master loaded
+    gc.freeze()
@@ -1,11 +1,13 @@
 from dash import dcc, html
 
-def create_layout(unique_months):
+def create_layout(unique_months, scenario_table=None, stations=None):
     """
     Creates the layout for the Dash application
     
     Args:
         unique_months: List of available months for the dropdown
+        scenario_table: Manifest of the precomputed scenario table looked up in the browser
+        stations: Station IDs that can be plotted on their own instead of the basin average
         
     Returns:
         Layout component
@@ -28,6 +30,17 @@ def create_layout(unique_months):
             )
         ], style={'width': '50%', 'margin': 'auto'}),
 
+        html.Div([
+            html.Label("Station:", style={'fontWeight': 'bold'}),
+            dcc.Dropdown(
+                id='station-dropdown',
+                options=[{'label': 'Basin average', 'value': 'BASIN'}] +
+                        [{'label': station, 'value': station} for station in (stations or [])],
+                value='BASIN',
+                clearable=False
+            )
+        ], style={'width': '50%', 'margin': 'auto', 'marginTop': '10px'}),
+
         html.Br(),
 
         html.Div([
@@ -80,8 +93,21 @@ def create_layout(unique_months):
         html.Br(),
 
         dcc.Graph(id='precipitation-graph'),
+        html.Div(id='month-summary', style={'width': '80%', 'margin': 'auto', 'color': '#2c3e50'}),
         html.Div(id='simulation-results', style={'marginTop': '20px'}),
 
+        # Monte Carlo storage ensemble for the current slider scenario
+        html.Div([
+            html.H3("Storage Ensemble", style={'color': '#34495e'}),
+            html.P("Runs the daily reservoir simulator over stochastic precipitation and temperature years "
+                   "resampled from the historical record, and shows the spread of projected storage."),
+            html.Button('Run Ensemble', id='ensemble-run', n_clicks=0,
+                        style={'backgroundColor': '#2980b9', 'color': 'white', 'border': 'none',
+                               'padding': '10px 20px', 'borderRadius': '5px'}),
+            html.Span(id='ensemble-status', style={'marginLeft': '15px'}),
+            dcc.Graph(id='ensemble-graph'),
+        ], style={'marginTop': '20px'}),
+
         html.Br(),
 
         # AI Chatbot Section
@@ -134,8 +160,16 @@ def create_layout(unique_months):
                    "Use the visualizations to interpret the results and make informed decisions.")
         ], style={'padding': '20px', 'backgroundColor': '#ecf0f1', 'borderRadius': '10px'}),
         
-        # Store for chat history (invisible element)
-        dcc.Store(id='chat-history', data=[]),
+        # Chat session ID (invisible element); the history itself is kept on the server
+        dcc.Store(id='chat-session', data=None),
+        # ID of the chat request in flight, polled for streamed tokens until the reply is complete
+        dcc.Store(id='chat-job', data=None),
+        dcc.Interval(id='chat-poll', interval=250, disabled=True),
+        # ID of the ensemble run in flight, polled for percentile bands as members finish
+        dcc.Store(id='ensemble-job', data=None),
+        dcc.Interval(id='ensemble-poll', interval=500, disabled=True),
+        # Where the browser finds the precomputed simulation results for every slider position
+        dcc.Store(id='scenario-table', data=scenario_table),
     ], style={'fontFamily': 'Arial, sans-serif'})
     
     return layout
\ No newline at end of file
@@ -0,0 +1,200 @@
+import os
+import json
+import time
+import uuid
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Override with a local stand-in (see stub_llm_server.py) for development and tests
+DEFAULT_API_URL = "https://api.groq.com/openai/v1/chat/completions"
+
+CONNECT_TIMEOUT = 3.05
+READ_TIMEOUT = 60
+MAX_RETRIES = 3
+BACKOFF_FACTOR = 0.5
+POOL_SIZE = 10
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+# Finished jobs nobody polls (closed tab, lost poll) are dropped after this many seconds
+FINISHED_JOB_TTL = 600
+
+
+class LLMClient:
+    """
+    Chat-completions client with a pooled keep-alive session.
+
+    Connections are reused across requests, every call has explicit connect/read
+    timeouts, and connection errors and 429/5xx responses are retried with
+    exponential backoff.
+    """
+
+    def __init__(self, api_url=None, api_key=None, connect_timeout=CONNECT_TIMEOUT, read_timeout=READ_TIMEOUT,
+                 max_retries=MAX_RETRIES, backoff_factor=BACKOFF_FACTOR, pool_size=POOL_SIZE):
+        self.api_url = api_url or os.environ.get('GROQ_API_URL', DEFAULT_API_URL)
+        self._api_key = api_key
+        self.timeout = (connect_timeout, read_timeout)
+
+        retry = Retry(total=max_retries, backoff_factor=backoff_factor, status_forcelist=RETRY_STATUSES,
+                      allowed_methods=frozenset(['POST']), raise_on_status=False)
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    @property
+    def api_key(self):
+        # Read lazily so a key added to the environment after startup is picked up
+        return self._api_key or os.environ.get('GROQ_API_KEY', '')
+
+    def post(self, payload, stream=False):
+        headers = {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json"
+        }
+        response = self.session.post(self.api_url, headers=headers, json=payload, timeout=self.timeout, stream=stream)
+        response.raise_for_status()  # Raise an exception for HTTP errors
+        return response
+
+    def complete(self, payload):
+        """Return the assistant message text for a chat-completions payload"""
+        return self.post(payload).json()["choices"][0]["message"]["content"]
+
+    def stream(self, payload):
+        """
+        Yield the assistant message text piece by piece as the server generates it.
+
+        Consumes the server-sent-event stream ('data: {...}' lines ending with
+        'data: [DONE]'). Closing the generator closes the HTTP response, which is
+        how a cancelled request stops the upstream generation.
+        """
+        response = self.post(dict(payload, stream=True), stream=True)
+        try:
+            for line in response.iter_lines(decode_unicode=True):
+                if not line or not line.startswith('data:'):
+                    continue
+                data = line[len('data:'):].strip()
+                if data == '[DONE]':
+                    break
+                delta = json.loads(data)["choices"][0].get("delta", {}).get("content")
+                if delta:
+                    yield delta
+        finally:
+            response.close()
+
+
+class StreamJob:
+    """Text accumulated so far from a streaming call, plus its done/cancelled flags"""
+
+    def __init__(self):
+        self.chunks = []
+        self.done = False
+        self.cancelled = threading.Event()
+
+    @property
+    def text(self):
+        return ''.join(self.chunks)
+
+    @property
+    def latest(self):
+        return self.chunks[-1] if self.chunks else None
+
+
+class JobQueue:
+    """
+    Runs slow calls on a small thread pool so Dash callbacks return immediately.
+
+    submit() hands back a job ID that a polling callback passes to poll() until
+    the job is done. Streaming jobs expose the text received so far on every poll
+    and can be cancelled. Finished jobs are dropped once their result has been read,
+    or `finished_ttl` seconds after finishing if it never is.
+    """
+
+    def __init__(self, max_workers=4, finished_ttl=FINISHED_JOB_TTL):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='llm')
+        self.finished_ttl = finished_ttl
+        self._jobs = {}
+        self._finished_at = {}
+        self._lock = threading.Lock()
+
+    def _mark_finished(self, job_id):
+        with self._lock:
+            if job_id in self._jobs:
+                self._finished_at[job_id] = time.monotonic()
+
+    def _forget(self, job_id):
+        self._finished_at.pop(job_id, None)
+        return self._jobs.pop(job_id, None)
+
+    def _evict(self):
+        """Drop jobs that finished more than finished_ttl seconds ago; call with the lock held"""
+        cutoff = time.monotonic() - self.finished_ttl
+        for job_id in [job_id for job_id, finished_at in self._finished_at.items() if finished_at < cutoff]:
+            self._forget(job_id)
+
+    def submit(self, fn, *args, **kwargs):
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            self._evict()
+            future = self._jobs[job_id] = self._executor.submit(fn, *args, **kwargs)
+        future.add_done_callback(lambda _: self._mark_finished(job_id))
+        return job_id
+
+    def submit_stream(self, generator_fn, *args, **kwargs):
+        """Run a generator of text chunks in the background, collecting chunks as they arrive"""
+        job = StreamJob()
+
+        def consume():
+            chunks = generator_fn(*args, **kwargs)
+            try:
+                for chunk in chunks:
+                    job.chunks.append(chunk)
+                    if job.cancelled.is_set():
+                        break
+            finally:
+                chunks.close()
+                job.done = True
+                self._mark_finished(job_id)
+
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            self._evict()
+            self._jobs[job_id] = job
+        self._executor.submit(consume)
+        return job_id
+
+    def cancel(self, job_id, latest=False):
+        """Stop a streaming job and return the text (or, with `latest`, last chunk) it produced so far"""
+        with self._lock:
+            job = self._forget(job_id)
+        if job is None:
+            return None
+        if isinstance(job, StreamJob):
+            job.cancelled.set()
+            return job.latest if latest else job.text
+        job.cancel()
+        return None
+
+    def poll(self, job_id, latest=False):
+        """
+        Return ('pending', partial_text_or_None), ('done', result) or ('missing', None).
+
+        With `latest`, a streaming job reports its most recent chunk instead of the joined
+        text, for generators that yield progress snapshots rather than text.
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return 'missing', None
+            if isinstance(job, StreamJob):
+                result = job.latest if latest else job.text
+                if not job.done:
+                    return 'pending', result
+                self._forget(job_id)
+                return 'done', result
+            if not job.done():
+                return 'pending', None
+            self._forget(job_id)
+        return 'done', job.result()
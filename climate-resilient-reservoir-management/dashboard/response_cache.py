@@ -0,0 +1,107 @@
+import os
+import re
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+
+DEFAULT_MAX_ENTRIES = 1024
+DEFAULT_TTL = 6 * 3600  # seconds
+
+
+def normalize_prompt(text):
+    """Lower-case, collapse whitespace and drop trailing punctuation so trivially different phrasings match"""
+    text = re.sub(r'\s+', ' ', text.strip().lower())
+    return text.rstrip('?!. ')
+
+
+def scenario_key(user_text, month, precip_change, temp_increase, crop_area_increase, tech_adapt, model):
+    """
+    Cache key for a chatbot prompt under a dashboard scenario.
+
+    Slider values are rounded to the slider steps so float noise (0.30000000000000004)
+    doesn't split the cache.
+    """
+    payload = {
+        'prompt': normalize_prompt(user_text),
+        'month': month,
+        'scenario': [round(precip_change or 0), round(temp_increase or 0, 1),
+                     round(crop_area_increase or 0), round(tech_adapt or 0)],
+        'model': model,
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+
+class ResponseCache:
+    """
+    TTL + LRU cache of chatbot replies, optionally backed by SQLite.
+
+    Lookups hit an in-process OrderedDict first. With `db_path` set, misses fall
+    through to a SQLite file (WAL mode) that every worker process shares, and
+    new replies are written there too.
+    """
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, ttl=DEFAULT_TTL, db_path=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.db_path = db_path
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        self._pid = None
+        if db_path:
+            self._connect()
+
+    def _connect(self):
+        self._db = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None)
+        self._pid = os.getpid()
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('CREATE TABLE IF NOT EXISTS responses '
+                         '(key TEXT PRIMARY KEY, response TEXT NOT NULL, created_at REAL NOT NULL)')
+        self._db.execute('CREATE INDEX IF NOT EXISTS responses_created_at ON responses (created_at)')
+
+    def _connection(self):
+        # A SQLite connection must not be used across fork(): a preloading server's workers
+        # each open their own instead of the one inherited from the master
+        if self._db is not None and self._pid != os.getpid():
+            self._connect()
+        return self._db
+
+    def get(self, key):
+        """Return the cached reply for `key`, or None on a miss or expired entry"""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                response, created_at = entry
+                if now - created_at < self.ttl:
+                    self._entries.move_to_end(key)
+                    return response
+                del self._entries[key]
+
+            db = self._connection()
+            if db is None:
+                return None
+            row = db.execute('SELECT response, created_at FROM responses WHERE key = ?', (key,)).fetchone()
+            if row is None or now - row[1] >= self.ttl:
+                return None
+            self._remember(key, row[0], row[1])
+            return row[0]
+
+    def put(self, key, response):
+        created_at = time.time()
+        with self._lock:
+            self._remember(key, response, created_at)
+            db = self._connection()
+            if db is not None:
+                db.execute('INSERT OR REPLACE INTO responses (key, response, created_at) VALUES (?, ?, ?)',
+                           (key, response, created_at))
+                db.execute('DELETE FROM responses WHERE created_at < ?', (created_at - self.ttl,))
+
+    def _remember(self, key, response, created_at):
+        self._entries[key] = (response, created_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
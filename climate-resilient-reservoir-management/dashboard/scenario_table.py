@@ -0,0 +1,139 @@
+import os
+import glob
+import json
+import hashlib
+
+import numpy as np
+
+from scenarios import SLIDER_AXES, axis_values, simulate_scenarios
+
+ASSETS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'assets')
+TABLE_PREFIX = 'scenario_table'
+
+# Results are shown to two decimals, so an additive fit this close is exact on screen
+ADDITIVE_TOLERANCE = 0.005
+QUANT_LEVELS = np.iinfo(np.uint16).max
+
+
+def _grid_predictions(predict_batch, values):
+    """Predictor output over the whole slider grid, one precip value (one batch) at a time"""
+    names = list(SLIDER_AXES)
+    shape = tuple(len(values[name]) for name in names)
+    rest = np.stack([column.ravel() for column in
+                     np.meshgrid(*(values[name] for name in names[1:]), indexing='ij')], axis=1)
+    grid = np.empty(shape, dtype=np.float32)
+    for i, precip in enumerate(values[names[0]]):
+        batch = np.column_stack([np.full(len(rest), precip), rest])
+        grid[i] = np.asarray(predict_batch(batch), dtype=np.float32).reshape(shape[1:])
+    return grid
+
+
+def additive_parts(grid):
+    """
+    Split a grid into one table per axis whose broadcast sum reproduces it.
+
+    Returns:
+        (parts, max_error) - parts[0] carries the grand mean
+    """
+    mean = grid.mean(dtype=np.float64)
+    parts = []
+    for axis in range(grid.ndim):
+        others = tuple(a for a in range(grid.ndim) if a != axis)
+        parts.append(grid.mean(axis=others, dtype=np.float64) - mean)
+    parts[0] = parts[0] + mean
+
+    rebuilt = np.zeros(grid.shape)
+    for axis, part in enumerate(parts):
+        rebuilt = rebuilt + part.reshape([-1 if a == axis else 1 for a in range(grid.ndim)])
+    return parts, float(np.abs(rebuilt - grid).max())
+
+
+def quantize(values):
+    """uint16 codes plus (scale, offset) so that value ≈ code * scale + offset"""
+    low, high = float(values.min()), float(values.max())
+    scale = (high - low) / QUANT_LEVELS or 1.0
+    codes = np.round((values - low) / scale).astype(np.uint16)
+    return codes, scale, low
+
+
+def build_scenario_table(predict_batch, assets_dir=ASSETS_DIR):
+    """
+    Precompute the simulation panel over every slider position and write it as a static asset.
+
+    simulate_scenario's outputs are separable (inflow depends only on precipitation,
+    outflow on temperature, demand on crop area and technology), so they ship as small
+    float32 axis tables. The predictor is evaluated on the full grid; when it is additive
+    (e.g. the baseline LinearRegression) it is shipped as four axis tables as well,
+    otherwise as a uint16-quantized grid. All arrays are concatenated into one binary
+    blob that the browser fetches once (assets/scenario_table.js). The blob is written
+    uncompressed: a '.gz' asset is served with Content-Encoding: gzip, so the browser
+    would inflate it before the script sees it. Compressing it in transit is left to the
+    HTTP layer.
+
+    Writing is safe from several processes at once: the name is the content hash and the
+    file appears atomically. Older blobs are left in place (a worker may still be serving
+    one); prune_scenario_tables() removes them from the process that builds the table
+    for everyone.
+
+    Args:
+        predict_batch: Function mapping an (n, 4) scenario array to n predictions
+        assets_dir: Where to write the blob; its name carries a content hash for cache busting
+
+    Returns:
+        Manifest dict (axes, array layout and blob URL) for the 'scenario-table' store
+    """
+    values = {name: axis_values(*SLIDER_AXES[name]) for name in SLIDER_AXES}
+    precip, temp, crop, tech = values.values()
+    arrays = {
+        'inflow': simulate_scenarios(precip, 0, 0, 0, dtype=np.float32).inflow,
+        'outflow': simulate_scenarios(0, temp, 0, 0, dtype=np.float32).outflow,
+        'demand': simulate_scenarios(0, 0, crop[:, None], tech[None, :], dtype=np.float32).demand,
+    }
+
+    grid = _grid_predictions(predict_batch, values)
+    parts, error = additive_parts(grid)
+    if error <= ADDITIVE_TOLERANCE:
+        predictor = {'layout': 'additive'}
+        for name, part in zip(SLIDER_AXES, parts):
+            arrays[f'predicted_{name}'] = part.astype(np.float32)
+    else:
+        codes, scale, offset = quantize(grid)
+        predictor = {'layout': 'grid', 'scale': scale, 'offset': offset}
+        arrays['predicted'] = codes
+
+    layout, blobs, position = {}, [], 0
+    for name, array in arrays.items():
+        # Typed arrays in the browser are little-endian; float32 tables come first so every view stays aligned
+        data = array.astype(array.dtype.newbyteorder('<')).tobytes()
+        layout[name] = {'dtype': array.dtype.name, 'shape': list(array.shape), 'byte_offset': position}
+        blobs.append(data)
+        position += len(data)
+    payload = b''.join(blobs)
+
+    key = hashlib.sha256(payload + json.dumps([SLIDER_AXES, predictor]).encode()).hexdigest()[:12]
+    file_name = f'{TABLE_PREFIX}-{key}.bin'
+    path = os.path.join(assets_dir, file_name)
+    if not os.path.exists(path):
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(payload)
+        os.replace(tmp_path, path)
+
+    return {
+        'url': f'/assets/{file_name}',
+        'axes': {name: list(SLIDER_AXES[name]) for name in SLIDER_AXES},
+        'arrays': layout,
+        'predictor': predictor,
+    }
+
+
+def prune_scenario_tables(manifest, assets_dir=ASSETS_DIR):
+    """Delete every scenario table blob except the one `manifest` points at; returns the names removed"""
+    keep = os.path.basename(manifest['url'])
+    removed = []
+    for pattern in (f'{TABLE_PREFIX}-*.bin', f'{TABLE_PREFIX}-*.bin.gz'):
+        for stale in glob.glob(os.path.join(assets_dir, pattern)):
+            if os.path.basename(stale) != keep:
+                os.remove(stale)
+                removed.append(os.path.basename(stale))
+    return removed
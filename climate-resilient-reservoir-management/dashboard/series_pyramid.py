@@ -0,0 +1,130 @@
+import numpy as np
+import pandas as pd
+
+BASIN_SERIES = 'BASIN'
+# Finest to coarsest; each level holds the mean, min and max of its period
+LEVELS = [('D', 'daily'), ('W', 'weekly'), ('M', 'monthly')]
+# About two points per horizontal pixel of the graph
+DEFAULT_MAX_POINTS = 2000
+# A level up to this many times over budget is min/max-downsampled rather than swapped for a coarser one
+DOWNSAMPLE_SLACK = 4
+
+
+def lttb(x, y, n_out):
+    """
+    Largest-Triangle-Three-Buckets downsampling of a line to `n_out` points.
+
+    Keeps the first and last points, and from each bucket in between the point that forms
+    the largest triangle with the previously kept point and the next bucket's mean, which
+    preserves the visual shape (peaks included) far better than striding.
+
+    Returns:
+        Indices of the kept points
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    xf = x.astype(np.float64)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    kept = np.empty(n_out, dtype=np.int64)
+    kept[0], kept[-1] = 0, n - 1
+    previous = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        next_end = edges[i + 2] if i + 2 < len(edges) else n
+        next_x, next_y = xf[end:next_end].mean(), y[end:next_end].mean()
+        area = np.abs((xf[previous] - next_x) * (y[start:end] - y[previous])
+                      - (xf[previous] - xf[start:end]) * (next_y - y[previous]))
+        previous = start + int(np.argmax(area))
+        kept[i + 1] = previous
+    return kept
+
+
+def minmax_downsample(y, n_out):
+    """
+    Indices of the minimum and maximum of each of n_out // 2 equal buckets, in order.
+
+    Unlike averaging, every peak and trough survives, which matters for spiky
+    series such as daily precipitation.
+    """
+    n = len(y)
+    if n_out >= n:
+        return np.arange(n)
+    buckets = max(n_out // 2, 1)
+    starts = np.linspace(0, n, buckets + 1).astype(np.int64)[:-1]
+    ids = np.repeat(np.arange(buckets), np.diff(np.append(starts, n)))
+    # Position of each bucket's min/max: sort by (bucket, value) and take the ends of each run
+    order = np.lexsort((y, ids))
+    ends = np.append(starts[1:], n) - 1
+    picks = np.unique(np.concatenate([order[starts], order[ends]]))
+    return picks
+
+
+class SeriesPyramid:
+    """
+    Daily, weekly and monthly aggregates of every station (and the basin mean), precomputed once.
+
+    query() picks the finest level that fits a point budget for the requested date range,
+    min/max-downsampling it when it is only slightly over, so a figure never carries more
+    than about `max_points` points however long the range.
+    """
+
+    def __init__(self, df, date_column='DATE', value_column='Precipitation', station_column='STATION'):
+        df = df.dropna(subset=[date_column, value_column])
+        frame = pd.DataFrame({
+            'series': df[station_column].astype(str) if station_column in df else BASIN_SERIES,
+            'date': df[date_column].dt.normalize().astype('datetime64[ns]'),
+            'value': df[value_column].astype(np.float64),
+        })
+        daily = frame.groupby(['series', 'date'], observed=True)['value'].mean().reset_index()
+        basin = daily.groupby('date')['value'].mean().reset_index()
+        basin['series'] = BASIN_SERIES
+        daily = pd.concat([basin, daily[daily['series'] != BASIN_SERIES]], ignore_index=True)
+
+        self.stations = sorted(daily.loc[daily['series'] != BASIN_SERIES, 'series'].unique())
+        self.levels = {}
+        for freq, _ in LEVELS:
+            period = daily['date'] if freq == 'D' else daily['date'].dt.to_period(freq).dt.start_time
+            grouped = daily.groupby(['series', period.rename('period')])['value']
+            level = grouped.agg(['mean', 'min', 'max']).reset_index().sort_values(['series', 'period'])
+            series = level['series'].to_numpy()
+            names, starts = np.unique(series, return_index=True)
+            ends = np.append(starts[1:], len(series))
+            self.levels[freq] = {
+                'dates': level['period'].to_numpy().astype('datetime64[ns]'),
+                'mean': level['mean'].to_numpy(np.float32),
+                'min': level['min'].to_numpy(np.float32),
+                'max': level['max'].to_numpy(np.float32),
+                'offsets': dict(zip(names, zip(starts, ends))),
+            }
+
+    def months(self, series=BASIN_SERIES):
+        """'YYYY-MM' of every month of a series that has data, read off the monthly level"""
+        level = self.levels['M']
+        start, end = level['offsets'].get(series, (0, 0))
+        return np.datetime_as_string(level['dates'][start:end].astype('datetime64[M]'), unit='M').tolist()
+
+    def query(self, series=BASIN_SERIES, start=None, end=None, max_points=DEFAULT_MAX_POINTS):
+        """
+        Points of one series between two dates, at a resolution that fits the budget.
+
+        Returns:
+            (level_name, dict of 'dates', 'mean', 'min', 'max' arrays)
+        """
+        start = np.datetime64(pd.Timestamp(start), 'ns') if start is not None else None
+        end = np.datetime64(pd.Timestamp(end), 'ns') if end is not None else None
+        for freq, name in LEVELS:
+            level = self.levels[freq]
+            first, last = level['offsets'].get(series, (0, 0))
+            dates = level['dates'][first:last]
+            lo = np.searchsorted(dates, start) if start is not None else 0
+            hi = np.searchsorted(dates, end, side='right') if end is not None else len(dates)
+            if hi - lo <= max_points * DOWNSAMPLE_SLACK or freq == LEVELS[-1][0]:
+                window = slice(first + lo, first + hi)
+                points = {key: level[key][window] for key in ('dates', 'mean', 'min', 'max')}
+                if hi - lo > max_points:
+                    # Daily points keep their peaks; coarser levels already carry min/max envelopes
+                    keep = minmax_downsample(points['mean'], max_points) if freq == 'D' else \
+                        lttb(points['dates'].astype(np.int64), points['mean'], max_points)
+                    points = {key: values[keep] for key, values in points.items()}
+                return name, points
@@ -0,0 +1,53 @@
+import time
+import threading
+
+# Seconds spent in each startup step (module import, each dataset, warm-up), in the order they finished
+STARTUP_TIMES = {}
+
+
+def record_time(step, started):
+    STARTUP_TIMES[step] = round(time.perf_counter() - started, 3)
+
+
+class Lazy:
+    """
+    A value built on first use, once per process.
+
+    get() from several threads at once builds the value a single time; the others wait
+    for it. The build time is recorded in STARTUP_TIMES under the value's name, so a
+    warm-up thread that calls get() ahead of the first request fills in the startup report.
+    """
+
+    def __init__(self, name, build):
+        self.name = name
+        self._build = build
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._value = None
+
+    @property
+    def loaded(self):
+        return self._loaded
+
+    def get(self):
+        if not self._loaded:
+            with self._lock:
+                if not self._loaded:
+                    started = time.perf_counter()
+                    self._value = self._build()
+                    record_time(self.name, started)
+                    self._loaded = True
+        return self._value
+
+
+def startup_report():
+    """One line listing the recorded startup steps, slowest first"""
+    steps = sorted(STARTUP_TIMES.items(), key=lambda item: item[1], reverse=True)
+    return ', '.join(f"{step} {seconds:.2f}s" for step, seconds in steps)
+
+
+def run_in_background(target, name='warm-up'):
+    """Start `target` on a daemon thread so the server can bind while it runs"""
+    thread = threading.Thread(target=target, name=name, daemon=True)
+    thread.start()
+    return thread
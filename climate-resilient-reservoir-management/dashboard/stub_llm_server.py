@@ -0,0 +1,105 @@
+"""
+Local stand-in for the Groq chat-completions endpoint.
+
+Run it and point the dashboard at it:
+
+    python dashboard/stub_llm_server.py --port 8765 --delay 2
+    GROQ_API_URL=http://127.0.0.1:8765/openai/v1/chat/completions GROQ_API_KEY=test python dashboard/app.py
+
+Tests can start it in-process with serve_in_thread().
+"""
+
+import json
+import time
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CHAT_PATH = '/openai/v1/chat/completions'
+
+
+def make_handler(delay=0.0, fail_first=0):
+    """Handler class echoing the last user message; the first `fail_first` requests get a 503"""
+    state = {'requests': 0}
+    lock = threading.Lock()
+
+    class StubHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'  # keep-alive, like the real API
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send_json(self, status, body):
+            data = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _send_stream(self, reply, model):
+            """Server-sent events, one word per chunk, `delay` spread over the words"""
+            words = reply.split(' ')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/event-stream')
+            self.send_header('Cache-Control', 'no-cache')
+            self.send_header('Connection', 'close')
+            self.end_headers()
+            try:
+                for i, word in enumerate(words):
+                    time.sleep(delay / len(words))
+                    chunk = {'object': 'chat.completion.chunk', 'model': model,
+                             'choices': [{'index': 0, 'delta': {'content': word if i == 0 else ' ' + word}}]}
+                    self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+                    self.wfile.flush()
+                self.wfile.write(b"data: [DONE]\n\n")
+            except (BrokenPipeError, ConnectionResetError):
+                pass  # client cancelled
+            self.close_connection = True
+
+        def do_POST(self):
+            payload = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+            with lock:
+                state['requests'] += 1
+                failing = state['requests'] <= fail_first
+            if self.path != CHAT_PATH:
+                return self._send_json(404, {'error': {'message': 'not found'}})
+            if failing:
+                return self._send_json(503, {'error': {'message': 'temporarily unavailable'}})
+            if not self.headers.get('Authorization', '').startswith('Bearer '):
+                return self._send_json(401, {'error': {'message': 'missing API key'}})
+
+            user_messages = [m['content'] for m in payload.get('messages', []) if m.get('role') == 'user']
+            reply = f"Stub reply to: {user_messages[-1] if user_messages else ''}"
+            if payload.get('stream'):
+                return self._send_stream(reply, payload.get('model'))
+
+            time.sleep(delay)
+            self._send_json(200, {
+                'id': f"stub-{state['requests']}",
+                'object': 'chat.completion',
+                'model': payload.get('model'),
+                'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': reply}, 'finish_reason': 'stop'}],
+            })
+
+    StubHandler.state = state
+    return StubHandler
+
+
+def serve_in_thread(port=0, delay=0.0, fail_first=0):
+    """Start the stub on a background thread; returns (server, base_url). Call server.shutdown() when done."""
+    server = ThreadingHTTPServer(('127.0.0.1', port), make_handler(delay, fail_first))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}{CHAT_PATH}"
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Local stand-in for the chat-completions API.')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--delay', type=float, default=0.0, help='Seconds to wait before answering')
+    parser.add_argument('--fail-first', type=int, default=0, help='Answer the first N requests with 503')
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(('127.0.0.1', args.port), make_handler(args.delay, args.fail_first))
+    print(f"Stub chat-completions API on http://127.0.0.1:{args.port}{CHAT_PATH}")
+    server.serve_forever()
@@ -0,0 +1,65 @@
+"""
+Production entry point for the dashboard.
+
+Run from the project root (data paths such as 'data/store' and 'models' are relative to it):
+
+    gunicorn -c dashboard/gunicorn.conf.py
+
+create_app() builds the Flask server from flask_integration and returns as soon as the
+dashboard module is imported; store tables, models and figures load on a background
+warm-up thread. With gunicorn's preload_app the master binds the port straight away and
+forks workers once warm-up is done, so they share the loaded data copy-on-write. GET
+/ready answers 503 until warm-up has finished, and while any store table failed to
+load, so a load balancer only routes traffic to a warm server with real data. Its body
+carries the startup-time report.
+"""
+
+import os
+import sys
+import time
+import threading
+
+from flask import jsonify
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from startup import STARTUP_TIMES, run_in_background
+
+READY = threading.Event()
+STARTUP = {}
+
+
+def create_app():
+    """gunicorn app factory: returns the Flask server with the dashboard mounted on it"""
+    started = time.perf_counter()
+
+    import app as dashboard  # cheap: data and models are loaded by dashboard.warm_up()
+    from flask_integration import create_dash_app_with_flask
+
+    dash_app, server = create_dash_app_with_flask()
+    dashboard.init_app(dash_app)
+
+    @server.route('/ready')
+    def ready():
+        report = dict(STARTUP, steps=STARTUP_TIMES)
+        if not READY.is_set():
+            return jsonify(status='warming up', **report), 503
+        if 'warm_up_error' in STARTUP:
+            return jsonify(status='warm-up failed', **report), 503
+        if dashboard.LOAD_ERRORS:
+            return jsonify(status='data missing', load_errors=dashboard.LOAD_ERRORS, **report), 503
+        return jsonify(status='ready', **report)
+
+    def warm():
+        try:
+            dashboard.warm_up()
+        except Exception as e:
+            STARTUP['warm_up_error'] = str(e)
+            print(f"Dashboard warm-up failed: {e}")
+        finally:
+            STARTUP['startup_seconds'] = round(time.perf_counter() - started, 2)
+            READY.set()
+        print(f"Dashboard ready in {STARTUP['startup_seconds']}s (app created in {STARTUP['create_seconds']}s)")
+
+    STARTUP['create_seconds'] = round(time.perf_counter() - started, 2)
+    run_in_background(warm)
+    return server
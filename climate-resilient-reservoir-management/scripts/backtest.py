@@ -0,0 +1,116 @@
+import numpy as np
+import pandas as pd
+import os
+import time
+import logging
+from concurrent.futures import ProcessPoolExecutor
+
+from sklearn.base import clone
+from sklearn.metrics import mean_absolute_error
+
+
+class DateFolds:
+    """
+    Walk-forward folds over a date series, usable as an sklearn `cv` splitter.
+
+    The last `n_splits` blocks of `test_size` are the test windows, in date order.
+    Each fold trains on everything before its window ('expanding') or only on the
+    `train_size` immediately before it ('rolling'), minus an optional `gap` so
+    autocorrelated neighbours of the test window can't leak into training.
+
+    `dates` must share its index with the X passed to split(); row subsets taken
+    with .iloc keep their labels, so splitting a subsample still works.
+    """
+
+    def __init__(self, dates, n_splits=5, mode='expanding', test_size=None, train_size=None, gap=pd.Timedelta(0)):
+        if mode not in ('expanding', 'rolling'):
+            raise ValueError(f"Unknown fold mode '{mode}'")
+        if mode == 'rolling' and train_size is None:
+            raise ValueError("Rolling folds need a train_size")
+        self.dates = pd.Series(pd.to_datetime(dates))
+        self.n_splits = n_splits
+        self.mode = mode
+        self.test_size = test_size
+        self.train_size = train_size
+        self.gap = gap
+
+    def __repr__(self):
+        return (f"DateFolds(n_splits={self.n_splits}, mode='{self.mode}', test_size={self.test_size!r}, "
+                f"train_size={self.train_size!r}, gap={self.gap!r}, dates={len(self.dates)} "
+                f"from {self.dates.min()} to {self.dates.max()})")
+
+    def get_n_splits(self, X=None, y=None, groups=None):
+        return self.n_splits
+
+    def windows(self, dates):
+        """(train_start, train_end, test_start, test_end) per fold; ends are exclusive"""
+        first, last = dates.min(), dates.max() + pd.Timedelta(days=1)
+        test_size = self.test_size or (last - first) / (self.n_splits + 1)
+        for k in range(self.n_splits, 0, -1):
+            test_start = last - k * test_size
+            test_end = test_start + test_size
+            train_end = test_start - self.gap
+            train_start = first if self.mode == 'expanding' else max(first, train_end - self.train_size)
+            yield train_start, train_end, test_start, test_end
+
+    def split(self, X, y=None, groups=None):
+        dates = self.dates.loc[X.index].to_numpy() if hasattr(X, 'index') else self.dates.to_numpy()
+        dates = pd.Series(dates)
+        for train_start, train_end, test_start, test_end in self.windows(dates):
+            train_idx = np.flatnonzero(((dates >= train_start) & (dates < train_end)).to_numpy())
+            test_idx = np.flatnonzero(((dates >= test_start) & (dates < test_end)).to_numpy())
+            if len(train_idx) and len(test_idx):
+                yield train_idx, test_idx
+
+
+def run_fold(estimator, X, y, train_idx, test_idx):
+    """Fit and score one fold; runs inside a worker process"""
+    started = time.perf_counter()
+    model = clone(estimator).fit(X.iloc[train_idx], y.iloc[train_idx])
+    fitted = time.perf_counter()
+    y_pred = model.predict(X.iloc[test_idx])
+    return {
+        'mae': float(mean_absolute_error(y.iloc[test_idx], y_pred)),
+        'fit_seconds': fitted - started,
+        'predict_seconds': time.perf_counter() - fitted,
+    }
+
+
+def backtest(estimator, X, y, folds, n_workers=None):
+    """
+    Evaluate `estimator` on every fold of `folds` in parallel.
+
+    Args:
+        estimator: Unfitted sklearn estimator (cloned per fold)
+        X, y: Features and target, rows aligned with folds.dates
+        folds: DateFolds (or any splitter exposing split())
+        n_workers: Worker processes; defaults to one per fold up to the CPU count
+
+    Returns:
+        DataFrame with one row per fold: window bounds, train/test sizes, MAE and timings
+    """
+    splits = list(folds.split(X, y))
+    if not splits:
+        raise ValueError("No fold has both training and test rows")
+    fold_dates = folds.dates.loc[X.index] if hasattr(X, 'index') else folds.dates
+    n_workers = n_workers or min(len(splits), os.cpu_count())
+
+    with ProcessPoolExecutor(max_workers=n_workers) as pool:
+        futures = [pool.submit(run_fold, estimator, X, y, train_idx, test_idx) for train_idx, test_idx in splits]
+        results = [future.result() for future in futures]
+
+    rows = []
+    for fold, ((train_idx, test_idx), result) in enumerate(zip(splits, results)):
+        rows.append({
+            'fold': fold,
+            'train_start': fold_dates.iloc[train_idx].min(),
+            'train_end': fold_dates.iloc[train_idx].max(),
+            'test_start': fold_dates.iloc[test_idx].min(),
+            'test_end': fold_dates.iloc[test_idx].max(),
+            'train_rows': len(train_idx),
+            'test_rows': len(test_idx),
+            **result,
+        })
+    report = pd.DataFrame(rows)
+    logging.info(f"Backtest over {len(report)} folds: mean MAE {report['mae'].mean():.2f}\n{report.to_string(index=False)}")
+    return report
@@ -0,0 +1,70 @@
+import numpy as np
+import pandas as pd
+
+# GHCN-Daily CDO exports in "standard" units: PRCP in inches, temperatures in °F
+MM_PER_INCH = 25.4
+BASIN_STATION = 'BASIN'
+
+
+def fahrenheit_to_celsius(values):
+    return (values - 32) * 5 / 9
+
+
+def precipitation_mm(prcp):
+    """PRCP from the 'precip' store table (inches) in mm; the one place that unit is converted"""
+    return prcp * MM_PER_INCH
+
+
+def _summarize(daily, keys):
+    grouped = daily.groupby(keys, observed=True)
+    summary = grouped.agg(
+        precip_total_mm=('PRCP', 'sum'),
+        rainy_days=('PRCP', lambda prcp: int((prcp > 0).sum())),
+        observed_days=('PRCP', 'count'),
+        tavg_c=('TAVG', 'mean'),
+        tmax_c=('TMAX', 'max'),
+        tmin_c=('TMIN', 'min'),
+    )
+    return summary.reset_index()
+
+
+def monthly_climate_summary(precip):
+    """
+    Monthly climate table, per station and basin-wide.
+
+    Args:
+        precip: The 'precip' store table (STATION, DATE, PRCP, TAVG, TMAX, TMIN)
+
+    Returns:
+        DataFrame keyed on (STATION, year, month) with total precipitation and rainy
+        days, and mean/max/min temperature, in mm and °C. Basin-wide rows use
+        STATION == 'BASIN' and are computed from the daily mean over all stations.
+    """
+    daily = precip[['STATION', 'DATE', 'PRCP', 'TAVG', 'TMAX', 'TMIN']].dropna(subset=['DATE']).copy()
+    daily['PRCP'] = precipitation_mm(daily['PRCP'])
+    for col in ['TAVG', 'TMAX', 'TMIN']:
+        daily[col] = fahrenheit_to_celsius(daily[col])
+    # Stations that don't report TAVG still give a daily mean from TMAX/TMIN
+    daily['TAVG'] = daily['TAVG'].fillna((daily['TMAX'] + daily['TMIN']) / 2)
+    daily['year'] = daily['DATE'].dt.year
+    daily['month'] = daily['DATE'].dt.month
+
+    per_station = _summarize(daily, ['STATION', 'year', 'month'])
+
+    basin_daily = daily.groupby(['DATE', 'year', 'month']).agg(
+        PRCP=('PRCP', 'mean'), TAVG=('TAVG', 'mean'), TMAX=('TMAX', 'max'), TMIN=('TMIN', 'min')).reset_index()
+    basin_daily['STATION'] = BASIN_STATION
+    basin = _summarize(basin_daily, ['STATION', 'year', 'month'])
+
+    summary = pd.concat([basin, per_station.astype({'STATION': str})], ignore_index=True)
+    summary['STATION'] = summary['STATION'].astype('category')
+    summary = summary.astype({'year': np.int16, 'month': np.int8, 'rainy_days': np.int16, 'observed_days': np.int16})
+    float_columns = ['precip_total_mm', 'tavg_c', 'tmax_c', 'tmin_c']
+    summary[float_columns] = summary[float_columns].astype(np.float32)
+    return summary
+
+
+def month_lookup(summary, station=BASIN_STATION):
+    """{'YYYY-MM': record} for one station, for O(1) lookups by month"""
+    rows = summary[summary['STATION'] == station]
+    return {f"{row['year']:04d}-{row['month']:02d}": row for row in rows.to_dict(orient='records')}
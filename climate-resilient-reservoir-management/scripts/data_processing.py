@@ -1,58 +1,305 @@
 import pandas as pd
 import os
+import io
+import re
+import hashlib
+import argparse
 import logging
 
+from store import (optimize_dtypes, write_table, append_table, write_partitions, table_entry, table_input_state,
+                   set_input_state, read_table)
+from sites import RESERVOIRS, GAUGES, reservoir_raw_path, gauge_raw_path
+from raw_formats import read_raw
+from climate_summary import monthly_climate_summary
+from streaming import stream_to_store, GHCN_COLUMNS, GHCN_ELEMENTS, DEFAULT_MEMORY_LIMIT_MB
+
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
 RAW_DIR = 'data/raw'
-PROCESSED_DIR = 'data/processed'
 
-def load_and_clean_data():
-    os.makedirs(PROCESSED_DIR, exist_ok=True)
+# The raw exports use day-first dates (USGS/NOAA files were re-saved with a DD-MM-YYYY locale)
+CDEC_DATE_FORMAT = '%Y%m%d'
+DAY_FIRST_DATE_FORMAT = '%d-%m-%Y'
+
+HASH_BLOCK_SIZE = 1 << 20
+
+# USGS names the daily mean discharge column after its time-series ID, e.g. '10977_00060_00003'
+DISCHARGE_COLUMN_PATTERN = re.compile(r'^\d+_00060_00003$')
+
 
-    # 1. Shasta Reservoir Data
-    logging.info("Cleaning Shasta Reservoir Data...")
-    reservoir = pd.read_csv(os.path.join(RAW_DIR, 'shasta_reservoir.csv'))
+# Columns every reservoir's partitions share, whether the export was saved by hand or by fetch.py
+CDEC_COLUMNS = ['STATION_ID', 'DURATION', 'SENSOR_NUMBER', 'SENSOR_TYPE', 'DATE', 'VALUE', 'DATA_FLAG', 'UNITS']
+
+
+def clean_cdec_storage(reservoir):
     reservoir.columns = reservoir.columns.str.strip()
-    reservoir.to_csv(os.path.join(PROCESSED_DIR, 'shasta_clean.csv'), index=False)
-    logging.info("Shasta Reservoir Data cleaned and saved.")
+    # Streamed and whole-file rebuilds project the same columns, so every part shares one schema
+    reservoir = reservoir.reindex(columns=CDEC_COLUMNS)
+    # Missing readings ('---' or blank) make some sites' values float; keep one dtype for all of them
+    reservoir['VALUE'] = pd.to_numeric(reservoir['VALUE'], errors='coerce').astype('float32')
+    return optimize_dtypes(reservoir, date_columns=['DATE'], date_format=CDEC_DATE_FORMAT,
+                           category_columns=['STATION_ID', 'DURATION', 'SENSOR_TYPE', 'DATA_FLAG', 'UNITS'])
 
-    # 2. NOAA GHCN Precipitation Data
-    logging.info("Cleaning NOAA GHCN Precipitation Data...")
-    precipitation_path = os.path.join(RAW_DIR, 'precipitation_data.csv')
-    precipitation = pd.read_csv(precipitation_path)
-    logging.info(f"Precipitation data shape: {precipitation.shape}")
 
+def clean_precipitation(precipitation):
+    logging.info(f"Precipitation data shape: {precipitation.shape}")
     if precipitation.shape[1] == 8:
         precipitation.columns = ['station_id', 'date', 'element', 'value', 'm_flag', 'q_flag', 's_flag', 'obs_time']
         prcp = precipitation[precipitation['element'] == 'PRCP']
+        return optimize_dtypes(prcp, date_columns=['date'], date_format=CDEC_DATE_FORMAT,
+                               category_columns=['station_id', 'element'])
+
+    logging.warning("Precipitation data does not have 8 columns. Skipping filtering by 'PRCP'.")
+    return optimize_dtypes(precipitation, date_columns=['DATE'], date_format=DAY_FIRST_DATE_FORMAT,
+                           category_columns=['STATION', 'NAME'])
+
+
+def clean_crops(crops):
+    return optimize_dtypes(crops, category_columns=['Data Item'])
+
+
+def clean_streamflow(streamflow):
+    """Daily USGS discharge with the gauge-specific column names normalised, so every gauge shares one schema"""
+    discharge = [col for col in streamflow.columns if DISCHARGE_COLUMN_PATTERN.match(str(col))]
+    if not discharge:
+        raise ValueError(f"No daily discharge column (<ts_id>_00060_00003) in {list(streamflow.columns)}")
+    streamflow = streamflow.rename(columns={discharge[0]: 'discharge_cfs', f'{discharge[0]}_cd': 'discharge_cd'})
+    streamflow = streamflow[['agency_cd', 'site_no', 'datetime', 'discharge_cfs', 'discharge_cd']].copy()
+    # Blank or 'Ice' readings make some gauges' discharge non-integer; keep one dtype for all of them
+    streamflow['discharge_cfs'] = pd.to_numeric(streamflow['discharge_cfs'], errors='coerce').astype('float32')
+    return optimize_dtypes(streamflow, date_columns=['datetime'], date_format=DAY_FIRST_DATE_FORMAT,
+                           category_columns=['agency_cd', 'site_no', 'discharge_cd'])
+
+
+def clean_temperature(temp_df):
+    # read_raw() has already parsed the Berkeley Earth table into typed columns
+    return optimize_dtypes(temp_df, category_columns=['SeaIce'])
+
+
+def reservoir_stage(site):
+    """Stage loading one reservoir's CDEC export into its site= partitions of 'reservoir_storage'"""
+    return {'table': 'reservoir_storage', 'input_key': site.site_id, 'path': reservoir_raw_path(site),
+            'label': f'{site.name} Storage Data', 'clean': clean_cdec_storage, 'version': 4,
+            'appendable': True, 'header_lines': 1, 'optional': site.raw_file is None,
+            'partition_by': {'site': 'STATION_ID', 'year': 'DATE'},
+            'stream': {'columns': CDEC_COLUMNS, 'date_column': 'DATE', 'station_column': 'STATION_ID'}}
+
+
+def gauge_stage(site):
+    """Stage loading one USGS gauge's daily values into its site= partitions of 'streamflow'"""
+    # skiprows drops the USGS RDB column-width row ("5s,15s,20d,...") under the header;
+    # site numbers stay strings so leading zeros survive
+    return {'table': 'streamflow', 'input_key': site.site_id, 'path': gauge_raw_path(site),
+            'label': f'{site.name} Streamflow Data', 'clean': clean_streamflow, 'version': 3,
+            'appendable': True, 'header_lines': 2, 'optional': site.raw_file is None,
+            'read_kwargs': {'skiprows': [1], 'dtype': {'site_no': str}},
+            'partition_by': {'site': 'site_no', 'year': 'datetime'}}
+
+
+# One stage per raw file. Bump a stage's 'version' when its cleaning logic changes so the
+# next run rebuilds the table. 'appendable' stages are daily feeds that only ever grow at
+# the end; 'header_lines' is how many leading lines must be re-read to parse a delta.
+# 'stream' describes the projection used when a stage is rebuilt in streaming mode.
+# Reservoirs and gauges come from the site registry (sites.py) and write partitioned tables
+# keyed by 'input_key'; 'optional' stages are skipped while their raw file is absent.
+STAGES = [reservoir_stage(site) for site in RESERVOIRS.values()] + [gauge_stage(site) for site in GAUGES.values()] + [
+    {'table': 'precip', 'file': 'precipitation_data.csv', 'label': 'NOAA GHCN Precipitation Data',
+     'clean': clean_precipitation, 'version': 1,
+     'stream': {'columns': GHCN_COLUMNS, 'date_column': 'DATE', 'station_column': 'STATION',
+                'dtypes': {element: 'float32' for element in GHCN_ELEMENTS}, 'elements': GHCN_ELEMENTS}},
+    {'table': 'crops', 'file': 'agriculture_land_use.csv', 'label': 'Agriculture Land Use Data',
+     'clean': clean_crops, 'version': 1},
+    {'table': 'temperature', 'file': 'climate_projections.csv', 'label': 'Climate Temperature Data',
+     'clean': clean_temperature, 'version': 2},
+]
+
+
+# Tables built from other store tables rather than raw files. They are rebuilt whenever an
+# input table has been rewritten or appended to since the last build.
+DERIVED_STAGES = [
+    {'table': 'climate_monthly', 'inputs': ['precip'], 'label': 'Monthly Climate Summary',
+     'build': monthly_climate_summary, 'version': 1,
+     'columns': {'precip': ['STATION', 'DATE', 'PRCP', 'TAVG', 'TMAX', 'TMIN']}},
+]
+
+
+def hash_file(path, checkpoint=None):
+    """
+    SHA-256 of a whole file in one pass.
+
+    Args:
+        path: File to hash
+        checkpoint: Optional byte offset; the digest of the first `checkpoint` bytes is also returned
+
+    Returns:
+        (full_digest, checkpoint_digest) - checkpoint_digest is None when no checkpoint was requested
+    """
+    digest = hashlib.sha256()
+    checkpoint_digest = None
+    position = 0
+    with open(path, 'rb') as f:
+        while True:
+            size = HASH_BLOCK_SIZE
+            if checkpoint is not None and checkpoint_digest is None:
+                size = min(size, checkpoint - position)
+                if size == 0:
+                    checkpoint_digest = digest.hexdigest()
+                    continue
+            block = f.read(size)
+            if not block:
+                break
+            digest.update(block)
+            position += len(block)
+    return digest.hexdigest(), checkpoint_digest
+
+
+def plan_stage(stage, path, previous, force=False):
+    """
+    Decide how to bring a stage's table up to date with its raw file.
+
+    Returns:
+        (action, input_state, offset) where action is 'skip', 'append' or 'rebuild' and
+        offset is where the new rows start for an append
+    """
+    stat = os.stat(path)
+    state = {'version': stage['version'], 'size': stat.st_size, 'mtime': stat.st_mtime}
+
+    if not force and previous and previous.get('version') == stage['version'] \
+            and previous['size'] == stat.st_size and previous['mtime'] == stat.st_mtime:
+        return 'skip', previous, None
+
+    can_append = (not force and stage.get('appendable') and previous
+                  and previous.get('version') == stage['version'] and stat.st_size > previous['size'])
+    state['sha256'], prefix_digest = hash_file(path, checkpoint=previous['size'] if can_append else None)
+
+    if force or not previous or previous.get('version') != stage['version']:
+        return 'rebuild', state, None
+    if state['sha256'] == previous['sha256']:
+        return 'skip', state, None
+    if can_append and prefix_digest == previous['sha256']:
+        with open(path, 'rb') as f:
+            f.seek(previous['size'] - 1)
+            ends_on_newline = f.read(1) == b'\n'
+        # An old file without a trailing newline means the first "new" row is really the
+        # tail of an existing one, so only append on a clean line boundary
+        if ends_on_newline:
+            return 'append', state, previous['size']
+    return 'rebuild', state, None
+
+
+def read_delta(path, stage, offset):
+    """Parse only the rows after `offset`, re-using the file's header lines"""
+    with open(path, 'rb') as f:
+        header = b''.join(f.readline() for _ in range(stage['header_lines']))
+        f.seek(offset)
+        delta = f.read()
+    return pd.read_csv(io.BytesIO(header + delta), **stage.get('read_kwargs', {}))
+
+
+def stage_name(stage):
+    return f"{stage['table']}/{stage['input_key']}" if 'input_key' in stage else stage['table']
+
+
+def save_stage(stage, df, state, source=None, append=False):
+    """Write a stage's cleaned rows: its own partitions of a shared table, or a whole table"""
+    if 'partition_by' in stage:
+        replace = None if append else {'site': stage['input_key']}
+        write_partitions(df, stage['table'], stage['partition_by'], replace=replace, source=source,
+                         input_state=state, input_key=stage['input_key'])
+    elif append:
+        append_table(df, stage['table'], input_state=state)
     else:
-        logging.warning("Precipitation data does not have 8 columns. Skipping filtering by 'PRCP'.")
-        prcp = precipitation
-
-    prcp.to_csv(os.path.join(PROCESSED_DIR, 'precip_clean.csv'), index=False)
-    logging.info("NOAA GHCN Precipitation Data cleaned and saved.")
-
-    # 3. Agriculture Land Use Data
-    logging.info("Cleaning Agriculture Land Use Data...")
-    crops = pd.read_csv(os.path.join(RAW_DIR, 'agriculture_land_use.csv'))
-    crops.to_csv(os.path.join(PROCESSED_DIR, 'crops_clean.csv'), index=False)
-    logging.info("Agriculture Land Use Data cleaned and saved.")
-
-    # 4. Streamflow Data
-    logging.info("Cleaning Streamflow Data...")
-    streamflow = pd.read_csv(os.path.join(RAW_DIR, 'streamflow_data.csv'))
-    streamflow.to_csv(os.path.join(PROCESSED_DIR, 'streamflow_clean.csv'), index=False)
-    logging.info("Streamflow Data cleaned and saved.")
-
-    # 5. Climate Projections Data
-    logging.info("Cleaning Climate Temperature Data...")
-    temp_df = pd.read_csv(os.path.join(RAW_DIR, 'climate_projections.csv'))
-    temp_df.to_csv(os.path.join(PROCESSED_DIR, 'temperature_clean.csv'), index=False)
-    logging.info("Climate Temperature Data cleaned and saved.")
+        write_table(df, stage['table'], source=source, input_state=state)
+
+
+def run_stage(stage, force=False, stream_options=None):
+    path = stage.get('path') or os.path.join(RAW_DIR, stage['file'])
+    if stage.get('optional') and not os.path.exists(path):
+        logging.info(f"{stage['label']}: no raw file at {path}, skipping.")
+        return 'missing'
+    previous = table_input_state(stage['table'], stage.get('input_key'))
+    action, state, offset = plan_stage(stage, path, previous, force)
+
+    if action == 'skip':
+        if state is not previous:
+            # Content is identical but the mtime moved (e.g. re-downloaded); remember the new stat
+            set_input_state(stage['table'], state, stage.get('input_key'))
+        logging.info(f"{stage['label']} unchanged, skipping.")
+    elif action == 'append':
+        logging.info(f"Appending new rows to {stage['label']}...")
+        delta = read_delta(path, stage, offset)
+        save_stage(stage, stage['clean'](delta), state, append=True)
+        logging.info(f"{stage['label']} delta of {len(delta)} rows cleaned and appended.")
+    elif stream_options is not None and 'stream' in stage:
+        logging.info(f"Cleaning {stage['label']} in streaming mode...")
+        stream = stage['stream']
+        partitioning = {'partition_by': stage['partition_by'], 'replace': {'site': stage['input_key']},
+                        'input_key': stage['input_key']} if 'partition_by' in stage else {}
+        stream_to_store(path, stage['table'], stage['clean'], stream['columns'], stream['date_column'],
+                        station_column=stream.get('station_column'), dtypes=stream.get('dtypes'),
+                        elements=stream.get('elements'), read_kwargs=stage.get('read_kwargs'),
+                        input_state=state, **partitioning, **stream_options)
+        logging.info(f"{stage['label']} cleaned and saved.")
+    else:
+        logging.info(f"Cleaning {stage['label']}...")
+        raw = read_raw(path, **stage.get('read_kwargs', {}))
+        save_stage(stage, stage['clean'](raw), state, source=path)
+        logging.info(f"{stage['label']} cleaned and saved.")
+    return action
+
+
+def run_derived_stage(stage, force=False):
+    entry = table_entry(stage['table'])
+    state = {'version': stage['version'],
+             'inputs': {name: table_entry(name)['written_at'] for name in stage['inputs']}}
+    if not force and entry and entry['input'] == state:
+        logging.info(f"{stage['label']} inputs unchanged, skipping.")
+        return 'skip'
+
+    logging.info(f"Building {stage['label']}...")
+    inputs = [read_table(name, columns=stage['columns'].get(name)) for name in stage['inputs']]
+    write_table(stage['build'](*inputs), stage['table'], input_state=state)
+    logging.info(f"{stage['label']} built and saved.")
+    return 'rebuild'
+
+
+def load_and_clean_data(force=False, stream_options=None):
+    """
+    Bring every store table up to date.
+
+    Args:
+        force: Rebuild every table even if its input is unchanged
+        stream_options: None to parse each file in one go, or a dict of streaming.stream_to_store
+            keyword arguments (memory_limit_mb, stations, start, end) to rebuild large tables
+            chunk by chunk with only the needed columns
+
+    Returns:
+        Dict of stage name ('reservoir_storage/SHA' for a per-site stage) to the action taken
+        ('skip', 'append', 'rebuild' or 'missing'), derived tables included
+    """
+    actions = {stage_name(stage): run_stage(stage, force=force, stream_options=stream_options) for stage in STAGES}
+    actions.update({stage['table']: run_derived_stage(stage, force=force) for stage in DERIVED_STAGES})
+    return actions
+
 
 if __name__ == '__main__':
-    load_and_clean_data()
-    logging.info("✅ All datasets cleaned and saved to 'data/processed'")
+    parser = argparse.ArgumentParser(description='Clean the raw datasets into the typed data store.')
+    parser.add_argument('--force', action='store_true', help='Rebuild every table even if its input is unchanged')
+    parser.add_argument('--stream', action='store_true',
+                        help='Read large files in bounded chunks, keeping only the columns downstream code uses')
+    parser.add_argument('--memory-limit-mb', type=int, default=DEFAULT_MEMORY_LIMIT_MB,
+                        help='Approximate memory ceiling for one streamed chunk')
+    parser.add_argument('--stations', nargs='+', help='Only keep these station IDs when streaming')
+    parser.add_argument('--start', help='Only keep observations on or after this date when streaming')
+    parser.add_argument('--end', help='Only keep observations on or before this date when streaming')
+    args = parser.parse_args()
+
+    stream_options = None
+    if args.stream:
+        stream_options = {'memory_limit_mb': args.memory_limit_mb, 'stations': args.stations,
+                          'start': args.start, 'end': args.end}
+    actions = load_and_clean_data(force=args.force, stream_options=stream_options)
+    logging.info(f"Stage actions: {actions}")
+    logging.info("✅ All datasets cleaned and saved to 'data/store'")
     logging.info("✅ Data processing complete.")
@@ -0,0 +1,180 @@
+import os
+import time
+import argparse
+import logging
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+from store import read_table
+from climate_summary import BASIN_STATION
+from sites import DEFAULT_RESERVOIR
+from reservoir_sim import load_forcing, simulate, day_of_year, MONTH_OF_DAY, DAYS_PER_YEAR, MONTHS_PER_YEAR
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+DEFAULT_MEMBERS = 1000
+DEFAULT_YEARS = 10
+DEFAULT_CHUNK_SIZE = 100
+PERCENTILES = (5, 25, 50, 75, 95)
+
+EnsembleProgress = namedtuple('EnsembleProgress', ['done', 'total', 'months', 'bands'])
+
+# Last day (0-based, 365-day year) of each calendar month
+MONTH_END_DAYS = np.flatnonzero(np.diff(MONTH_OF_DAY, append=MONTHS_PER_YEAR))
+
+
+def monthly_history(summary):
+    """
+    Historical (years, 12) precipitation ratios and temperature anomalies from 'climate_monthly'.
+
+    Each month's basin-wide precipitation total is divided by the mean total for that
+    calendar month, and its mean temperature has the calendar month's mean removed.
+    Months missing from the record count as normal (ratio 1, anomaly 0).
+    """
+    basin = summary[summary['STATION'] == BASIN_STATION].copy()
+    by_month = basin.groupby('month')
+    mean_total = by_month['precip_total_mm'].transform('mean')
+    basin['precip_ratio'] = (basin['precip_total_mm'] / mean_total.where(mean_total > 0)).fillna(1.0)
+    basin['temp_anomaly'] = (basin['tavg_c'] - by_month['tavg_c'].transform('mean')).fillna(0.0)
+
+    ratio = basin.pivot_table(index='year', columns='month', values='precip_ratio')
+    anomaly = basin.pivot_table(index='year', columns='month', values='temp_anomaly')
+    months = range(1, MONTHS_PER_YEAR + 1)
+    if ratio.empty:
+        # No observed months at all: every trace is a normal year
+        return np.ones((1, MONTHS_PER_YEAR)), np.zeros((1, MONTHS_PER_YEAR))
+    return (ratio.reindex(columns=months).fillna(1.0).to_numpy(),
+            anomaly.reindex(columns=months).fillna(0.0).to_numpy())
+
+
+def bootstrap_traces(ratio, anomaly, members, years, start_month=1, seed=42):
+    """
+    Stochastic monthly traces built by resampling whole historical years.
+
+    Drawing a year at a time keeps each year's seasonal pattern and its precipitation and
+    temperature together. Traces are rotated so column 0 is `start_month`.
+
+    Returns:
+        (precip_ratio, temp_anomaly) arrays of shape (members, years * 12 + 12)
+    """
+    rng = np.random.default_rng(seed)
+    # One spare year so a run starting mid-year still has a full horizon
+    draws = rng.integers(len(ratio), size=(members, years + 1))
+    shift = start_month - 1
+    traces = []
+    for history in (ratio, anomaly):
+        trace = history[draws].reshape(members, -1)
+        traces.append(np.ascontiguousarray(trace[:, shift:shift + years * MONTHS_PER_YEAR + MONTHS_PER_YEAR]))
+    return traces
+
+
+def _share(array):
+    block = shared_memory.SharedMemory(create=True, size=array.nbytes)
+    np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[:] = array
+    return block, (block.name, array.shape, array.dtype.str)
+
+
+def _run_members(forcing, scenario, shared, start, stop, years, month_end_index):
+    """Worker: simulate members [start, stop) reading their traces from shared memory"""
+    blocks, traces = [], []
+    for name, shape, dtype in shared:
+        block = shared_memory.SharedMemory(name=name)
+        blocks.append(block)
+        traces.append(np.ndarray(shape, dtype=dtype, buffer=block.buf)[start:stop])
+    try:
+        result = simulate(forcing, *scenario, years=years, keep_storage=True,
+                          monthly_inflow=traces[0], monthly_temperature=traces[1])
+        return start, result.storage[:, month_end_index]
+    finally:
+        del traces
+        for block in blocks:
+            block.close()
+
+
+def run_ensemble(scenario, members=DEFAULT_MEMBERS, years=DEFAULT_YEARS, forcing=None, history=None,
+                 n_workers=None, chunk_size=DEFAULT_CHUNK_SIZE, seed=42):
+    """
+    Monte Carlo storage ensemble for one slider scenario, yielding progress as chunks finish.
+
+    Precipitation/temperature traces are bootstrapped from the monthly climate summary and
+    placed in shared memory once; workers in a process pool attach to them and each
+    simulate a chunk of members. After every finished chunk the percentile bands of
+    month-end storage over the members done so far are yielded, so callers can draw a
+    fan chart that sharpens as results arrive. Closing the generator cancels pending chunks.
+
+    Args:
+        scenario: (precip_change, temp_increase, crop_area_increase, tech_adapt) slider values
+        members: Number of stochastic traces
+        years: Horizon in years
+        forcing: reservoir_sim.Forcing, loaded from the store when omitted
+        history: (ratio, anomaly) from monthly_history(), loaded from the store when omitted
+
+    Yields:
+        EnsembleProgress(done, total, months, bands) with bands[p] an array over `months`
+    """
+    forcing = forcing or load_forcing()
+    if history is None:
+        history = monthly_history(read_table('climate_monthly'))
+    start_date = pd.Timestamp(forcing.start_date)
+    traces = bootstrap_traces(*history, members=members, years=years, start_month=start_date.month, seed=seed)
+
+    # Month-end days of the run, counted from the first simulated day
+    start_day = int(day_of_year(pd.Series([start_date])).iloc[0]) - 1
+    month_ends = (np.arange(years + 1)[:, None] * DAYS_PER_YEAR + MONTH_END_DAYS).ravel() - start_day
+    month_end_index = month_ends[(month_ends >= 0) & (month_ends < years * DAYS_PER_YEAR)]
+    months = pd.period_range(start_date, periods=len(month_end_index), freq='M').to_timestamp()
+
+    shared_blocks = [_share(trace) for trace in traces]
+    storage = np.empty((members, len(month_end_index)), dtype=np.float32)
+    done = np.zeros(members, dtype=bool)
+    pool = ProcessPoolExecutor(max_workers=n_workers or os.cpu_count())
+    try:
+        futures = [pool.submit(_run_members, forcing, scenario, [spec for _, spec in shared_blocks],
+                               start, min(start + chunk_size, members), years, month_end_index)
+                   for start in range(0, members, chunk_size)]
+        for future in as_completed(futures):
+            start, chunk = future.result()
+            storage[start:start + len(chunk)] = chunk
+            done[start:start + len(chunk)] = True
+            bands = dict(zip(PERCENTILES, np.percentile(storage[done], PERCENTILES, axis=0)))
+            yield EnsembleProgress(int(done.sum()), members, months, bands)
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+        for block, _ in shared_blocks:
+            block.close()
+            block.unlink()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Monte Carlo storage ensemble for one slider scenario.')
+    parser.add_argument('--precip-change', type=float, default=0)
+    parser.add_argument('--temp-increase', type=float, default=0)
+    parser.add_argument('--crop-area-increase', type=float, default=0)
+    parser.add_argument('--tech-adapt', type=float, default=0)
+    parser.add_argument('--members', type=int, default=DEFAULT_MEMBERS)
+    parser.add_argument('--years', type=int, default=DEFAULT_YEARS)
+    parser.add_argument('--workers', type=int, help='Worker processes (default: all cores)')
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--reservoir', default=DEFAULT_RESERVOIR, help='CDEC station ID of the reservoir (see sites.py)')
+    parser.add_argument('--output', help='Write the final percentile bands to this .csv file')
+    args = parser.parse_args()
+
+    scenario = (args.precip_change, args.temp_increase, args.crop_area_increase, args.tech_adapt)
+    started = time.perf_counter()
+    progress = None
+    for progress in run_ensemble(scenario, members=args.members, years=args.years,
+                                 forcing=load_forcing(args.reservoir), n_workers=args.workers,
+                                 chunk_size=args.chunk_size, seed=args.seed):
+        logging.info(f"{progress.done}/{progress.total} members; median final storage "
+                     f"{progress.bands[50][-1]:,.0f} AF")
+    logging.info(f"Ensemble finished in {time.perf_counter() - started:.1f}s")
+
+    if args.output and progress is not None:
+        bands = pd.DataFrame({f'p{p}': values for p, values in progress.bands.items()}, index=progress.months)
+        bands.rename_axis('month').to_csv(args.output)
+        logging.info(f"✅ Percentile bands saved to {args.output}")
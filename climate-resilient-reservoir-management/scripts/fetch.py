@@ -0,0 +1,313 @@
+import os
+import csv
+import time
+import hashlib
+import asyncio
+import argparse
+import logging
+import http.client
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+
+from sites import RESERVOIRS, GAUGES, RAW_DIR, reservoir, gauge, reservoir_raw_path, gauge_raw_path
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Download raw exports from the agencies' public services into data/raw/ (in the layouts the
+# stages in data_processing.py already read) and bring the affected store tables up to date.
+# Downloads go to data/raw/.fetch/ first; a '.part' file left by a dropped connection is
+# resumed with an HTTP Range request on the next attempt or the next run.
+CDEC_URL = 'https://cdec.water.ca.gov/dynamicapp/req/CSVDataServlet'
+USGS_URL = 'https://waterservices.usgs.gov/nwis/dv/'
+NOAA_URL = 'https://www.ncei.noaa.gov/access/services/data/v1'
+DOWNLOAD_DIR = os.path.join(RAW_DIR, '.fetch')
+PRECIP_RAW_PATH = os.path.join(RAW_DIR, 'precipitation_data.csv')
+
+DEFAULT_START = '2018-01-01'
+DEFAULT_CONCURRENCY = 8
+DEFAULT_RETRIES = 3
+DEFAULT_TIMEOUT = 60
+# Seconds before the first retry; doubled for each further attempt
+RETRY_BACKOFF = 0.5
+CHUNK_SIZE = 1 << 16
+USER_AGENT = 'climate-reservoir-management/fetch'
+
+# GHCN exports list these first, then their data types alphabetically
+NOAA_LEADING_COLUMNS = ['STATION', 'NAME', 'LATITUDE', 'LONGITUDE', 'ELEVATION', 'DATE']
+
+FetchJob = namedtuple('FetchJob', ['source', 'site_id', 'url', 'path'])
+# 'bytes' is the size of the finished file, including any part resumed from an earlier run
+FetchResult = namedtuple('FetchResult', ['job', 'bytes', 'resumed', 'seconds', 'error'])
+
+
+def with_base_url(url, base_url):
+    """Point a service URL at another host (e.g. the local stub server), keeping its path"""
+    if not base_url:
+        return url
+    base = urllib.parse.urlsplit(base_url)
+    return urllib.parse.urlsplit(url)._replace(scheme=base.scheme, netloc=base.netloc).geturl()
+
+
+def cdec_job(site, start, end, base_url=None):
+    """Daily storage of one reservoir from the CDEC CSV servlet"""
+    query = urllib.parse.urlencode({'Stations': site.site_id, 'SensorNums': site.sensor, 'dur_code': 'D',
+                                    'Start': start, 'End': end})
+    return FetchJob('cdec', site.site_id, f'{with_base_url(CDEC_URL, base_url)}?{query}',
+                    os.path.join(DOWNLOAD_DIR, f'cdec_{site.site_id}.csv'))
+
+
+def usgs_job(site, start, end, base_url=None):
+    """Daily mean discharge (00060/00003) of one gauge from the NWIS daily-values service"""
+    query = urllib.parse.urlencode({'format': 'rdb', 'sites': site.site_id, 'parameterCd': '00060',
+                                    'statCd': '00003', 'startDT': start, 'endDT': end})
+    return FetchJob('usgs', site.site_id, f'{with_base_url(USGS_URL, base_url)}?{query}',
+                    os.path.join(DOWNLOAD_DIR, f'usgs_{site.site_id}.rdb'))
+
+
+def noaa_job(station, start, end, base_url=None):
+    """GHCN daily summaries of one station from the NCEI access service, in inches and °F"""
+    query = urllib.parse.urlencode({'dataset': 'daily-summaries', 'stations': station, 'startDate': start,
+                                    'endDate': end, 'format': 'csv', 'units': 'standard',
+                                    'includeStationName': 'true', 'includeStationLocation': '1'})
+    return FetchJob('noaa', station, f'{with_base_url(NOAA_URL, base_url)}?{query}',
+                    os.path.join(DOWNLOAD_DIR, 'ghcn', f'{station}.csv'))
+
+
+def partial_path(url, path):
+    """Where the download of `url` to `path` collects its bytes until it completes"""
+    # Partial files are per URL, so a new date range never resumes onto another range's bytes
+    return f"{path}.{hashlib.sha1(url.encode()).hexdigest()[:12]}.part"
+
+
+def download(url, path, timeout=DEFAULT_TIMEOUT, retries=DEFAULT_RETRIES):
+    """
+    Download `url` to `path`, resuming the partial file of an earlier attempt at the same URL.
+
+    Returns:
+        (size of the downloaded file in bytes, whether the download resumed a partial file)
+    """
+    part_path = partial_path(url, path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    resumed = False
+    for attempt in range(retries + 1):
+        offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+        headers = {'User-Agent': USER_AGENT}
+        if offset:
+            headers['Range'] = f'bytes={offset}-'
+        try:
+            with urllib.request.urlopen(urllib.request.Request(url, headers=headers), timeout=timeout) as response:
+                if offset and response.status != 206:
+                    # The server ignored the Range header and is sending the whole body again
+                    offset = 0
+                resumed = resumed or offset > 0
+                expected = response.headers.get('Content-Length')
+                with open(part_path, 'ab' if offset else 'wb') as f:
+                    written = 0
+                    while chunk := response.read(CHUNK_SIZE):
+                        f.write(chunk)
+                        written += len(chunk)
+                if expected is not None and written < int(expected):
+                    raise ConnectionError(f"connection closed after {written} of {expected} bytes")
+            os.replace(part_path, path)
+            return os.path.getsize(path), resumed
+        except urllib.error.HTTPError as error:
+            if error.code == 416 and offset:
+                # Range starts at the end of the body: the partial file is already complete
+                os.replace(part_path, path)
+                return os.path.getsize(path), True
+            if error.code < 500 or attempt == retries:
+                raise
+            logging.warning(f"{url}: HTTP {error.code}; retrying ({attempt + 1}/{retries})")
+        except (urllib.error.URLError, http.client.HTTPException, OSError) as error:
+            if attempt == retries:
+                raise
+            logging.warning(f"{url}: {error}; retrying ({attempt + 1}/{retries})")
+        time.sleep(RETRY_BACKOFF * 2 ** attempt)
+
+
+async def fetch_all(jobs, concurrency=DEFAULT_CONCURRENCY, timeout=DEFAULT_TIMEOUT, retries=DEFAULT_RETRIES):
+    """
+    Run every job with at most `concurrency` downloads in flight.
+
+    Each download runs on a worker thread; an asyncio semaphore bounds how many are
+    started, so dozens of sites are fetched without opening dozens of connections at once.
+    A failed job is reported in its result instead of cancelling the others.
+
+    Returns:
+        List of FetchResult in job order
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    loop = asyncio.get_running_loop()
+
+    async def run(job, executor):
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                size, resumed = await loop.run_in_executor(executor, download, job.url, job.path,
+                                                           timeout, retries)
+                error = None
+            except Exception as exc:  # reported per job
+                size, resumed, error = 0, False, exc
+            result = FetchResult(job, size, resumed, time.perf_counter() - started, error)
+            if error:
+                logging.error(f"{job.source} {job.site_id}: {error}")
+            else:
+                logging.info(f"{job.source} {job.site_id}: {size:,} bytes in {result.seconds:.1f}s"
+                             f"{' (resumed)' if resumed else ''}")
+            return result
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        return await asyncio.gather(*(run(job, executor) for job in jobs))
+
+
+def day_first(iso_date):
+    """'2022-01-31' -> '31-01-2022', the date layout of the hand-saved USGS/NOAA exports"""
+    return datetime.strptime(iso_date, '%Y-%m-%d').strftime('%d-%m-%Y')
+
+
+def finalize_cdec(download_path, raw_path):
+    """CSV servlet output -> the reservoir stage's columns; 'DATE TIME' (YYYYMMDD HHMM) becomes DATE"""
+    with open(download_path, newline='') as source, open(raw_path + '.tmp', 'w', newline='') as target:
+        reader = csv.DictReader(source)
+        writer = csv.writer(target)
+        writer.writerow(['STATION_ID', 'DURATION', 'SENSOR_NUMBER', 'SENSOR_TYPE', 'DATE', 'VALUE', 'DATA_FLAG', 'UNITS'])
+        for row in reader:
+            value = row['VALUE'].strip()
+            writer.writerow([row['STATION_ID'], row['DURATION'], row['SENSOR_NUMBER'], row['SENSOR_TYPE'],
+                             row['DATE TIME'][:8], '' if value == '---' else value,
+                             row['DATA_FLAG'].strip(), row['UNITS']])
+    os.replace(raw_path + '.tmp', raw_path)
+
+
+def finalize_usgs(download_path, raw_path):
+    """Tab-separated RDB -> CSV with the column-width row kept and day-first dates"""
+    with open(download_path) as source:
+        lines = [line.rstrip('\n').split('\t') for line in source if line.strip() and not line.startswith('#')]
+    if not lines:
+        raise ValueError(f"{download_path} has no data rows")
+    header, widths, rows = lines[0], lines[1], lines[2:]
+    date_index = header.index('datetime')
+    with open(raw_path + '.tmp', 'w', newline='') as target:
+        writer = csv.writer(target)
+        writer.writerows([header, widths])
+        for row in rows:
+            row[date_index] = day_first(row[date_index])
+            writer.writerow(row)
+    os.replace(raw_path + '.tmp', raw_path)
+
+
+def assemble_noaa(download_paths, raw_path=PRECIP_RAW_PATH):
+    """Combine per-station GHCN files into the precipitation export, one column per data type"""
+    rows, data_types = [], set()
+    for path in download_paths:
+        with open(path, newline='') as source:
+            for row in csv.DictReader(source):
+                row['DATE'] = day_first(row['DATE'])
+                rows.append(row)
+                data_types.update(row)
+    columns = NOAA_LEADING_COLUMNS + sorted(data_types - set(NOAA_LEADING_COLUMNS))
+    with open(raw_path + '.tmp', 'w', newline='') as target:
+        writer = csv.DictWriter(target, fieldnames=columns, restval='')
+        writer.writeheader()
+        writer.writerows(rows)
+    os.replace(raw_path + '.tmp', raw_path)
+
+
+def existing_noaa_stations(raw_path=PRECIP_RAW_PATH):
+    """GHCN stations in the current precipitation export"""
+    if not os.path.exists(raw_path):
+        return []
+    with open(raw_path, newline='') as source:
+        return sorted({row['STATION'] for row in csv.DictReader(source)})
+
+
+def finalize(results):
+    """
+    Move completed downloads into data/raw/ in the stage layouts.
+
+    GHCN stations are only assembled into the precipitation export when every requested
+    station downloaded, so a partial refresh never replaces the basin-wide file.
+
+    Returns:
+        Raw paths that were (re)written
+    """
+    written = []
+    for result in results:
+        if result.error is not None or result.job.source == 'noaa':
+            continue
+        if result.job.source == 'cdec':
+            raw_path = reservoir_raw_path(reservoir(result.job.site_id))
+            finalize_cdec(result.job.path, raw_path)
+        else:
+            raw_path = gauge_raw_path(gauge(result.job.site_id))
+            finalize_usgs(result.job.path, raw_path)
+        written.append(raw_path)
+
+    noaa = [result for result in results if result.job.source == 'noaa']
+    if noaa and all(result.error is None for result in noaa):
+        assemble_noaa([result.job.path for result in noaa])
+        written.append(PRECIP_RAW_PATH)
+    elif noaa:
+        logging.warning("Some GHCN stations failed; keeping the current precipitation export.")
+    return written
+
+
+def update_store(raw_paths, force=False):
+    """Run the data_processing stages fed by `raw_paths`, then any derived tables that depend on them"""
+    # Imported here so building jobs and downloading do not need pandas/pyarrow
+    from data_processing import STAGES, DERIVED_STAGES, run_stage, run_derived_stage, stage_name
+
+    written = {os.path.normpath(path) for path in raw_paths}
+    actions = {}
+    for stage in STAGES:
+        path = stage.get('path') or os.path.join(RAW_DIR, stage['file'])
+        if os.path.normpath(path) in written:
+            actions[stage_name(stage)] = run_stage(stage, force=force)
+    for stage in DERIVED_STAGES:
+        actions[stage['table']] = run_derived_stage(stage)
+    return actions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Fetch CDEC storage, USGS discharge and NOAA GHCN daily data '
+                                                 'concurrently and load it into the data store.')
+    parser.add_argument('--reservoirs', nargs='*', default=sorted(RESERVOIRS),
+                        help='CDEC station IDs (default: every reservoir in sites.py)')
+    parser.add_argument('--gauges', nargs='*', default=sorted(GAUGES),
+                        help='USGS site numbers (default: every gauge in sites.py)')
+    parser.add_argument('--noaa-stations', nargs='*',
+                        help='GHCN station IDs; with no IDs, the stations of the current precipitation export')
+    parser.add_argument('--start', default=DEFAULT_START, help='First date (YYYY-MM-DD)')
+    parser.add_argument('--end', default=date.today().isoformat(), help='Last date (YYYY-MM-DD)')
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY, help='Downloads in flight')
+    parser.add_argument('--retries', type=int, default=DEFAULT_RETRIES)
+    parser.add_argument('--timeout', type=float, default=DEFAULT_TIMEOUT, help='Seconds per request')
+    parser.add_argument('--base-url', help='Send every request to this host instead, e.g. the stub data server')
+    parser.add_argument('--no-store', action='store_true', help='Only update data/raw/')
+    parser.add_argument('--force', action='store_true', help='Rebuild the fetched tables even if unchanged')
+    args = parser.parse_args()
+
+    jobs = [cdec_job(reservoir(site_id), args.start, args.end, args.base_url) for site_id in args.reservoirs]
+    jobs += [usgs_job(gauge(site_id), args.start, args.end, args.base_url) for site_id in args.gauges]
+    if args.noaa_stations is not None:
+        stations = args.noaa_stations or existing_noaa_stations()
+        jobs += [noaa_job(station, args.start, args.end, args.base_url) for station in stations]
+
+    started = time.perf_counter()
+    results = asyncio.run(fetch_all(jobs, concurrency=args.concurrency, timeout=args.timeout, retries=args.retries))
+    failed = [result for result in results if result.error is not None]
+    logging.info(f"Fetched {len(results) - len(failed)}/{len(results)} downloads, "
+                 f"{sum(result.bytes for result in results):,} bytes in {time.perf_counter() - started:.1f}s")
+
+    raw_paths = finalize(results)
+    if raw_paths and not args.no_store:
+        actions = update_store(raw_paths, force=args.force)
+        logging.info(f"Stage actions: {actions}")
+    if failed:
+        logging.error(f"Failed: {', '.join(f'{r.job.source} {r.job.site_id}' for r in failed)}")
+        raise SystemExit(1)
+    logging.info("✅ Fetch complete.")
@@ -0,0 +1,68 @@
+import pandas as pd
+import os
+import json
+import hashlib
+import logging
+from datetime import datetime, timezone
+
+import joblib
+
+MODEL_DIR = 'models'
+RESERVOIR_MODEL_NAME = 'reservoir_storage'
+
+
+def data_hash(features, target):
+    """Stable SHA-256 of the training data, recorded with the artifact"""
+    digest = hashlib.sha256()
+    digest.update(pd.util.hash_pandas_object(features, index=False).values.tobytes())
+    digest.update(pd.util.hash_pandas_object(target, index=False).values.tobytes())
+    digest.update(','.join(map(str, features.columns)).encode())
+    return digest.hexdigest()
+
+
+def artifact_pattern(name=RESERVOIR_MODEL_NAME, model_dir=MODEL_DIR):
+    """Glob matching every saved version of `name` (for ModelRegistry.watch)"""
+    return os.path.join(model_dir, f'{name}-*.joblib')
+
+
+def save_model_artifact(pipeline, metadata, name=RESERVOIR_MODEL_NAME, model_dir=MODEL_DIR):
+    """
+    Save a fitted pipeline and its metadata as one versioned artifact.
+
+    The pickle is written uncompressed so its numpy arrays (the forest's node
+    tables) can be memory-mapped on load, and it is renamed into place only once
+    complete so a watching dashboard never reads a partial file. The metadata is
+    also written next to it as JSON for inspection without unpickling.
+
+    Returns:
+        Path of the artifact
+    """
+    os.makedirs(model_dir, exist_ok=True)
+    trained_at = datetime.now(timezone.utc)
+    version = trained_at.strftime('%Y%m%dT%H%M%S')
+    metadata = dict(metadata, name=name, version=version, trained_at=trained_at.isoformat())
+
+    path = os.path.join(model_dir, f'{name}-{version}.joblib')
+    tmp_path = path + '.tmp'
+    joblib.dump({'pipeline': pipeline, 'metadata': metadata}, tmp_path)
+    os.replace(tmp_path, path)
+
+    with open(os.path.join(model_dir, f'{name}-{version}.json'), 'w') as f:
+        json.dump(metadata, f, indent=2, default=str)
+    logging.info(f"Saved model artifact {path}")
+    return path
+
+
+def load_model_artifact(path, mmap_mode='r'):
+    """
+    Load an artifact written by save_model_artifact.
+
+    With mmap_mode='r' the large arrays are mapped read-only from the file, so
+    several worker processes loading the same artifact share one copy in the
+    page cache instead of each holding its own.
+
+    Returns:
+        (pipeline, metadata)
+    """
+    artifact = joblib.load(path, mmap_mode=mmap_mode)
+    return artifact['pipeline'], artifact['metadata']
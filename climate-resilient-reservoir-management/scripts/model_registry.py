@@ -0,0 +1,139 @@
+import numpy as np
+import os
+import glob
+import time
+import threading
+import logging
+
+# How often (seconds) a watched model checks its artifact directory for a newer file
+RELOAD_CHECK_INTERVAL = 5.0
+
+
+def _default_loader(path):
+    import joblib
+    return joblib.load(path)
+
+
+class ModelRegistry:
+    """
+    Process-wide cache of fitted models, looked up by name.
+
+    Models are either registered directly (e.g. fitted once at startup) or watched:
+    a watched model is loaded from the newest artifact matching a glob pattern and
+    reloaded when a newer artifact appears, so a retrained model goes live without
+    restarting the server.
+    """
+
+    def __init__(self, reload_check_interval=RELOAD_CHECK_INTERVAL):
+        self.reload_check_interval = reload_check_interval
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def register(self, name, model, version=None, metadata=None):
+        """Make an already fitted model available as `name`"""
+        with self._lock:
+            previous = self._entries.get(name, {})
+            self._entries[name] = {
+                'model': model,
+                'version': version if version is not None else previous.get('version', 0) + 1,
+                'metadata': metadata or {},
+                'pattern': None,
+                'loader': None,
+                'source': None,
+                'source_mtime': None,
+                'checked_at': time.monotonic(),
+            }
+        logging.info(f"Registered model '{name}' (version {self._entries[name]['version']})")
+
+    def watch(self, name, pattern, loader=None, fallback=None, fallback_factory=None, lazy=False):
+        """
+        Serve `name` from the newest artifact matching `pattern`.
+
+        Args:
+            name: Registry key
+            pattern: Glob for artifact files, e.g. 'models/reservoir_storage-*.joblib'
+            loader: Callable path -> model (or (model, metadata)); joblib.load by default
+            fallback: Model to serve until an artifact exists
+            fallback_factory: Zero-argument callable building the fallback, called the first
+                time it is needed instead of up front
+            lazy: Load the artifact on the first get() rather than now
+        """
+        with self._lock:
+            self._entries[name] = {
+                'model': fallback,
+                'version': 'fallback' if fallback is not None else None,
+                'metadata': {},
+                'pattern': pattern,
+                'loader': loader or _default_loader,
+                'fallback_factory': fallback_factory,
+                'source': None,
+                'source_mtime': None,
+                'checked_at': None,
+            }
+        if not lazy:
+            self._maybe_reload(name, force=True)
+
+    def _maybe_reload(self, name, force=False):
+        entry = self._entries[name]
+        if entry['pattern'] is None:
+            return
+        now = time.monotonic()
+        if not force and entry['checked_at'] is not None and now - entry['checked_at'] < self.reload_check_interval:
+            return
+
+        with self._lock:
+            entry['checked_at'] = now
+            candidates = glob.glob(entry['pattern'])
+            if not candidates:
+                return
+            newest = max(candidates, key=os.path.getmtime)
+            mtime = os.path.getmtime(newest)
+            if newest == entry['source'] and mtime == entry['source_mtime']:
+                return
+
+            try:
+                loaded = entry['loader'](newest)
+            except Exception as e:
+                # Keep serving the current model; the next check retries
+                logging.error(f"Could not load model '{name}' from {newest}: {e}")
+                return
+            model, metadata = loaded if isinstance(loaded, tuple) else (loaded, {})
+            entry.update(model=model, metadata=metadata, source=newest, source_mtime=mtime,
+                         version=metadata.get('version', os.path.basename(newest)))
+        logging.info(f"Loaded model '{name}' from {newest}")
+
+    def get(self, name):
+        """Return the current model for `name`, picking up a newer artifact if one appeared"""
+        if name not in self._entries:
+            raise KeyError(f"No model registered under '{name}'")
+        self._maybe_reload(name)
+        entry = self._entries[name]
+        if entry['model'] is None and entry.get('fallback_factory') is not None:
+            with self._lock:
+                if entry['model'] is None:
+                    entry.update(model=entry['fallback_factory'](), version='fallback')
+                    logging.info(f"Built fallback model for '{name}'")
+        model = entry['model']
+        if model is None:
+            raise LookupError(f"Model '{name}' has no artifact yet and no fallback")
+        return model
+
+    def version(self, name):
+        return self._entries[name]['version']
+
+    def metadata(self, name):
+        # A lazily watched model has no metadata until its artifact is first loaded
+        self._maybe_reload(name)
+        return self._entries[name]['metadata']
+
+    def predict(self, name, X):
+        """Predict a whole batch of rows (2-D array-like) in one call"""
+        model = self.get(name)
+        if hasattr(X, 'columns'):
+            # Keep DataFrames intact so models fitted with feature names still see them
+            return model.predict(X)
+        return model.predict(np.atleast_2d(np.asarray(X, dtype=float)))
+
+
+# Shared by every callback in the process
+REGISTRY = ModelRegistry()
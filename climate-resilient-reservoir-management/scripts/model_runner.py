@@ -1,121 +1,175 @@
 import pandas as pd
-from sklearn.model_selection import train_test_split, GridSearchCV
+import numpy as np
 from sklearn.linear_model import LinearRegression
 from sklearn.ensemble import RandomForestRegressor
 from sklearn.metrics import mean_absolute_error
 from sklearn.impute import SimpleImputer
 from sklearn.preprocessing import StandardScaler
+from sklearn.pipeline import Pipeline
+import argparse
 import logging
+import os
+
+from store import read_table
+from sites import DEFAULT_RESERVOIR, reservoir, model_name, scenario_model_name
+from raw_formats import SEA_ICE_AIR
+from model_artifacts import save_model_artifact, data_hash
+from search import BudgetedSearch
+from backtest import DateFolds, backtest
+from scenarios import SLIDER_AXES, BASE_INFLOW, INFLOW_PER_PRECIP_PCT
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-# Paths to raw data files
-PRECIPITATION_PATH = 'data/raw/precipitation_data.csv'
-CLIMATE_PROJECTIONS_PATH = 'data/raw/climate_projections.csv'
-AGRICULTURE_LAND_USE_PATH = 'data/raw/agriculture_land_use.csv'
-STREAMFLOW_PATH = 'data/raw/streamflow_data.csv'
-SHASTA_RESERVOIR_PATH = 'data/raw/shasta_reservoir.csv'
-
-def load_data():
-    # Load the datasets
-    precipitation = pd.read_csv(PRECIPITATION_PATH)
-    climate_projections = pd.read_csv(CLIMATE_PROJECTIONS_PATH)
-    agriculture_land_use = pd.read_csv(AGRICULTURE_LAND_USE_PATH)
-    streamflow = pd.read_csv(STREAMFLOW_PATH)
-    shasta_reservoir = pd.read_csv(SHASTA_RESERVOIR_PATH)
-
-    # Extract year from date columns
-    precipitation['year'] = pd.to_datetime(precipitation['DATE'], errors='coerce').dt.year
-    streamflow['year'] = pd.to_datetime(streamflow['datetime'], errors='coerce').dt.year
-    shasta_reservoir['year'] = pd.to_datetime(shasta_reservoir['DATE'], errors='coerce').dt.year  # Or use 'DATE.1'
-
-    # For agriculture land use, assuming you want to merge on a range of years
-    agriculture_land_use['year'] = agriculture_land_use['Min Year']  # Or pick the year based on your requirement
-
-    # Print the columns to ensure 'year' is added
-    logging.info(f"Precipitation Columns: {precipitation.columns}")
-    logging.info(f"Streamflow Columns: {streamflow.columns}")
-    logging.info(f"Shasta Reservoir Columns: {shasta_reservoir.columns}")
-    logging.info(f"Agriculture Land Use Columns: {agriculture_land_use.columns}")
+# Largest gap (days) a daily observation may be carried forward to a reservoir date
+ASOF_TOLERANCE = pd.Timedelta(days=3)
+DISCHARGE_COLUMN = 'discharge_cfs'
+FEATURE_COLUMNS = ['PRCP', 'TAVG', 'DISCHARGE', 'TEMP_ANOMALY', 'CROP_ITEMS']
+
+def load_data(site_id=DEFAULT_RESERVOIR):
+    # Load the typed datasets written by data_processing.py (dates are already parsed)
+    # Only the columns the model uses are read from the columnar files, and only the
+    # partitions of this reservoir and its inflow gauge
+    site = reservoir(site_id)
+    precipitation = read_table('precip', columns=['STATION', 'DATE', 'PRCP', 'TAVG'])
+    climate_projections = read_table('temperature')
+    agriculture_land_use = read_table('crops')
+    streamflow = read_table('streamflow', columns=['datetime', DISCHARGE_COLUMN], filters={'site': site.gauge})
+    reservoir_storage = read_table('reservoir_storage', columns=['STATION_ID', 'DATE', 'VALUE'],
+                                   filters={'site': site.site_id})
+    if reservoir_storage.empty:
+        raise ValueError(f"No storage data for {site.name} ({site.site_id}); add its CDEC export and run data_processing.py")
 
     # Filter out rows with invalid dates
-    precipitation = precipitation.dropna(subset=['year'])
-    streamflow = streamflow.dropna(subset=['year'])
-    shasta_reservoir = shasta_reservoir.dropna(subset=['year'])
+    precipitation = precipitation.dropna(subset=['DATE'])
+    streamflow = streamflow.dropna(subset=['datetime'])
+    reservoir_storage = reservoir_storage.dropna(subset=['DATE'])
     
-    return precipitation, climate_projections, agriculture_land_use, streamflow, shasta_reservoir
+    return precipitation, climate_projections, agriculture_land_use, streamflow, reservoir_storage
+
+
+def daily_mean(df, date_column, value_columns):
+    """Collapse a source to one row per day (e.g. basin mean over all GHCN stations)"""
+    # Parquet may hand back ms/us timestamps; merge_asof needs one resolution on both sides
+    days = df[date_column].dt.normalize().astype('datetime64[ns]')
+    daily = df.groupby(days)[value_columns].mean()
+    return daily.rename_axis('DATE').reset_index().sort_values('DATE')
+
+
+def monthly_temperature_anomaly(climate_projections):
+    """(year, month, TEMP_ANOMALY) from the Berkeley Earth 'temperature' table (sea ice from air temperatures)"""
+    air = climate_projections[climate_projections['SeaIce'] == SEA_ICE_AIR]
+    monthly = air[['Year', 'Month', 'Anomaly']].dropna()
+    monthly.columns = ['year', 'month', 'TEMP_ANOMALY']
+    return monthly.astype({'year': int, 'month': int}).drop_duplicates(['year', 'month'])
+
+
+def crop_activity_by_year(agriculture_land_use):
+    """Number of land-use series reported in each year (Min Year <= year <= Max Year)"""
+    years_reported = agriculture_land_use[['Min Year', 'Max Year']].dropna().astype(int)
+    first, last = years_reported['Min Year'], years_reported['Max Year']
+    years = pd.RangeIndex(first.min(), last.max() + 2)
+    # Difference array: +1 where a series starts, -1 the year after it ends
+    starts = first.value_counts().reindex(years, fill_value=0)
+    stops = (last + 1).value_counts().reindex(years, fill_value=0)
+    counts = (starts - stops).cumsum()
+    return pd.DataFrame({'year': years, 'CROP_ITEMS': counts.values})
+
 
+def prepare_model_data(precipitation, climate_projections, agriculture_land_use, streamflow, reservoir_storage):
+    """
+    Align every source to the daily reservoir storage series and build features/target.
 
-def prepare_model_data(precipitation, climate_projections, agriculture_land_use, streamflow, shasta_reservoir):
-    # Ensure that climate_projections has a 'year' column; if not, extract it or create one
-    if 'year' not in climate_projections.columns:
-        # Assuming the year is embedded within one of the columns (like 'Temperature.1')
-        climate_projections['year'] = climate_projections['Temperature.1'].str.extract(r'(\d{4})')
-        climate_projections['year'] = pd.to_numeric(climate_projections['year'], errors='coerce')  # Convert to numeric
+    Returns:
+        (features, target, dates) with one row per reservoir day, in date order
 
-    # Handle missing values in 'year' column before converting
-    climate_projections['year'] = climate_projections['year'].fillna(-1).astype(int)  # Fill NaN with a placeholder (-1 or other)
+    Each source is first reduced to its own natural resolution keyed on date (daily
+    basin-mean precipitation, daily discharge, monthly temperature anomaly, yearly
+    crop activity) and then joined to the reservoir dates, so the result has exactly
+    one row per reservoir day instead of a per-year cross product.
+    """
+    data = daily_mean(reservoir_storage, 'DATE', ['VALUE'])
 
-    # Merge datasets on 'year'
-    data = shasta_reservoir.merge(precipitation, on='year', how='left')
-    data = data.merge(climate_projections, on='year', how='left')
-    data = data.merge(agriculture_land_use, on='year', how='left')
-    data = data.merge(streamflow, on='year', how='left')
+    # Daily sources: carry the latest observation forward a few days at most
+    precip_daily = daily_mean(precipitation, 'DATE', ['PRCP', 'TAVG'])
+    data = pd.merge_asof(data, precip_daily, on='DATE', direction='backward', tolerance=ASOF_TOLERANCE)
 
-    # Check the merged data to find the correct column names for the features
+    flow_daily = daily_mean(streamflow, 'datetime', [DISCHARGE_COLUMN]).rename(columns={DISCHARGE_COLUMN: 'DISCHARGE'})
+    data = pd.merge_asof(data, flow_daily, on='DATE', direction='backward', tolerance=ASOF_TOLERANCE)
+
+    # Coarser sources join on their calendar keys
+    data['year'] = data['DATE'].dt.year
+    data['month'] = data['DATE'].dt.month
+    data = data.merge(monthly_temperature_anomaly(climate_projections), on=['year', 'month'], how='left')
+    data = data.merge(crop_activity_by_year(agriculture_land_use), on='year', how='left')
+
+    logging.info(f"Aligned data: {len(data)} rows, {data.memory_usage(deep=True).sum() / 1e6:.2f} MB")
     logging.info(f"Merged Data Columns: {data.columns}")
-    
-    # Adjust the feature selection according to the actual column names in the merged DataFrame
-    features = data[['PRCP', 'TAVG', 'Min Year', '10977_00060_00003']]  # Replace with correct columns
-    target = data['VALUE']  # Adjust based on your actual target column (e.g., 'reservoir_level')
 
-    # Drop columns that are completely empty (all NaN values)
-    features = features.dropna(axis=1, how='all')
+    features = data[[col for col in FEATURE_COLUMNS if col in data.columns]]
+    target = data['VALUE']
 
-    # Check for empty columns and log
+    # Drop columns that are completely empty (all NaN values)
     empty_columns = features.columns[features.isnull().all()]
     if not empty_columns.empty:
         logging.warning(f"Features with no observed values (all NaN): {empty_columns.tolist()}")
+    features = features.drop(columns=empty_columns)
 
-    # Handle missing values in features (impute if needed)
-    imputer = SimpleImputer(strategy='mean')
-
-    # Before imputation, check for missing data in each column
+    # Missing feature values are imputed inside the model pipeline, so the fitted
+    # imputer is saved with the model and applied the same way at inference time
     logging.info(f"Features before imputation: {features.isnull().sum()}")
 
-    # Drop columns that are entirely NaN
-    features = features.dropna(axis=1, how='all')  # Drop columns with all NaN values
-
-    # Impute missing values
-    features_imputed = pd.DataFrame(imputer.fit_transform(features), columns=features.columns)
-
     # Ensure that target is also clean (if needed)
     target = target.fillna(target.mean())  # Impute target if there are any NaN values
     
-    return features_imputed, target
+    return features.reset_index(drop=True), target.reset_index(drop=True), data['DATE'].reset_index(drop=True)
 
 
-def train_and_evaluate_model(features, target):
-    # Feature Scaling: Standardizing features before training
-    scaler = StandardScaler()
-    features_scaled = pd.DataFrame(scaler.fit_transform(features), columns=features.columns)
-    
-    # Train-test split
-    X_train, X_test, y_train, y_test = train_test_split(features_scaled, target, test_size=0.2, random_state=42)
+def build_pipeline():
+    """Imputer, scaler and model in one estimator so they are fitted and saved together"""
+    return Pipeline([
+        # Handle missing values in features
+        ('imputer', SimpleImputer(strategy='mean')),
+        # Feature Scaling: Standardizing features before training
+        ('scaler', StandardScaler()),
+        # Model selection: Using RandomForest as it handles non-linearity well
+        ('model', RandomForestRegressor(n_estimators=100, random_state=42)),
+    ])
 
-    # Model selection: Using RandomForest as it handles non-linearity well
-    model = RandomForestRegressor(n_estimators=100, random_state=42)
 
-    # Hyperparameter tuning (optional, GridSearchCV)
-    param_grid = {'n_estimators': [100, 200], 'max_depth': [None, 10, 20, 30]}
-    grid_search = GridSearchCV(estimator=model, param_grid=param_grid, cv=3, n_jobs=-1, scoring='neg_mean_absolute_error')
-    grid_search.fit(X_train, y_train)
-    
-    # Get best model
-    best_model = grid_search.best_estimator_
+# Exhaustive grid (the original search space) and the wider space sampled by random/halving search
+PARAM_GRID = {'model__n_estimators': [100, 200], 'model__max_depth': [None, 10, 20, 30]}
+PARAM_DISTRIBUTIONS = {
+    'model__n_estimators': [50, 100, 200, 300],
+    'model__max_depth': [None, 5, 10, 20, 30],
+    'model__min_samples_leaf': [1, 2, 4, 8],
+    'model__max_features': [1.0, 0.5, 'sqrt'],
+}
+
+# Share of the most recent dates held out for the final test score
+TEST_FRACTION = 0.2
+SEARCH_FOLDS = 3
+BACKTEST_FOLDS = 5
+
+def train_and_evaluate_model(features, target, dates, search_mode='halving', n_candidates=16, n_workers=None,
+                             time_budget=None, cpu_budget=None):
+    # Chronological train-test split: a random split would train on days after the ones it is scored on
+    cutoff = dates.quantile(1 - TEST_FRACTION)
+    train_mask = (dates < cutoff).to_numpy()
+    X_train, X_test = features[train_mask], features[~train_mask]
+    y_train, y_test = target[train_mask], target[~train_mask]
+
+    model = build_pipeline()
 
-    # Train the model
+    # Hyperparameter tuning within a wall-clock/CPU budget; configs scored on the same data before are cached
+    search = BudgetedSearch(model, PARAM_GRID if search_mode == 'grid' else PARAM_DISTRIBUTIONS,
+                            mode=search_mode, n_candidates=n_candidates, n_workers=n_workers,
+                            cv=DateFolds(dates, n_splits=SEARCH_FOLDS),
+                            time_budget=time_budget, cpu_budget=cpu_budget)
+    best_params = search.fit(X_train, y_train, data_hash(X_train, y_train))
+
+    # Train the best configuration once on the full training split
+    best_model = model.set_params(**best_params)
     best_model.fit(X_train, y_train)
 
     # Make predictions and evaluate the model
@@ -123,20 +177,105 @@ def train_and_evaluate_model(features, target):
     mae = mean_absolute_error(y_test, y_pred)
     logging.info(f'Model Mean Absolute Error: {mae}')
 
-    return best_model
+    # Walk-forward backtest of the chosen configuration over the whole history
+    report = backtest(model, features, target, DateFolds(dates, n_splits=BACKTEST_FOLDS), n_workers=n_workers)
+
+    return best_model, mae, report
+
+
+# Scenarios sampled from the slider ranges, and the trailing window (days) they perturb
+SCENARIO_SAMPLES = 400
+SCENARIO_BASELINE_DAYS = 365
+# TAVG is in °F; the temperature slider is in °C
+FAHRENHEIT_PER_CELSIUS = 1.8
+
+def scenario_features(baseline, precip_change, temp_increase, crop_area_increase):
+    """
+    Apply one dashboard scenario to a block of feature rows.
+
+    Precipitation and crop activity scale by the slider percentage, discharge follows
+    precipitation at the scenario engine's inflow rate, and both temperature columns
+    shift by the warming. Technology adoption has no counterpart among the features.
+    """
+    scenario = baseline.copy()
+    adjustments = {
+        'PRCP': lambda values: values * (1 + precip_change / 100),
+        'DISCHARGE': lambda values: values * (BASE_INFLOW + precip_change * INFLOW_PER_PRECIP_PCT) / BASE_INFLOW,
+        'TAVG': lambda values: values + temp_increase * FAHRENHEIT_PER_CELSIUS,
+        'TEMP_ANOMALY': lambda values: values + temp_increase,
+        'CROP_ITEMS': lambda values: values * (1 + crop_area_increase / 100),
+    }
+    for column, adjust in adjustments.items():
+        if column in scenario.columns:
+            scenario[column] = adjust(scenario[column])
+    return scenario
+
+
+def fit_scenario_model(model, features, dates, n_samples=SCENARIO_SAMPLES, seed=42):
+    """
+    Fit the dashboard's (precip, temp, crop, tech) -> storage regression to the storage model.
+
+    Each sampled slider scenario is applied to the last year of observed features and
+    scored by the trained pipeline; a linear fit of the mean predicted storage on the
+    slider values gives the model the dashboard sliders and scenario table use.
+
+    Returns:
+        Fitted LinearRegression taking rows in SLIDER_AXES order
+    """
+    rng = np.random.default_rng(seed)
+    baseline = features[(dates > dates.max() - pd.Timedelta(days=SCENARIO_BASELINE_DAYS)).to_numpy()]
+    scenarios = np.column_stack([rng.uniform(minimum, maximum, n_samples)
+                                 for minimum, maximum, _ in SLIDER_AXES.values()])
+    # One predict call over every scenario's copy of the baseline window
+    blocks = [scenario_features(baseline, precip, temp, crop) for precip, temp, crop, _ in scenarios]
+    storage = model.predict(pd.concat(blocks, ignore_index=True)).reshape(n_samples, len(baseline)).mean(axis=1)
+    logging.info(f"Scenario model fitted on {n_samples} scenarios x {len(baseline)} baseline days")
+    return LinearRegression().fit(scenarios, storage)
 
 
 if __name__ == '__main__':
-    logging.info("Loading data...")
-    precipitation, climate_projections, agriculture_land_use, streamflow, shasta_reservoir = load_data()
+    parser = argparse.ArgumentParser(description='Train the reservoir storage model.')
+    parser.add_argument('--search', choices=['grid', 'random', 'halving'], default='halving',
+                        help='Hyperparameter search strategy')
+    parser.add_argument('--candidates', type=int, default=16, help='Configs sampled by random/halving search')
+    parser.add_argument('--workers', type=int, default=None, help='Worker processes (default: all CPUs)')
+    parser.add_argument('--time-budget', type=float, default=None, help='Wall-clock seconds for the search')
+    parser.add_argument('--cpu-budget', type=float, default=None, help='Total CPU seconds for the search')
+    parser.add_argument('--reservoir', default=DEFAULT_RESERVOIR, help='CDEC station ID of the reservoir to model (see sites.py)')
+    args = parser.parse_args()
+
+    logging.info(f"Loading data for {reservoir(args.reservoir).name}...")
+    precipitation, climate_projections, agriculture_land_use, streamflow, reservoir_storage = load_data(args.reservoir)
 
     logging.info("Preparing model data...")
-    features, target = prepare_model_data(precipitation, climate_projections, agriculture_land_use, streamflow, shasta_reservoir)
+    features, target, dates = prepare_model_data(precipitation, climate_projections, agriculture_land_use, streamflow, reservoir_storage)
 
     logging.info("Training and evaluating model...")
-    model = train_and_evaluate_model(features, target)
+    model, mae, backtest_report = train_and_evaluate_model(features, target, dates, search_mode=args.search, n_candidates=args.candidates,
+                                          n_workers=args.workers, time_budget=args.time_budget,
+                                          cpu_budget=args.cpu_budget)
 
     logging.info("Model training completed.")
+    artifact_path = save_model_artifact(model, {
+        'reservoir': reservoir(args.reservoir).site_id,
+        'feature_names': list(features.columns),
+        'target': 'VALUE',
+        'mae': float(mae),
+        'backtest': backtest_report.to_dict(orient='records'),
+        'data_hash': data_hash(features, target),
+        'params': {key: value for key, value in model.get_params().items() if key.startswith('model__')},
+    }, name=model_name(args.reservoir))
+    logging.info(f"Model saved to {artifact_path}")
+
+    # The dashboard's scenario sliders are served by a regression fitted to this model
+    scenario_model = fit_scenario_model(model, features, dates)
+    scenario_path = save_model_artifact(scenario_model, {
+        'reservoir': reservoir(args.reservoir).site_id,
+        'feature_names': list(SLIDER_AXES),
+        'target': 'VALUE',
+        'storage_model': os.path.basename(artifact_path),
+    }, name=scenario_model_name(args.reservoir))
+    logging.info(f"Scenario model saved to {scenario_path}")
     logging.info("Model evaluation completed.")
     logging.info("✅ Model training and evaluation complete.")
     logging.info("✅ Model is ready for predictions.")
@@ -0,0 +1,160 @@
+import re
+import logging
+import zipfile
+import xml.etree.ElementTree as ET
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+# Raw exports are not always what their extension says: climate_projections.csv is an
+# Excel workbook holding a Berkeley Earth anomaly table. read_raw() looks at the first
+# bytes instead and picks the parser, so a mislabelled file is read properly once, at
+# ingest, rather than failing (or being misread) by every consumer.
+XLSX_MAGIC = b'PK\x03\x04'
+SPREADSHEET_NS = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+
+# Berkeley Earth "complete" tables: year, month, then anomaly/uncertainty pairs (°C relative
+# to 1951-1980) for the monthly value and its annual, 5-, 10- and 20-year moving averages
+BERKELEY_COLUMNS = ['Year', 'Month', 'Anomaly', 'Unc', 'Anomaly_Annual', 'Unc_Annual', 'Anomaly_5yr', 'Unc_5yr',
+                    'Anomaly_10yr', 'Unc_10yr', 'Anomaly_20yr', 'Unc_20yr']
+# Land+ocean tables repeat the series for two treatments of sea ice; the first comes from air temperatures
+SEA_ICE_AIR = 'air'
+SEA_ICE_WATER = 'water'
+# Above this share of unparseable data rows the table is rejected rather than stored with holes
+MAX_REJECTED_FRACTION = 0.01
+
+ParseReport = namedtuple('ParseReport', ['format', 'rows', 'data_rows', 'rejected', 'sections'])
+
+
+def sniff_format(path):
+    """'xlsx', 'berkeley' (a '%'-commented text table) or 'csv', from the file's content"""
+    with open(path, 'rb') as f:
+        head = f.read(4096)
+    if head.startswith(XLSX_MAGIC):
+        return 'xlsx'
+    first_line = next((line for line in head.splitlines() if line.strip()), b'')
+    if first_line.lstrip().startswith(b'%'):
+        return 'berkeley'
+    return 'csv'
+
+
+def _column_index(reference):
+    """'C12' -> 2"""
+    index = 0
+    for char in re.match(r'[A-Z]+', reference).group():
+        index = index * 26 + ord(char) - ord('A') + 1
+    return index - 1
+
+
+def xlsx_rows(path):
+    """
+    Cell values of the first worksheet of an .xlsx file, one list per row.
+
+    Strings come back as str, numbers as float and empty cells as None. Uses only the
+    standard library, so reading a workbook does not need openpyxl.
+    """
+    with zipfile.ZipFile(path) as workbook:
+        strings = []
+        if 'xl/sharedStrings.xml' in workbook.namelist():
+            root = ET.fromstring(workbook.read('xl/sharedStrings.xml'))
+            strings = [''.join(node.itertext()) for node in root.iter(f'{SPREADSHEET_NS}si')]
+        sheet = sorted(name for name in workbook.namelist() if name.startswith('xl/worksheets/sheet'))[0]
+        with workbook.open(sheet) as source:
+            for _, row in ET.iterparse(source):
+                if row.tag != f'{SPREADSHEET_NS}row':
+                    continue
+                values = {}
+                for cell in row.iter(f'{SPREADSHEET_NS}c'):
+                    value = cell.find(f'{SPREADSHEET_NS}v')
+                    if value is None:
+                        continue
+                    kind = cell.get('t')
+                    if kind == 's':
+                        values[_column_index(cell.get('r'))] = strings[int(value.text)]
+                    elif kind in ('str', 'inlineStr'):
+                        values[_column_index(cell.get('r'))] = value.text
+                    else:
+                        values[_column_index(cell.get('r'))] = float(value.text)
+                row.clear()
+                yield [values.get(i) for i in range(max(values) + 1)] if values else []
+
+
+def _text_rows(path):
+    with open(path, encoding='utf-8', errors='replace') as f:
+        for line in f:
+            yield line.split()
+
+
+def parse_berkeley_rows(rows, file_format):
+    """
+    Typed anomaly table from the rows of a Berkeley Earth file (text or spreadsheet).
+
+    Rows starting with '%' are comments; a comment naming "Water Temperatures" starts the
+    second sea-ice section. Every other non-empty row must be a year, a month and up to
+    ten numbers ('NaN' allowed).
+
+    Returns:
+        (DataFrame with 'SeaIce' plus BERKELEY_COLUMNS, ParseReport)
+    """
+    section, sections = SEA_ICE_AIR, [SEA_ICE_AIR]
+    records, rows_seen, rejected = [], 0, 0
+    for row in rows:
+        rows_seen += 1
+        tokens = [value for value in row if value not in (None, '')]
+        if not tokens:
+            continue
+        if isinstance(tokens[0], str) and tokens[0].startswith('%'):
+            title = ' '.join(map(str, tokens))
+            if 'Inferred' in title:
+                section = SEA_ICE_WATER if 'Water' in title else SEA_ICE_AIR
+                if section not in sections:
+                    sections.append(section)
+            continue
+        try:
+            values = [float(token) for token in tokens[:len(BERKELEY_COLUMNS)]]
+        except ValueError:
+            rejected += 1
+            continue
+        if len(values) < 3 or not values[0].is_integer() or not 1 <= values[1] <= 12:
+            rejected += 1
+            continue
+        records.append([section] + values + [np.nan] * (len(BERKELEY_COLUMNS) - len(values)))
+
+    report = ParseReport(file_format, rows_seen, len(records), rejected, sections)
+    df = pd.DataFrame(records, columns=['SeaIce'] + BERKELEY_COLUMNS)
+    df = df.astype({'SeaIce': 'category', 'Year': 'int16', 'Month': 'int8',
+                    **{col: 'float32' for col in BERKELEY_COLUMNS[2:]}})
+    return df, report
+
+
+def read_berkeley_earth(path, file_format=None):
+    """
+    Parse a Berkeley Earth anomaly table saved as text or as an .xlsx workbook.
+
+    Raises:
+        ValueError: with the parse metrics, when no data rows were found or more than
+            MAX_REJECTED_FRACTION of them could not be parsed
+    """
+    file_format = file_format or sniff_format(path)
+    rows = xlsx_rows(path) if file_format == 'xlsx' else _text_rows(path)
+    df, report = parse_berkeley_rows(rows, file_format)
+    logging.info(f"{path}: {report.format}, {report.rows} rows, {report.data_rows} data rows, "
+                 f"{report.rejected} rejected, sections {report.sections}")
+    candidates = report.data_rows + report.rejected
+    if report.data_rows == 0 or report.rejected > MAX_REJECTED_FRACTION * candidates:
+        raise ValueError(f"{path} is not a usable Berkeley Earth table: {report._asdict()}")
+    return df
+
+
+def read_raw(path, **read_kwargs):
+    """
+    Parse a raw export according to its content rather than its extension.
+
+    CSV goes to pd.read_csv with `read_kwargs`; an .xlsx workbook or '%'-commented text
+    is parsed as a Berkeley Earth anomaly table.
+    """
+    file_format = sniff_format(path)
+    if file_format == 'csv':
+        return pd.read_csv(path, **read_kwargs)
+    return read_berkeley_earth(path, file_format)
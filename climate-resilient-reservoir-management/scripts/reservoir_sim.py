@@ -0,0 +1,286 @@
+import time
+import argparse
+import logging
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from store import read_table
+from sites import DEFAULT_RESERVOIR, reservoir
+from scenarios import SLIDER_AXES, simulate_scenarios, BASE_INFLOW, BASE_DEMAND
+
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# One cubic foot per second sustained for a day, in acre-feet
+CFS_DAY_TO_AF = 1.9835
+DISCHARGE_COLUMN = 'discharge_cfs'  # USGS daily mean discharge, normalised by data_processing.py
+# Extra evaporation per °C of warming, as acre-feet per day over the whole lake
+EVAPORATION_AF_PER_DEGREE = 120.0
+
+DAYS_PER_YEAR = 365
+MONTHS_PER_YEAR = 12
+# Calendar month (0-11) of each day of a 365-day year
+MONTH_OF_DAY = (pd.date_range('2001-01-01', periods=DAYS_PER_YEAR).month.to_numpy() - 1).astype(np.int64)
+
+Forcing = namedtuple('Forcing', ['initial_storage', 'inflow_af', 'release_af', 'start_date',
+                                 'capacity_af', 'min_pool_af'])
+SimulationResult = namedtuple('SimulationResult',
+                              ['final_storage', 'min_storage', 'shortage_days', 'shortage_af', 'spill_af', 'storage'])
+
+
+def day_of_year(dates):
+    """1-based day of a 365-day year (Feb 29 folded into Feb 28)"""
+    return dates.dt.dayofyear - ((dates.dt.is_leap_year) & (dates.dt.dayofyear > 59)).astype(int)
+
+
+def day_of_year_climatology(dates, values):
+    """Mean value for each of 365 days of the year, gaps interpolated"""
+    doy = day_of_year(dates)
+    climatology = pd.Series(np.asarray(values, dtype=np.float64)).groupby(doy.to_numpy()).mean()
+    climatology = climatology.reindex(range(1, DAYS_PER_YEAR + 1))
+    # Wrap around the new year so gaps at either end interpolate from the other side
+    wrapped = pd.concat([climatology, climatology, climatology]).reset_index(drop=True).interpolate()
+    return wrapped.iloc[DAYS_PER_YEAR:2 * DAYS_PER_YEAR].to_numpy()
+
+
+def load_forcing(site_id=DEFAULT_RESERVOIR):
+    """
+    Daily climatologies for one reservoir, from its partitions of the 'reservoir_storage'
+    and 'streamflow' store tables. Capacity and minimum pool come from the site registry.
+
+    Inflow is the USGS discharge of the reservoir's gauge in acre-feet per day. Release is
+    what the mass balance implies on days both series cover (inflow minus the storage
+    change, so it includes evaporation and diversions). Simulation starts the day after
+    the last observed storage.
+    """
+    site = reservoir(site_id)
+    observed = read_table('reservoir_storage', columns=['DATE', 'VALUE'],
+                          filters={'site': site.site_id}).dropna(subset=['DATE', 'VALUE']).sort_values('DATE')
+    streamflow = read_table('streamflow', columns=['datetime', DISCHARGE_COLUMN], filters={'site': site.gauge}).dropna()
+    if observed.empty:
+        raise ValueError(f"No storage data for {site.name} ({site.site_id}); add its CDEC export and run data_processing.py")
+
+    storage = observed.groupby(observed['DATE'].dt.normalize())['VALUE'].last()
+    inflow = streamflow.groupby(streamflow['datetime'].dt.normalize())[DISCHARGE_COLUMN].mean() * CFS_DAY_TO_AF
+    storage.index = storage.index.astype('datetime64[ns]')
+    inflow.index = inflow.index.astype('datetime64[ns]')
+
+    balance = pd.DataFrame({'storage': storage, 'inflow': inflow}).asfreq('D')
+    balance['release'] = (balance['inflow'] - balance['storage'].diff()).clip(lower=0)
+    balance = balance.dropna(subset=['inflow', 'release'])
+    if balance.empty:
+        raise ValueError("Storage and streamflow series do not overlap; cannot derive releases.")
+
+    dates = balance.index.to_series()
+    return Forcing(initial_storage=float(storage.iloc[-1]),
+                   inflow_af=day_of_year_climatology(dates, balance['inflow']),
+                   release_af=day_of_year_climatology(dates, balance['release']),
+                   start_date=storage.index[-1] + pd.Timedelta(days=1),
+                   capacity_af=site.capacity_af, min_pool_af=site.min_pool_af)
+
+
+def scenario_factors(precip_change, temp_increase, crop_area_increase, tech_adapt):
+    """
+    Per-scenario multipliers from the slider engine in scenarios.py.
+
+    Returns:
+        (inflow_factor, demand_factor, evaporation_af) arrays, one value per scenario
+    """
+    result = simulate_scenarios(np.ravel(precip_change), 0, np.ravel(crop_area_increase), np.ravel(tech_adapt))
+    inflow_factor = result.inflow / BASE_INFLOW
+    demand_factor = result.demand / BASE_DEMAND
+    evaporation = np.broadcast_to(np.ravel(temp_increase) * EVAPORATION_AF_PER_DEGREE, inflow_factor.shape)
+    return inflow_factor, demand_factor, np.ascontiguousarray(evaporation, dtype=np.float64)
+
+
+def _step_all(storage, inflow, release, evaporation, capacity, min_pool, stats):
+    """One day for every scenario at once"""
+    min_storage, shortage_days, shortage_af, spill_af = stats
+    available = storage + inflow - evaporation - min_pool
+    delivered = np.minimum(release, np.maximum(available, 0))
+    short = release - delivered
+    storage = storage + inflow - evaporation - delivered
+    spill = np.maximum(storage - capacity, 0)
+    storage = storage - spill
+    np.minimum(min_storage, storage, out=min_storage)
+    shortage_days += short > 0
+    shortage_af += short
+    spill_af += spill
+    return storage
+
+
+def _simulate_numpy(initial, inflow_af, release_af, inflow_factor, demand_factor, evaporation,
+                    monthly_inflow, monthly_evaporation, start_day, days, capacity, min_pool, storage_out):
+    storage = np.full(len(inflow_factor), initial, dtype=np.float64)
+    stats = (storage.copy(), np.zeros(len(storage), dtype=np.int32), np.zeros(len(storage)), np.zeros(len(storage)))
+    n_months = monthly_inflow.shape[1]
+    for t in range(days):
+        doy = (t + start_day) % DAYS_PER_YEAR
+        month = (((t + start_day) // DAYS_PER_YEAR) * MONTHS_PER_YEAR + MONTH_OF_DAY[doy]
+                 - MONTH_OF_DAY[start_day]) % n_months
+        storage = _step_all(storage, inflow_af[doy] * inflow_factor * monthly_inflow[:, month],
+                            release_af[doy] * demand_factor, evaporation + monthly_evaporation[:, month],
+                            capacity, min_pool, stats)
+        if storage_out is not None:
+            storage_out[:, t] = storage
+    return (storage,) + stats
+
+
+def _simulate_loop(initial, inflow_af, release_af, inflow_factor, demand_factor, evaporation,
+                   monthly_inflow, monthly_evaporation, month_of_day, start_day, days, capacity, min_pool,
+                   storage_out):
+    """Scenario-by-scenario loop; compiled with numba when it is installed"""
+    n = inflow_factor.shape[0]
+    n_months = monthly_inflow.shape[1]
+    final = np.empty(n)
+    min_storage = np.empty(n)
+    shortage_days = np.zeros(n, dtype=np.int32)
+    shortage_af = np.zeros(n)
+    spill_af = np.zeros(n)
+    keep = storage_out.shape[1] > 0
+    for s in range(n):
+        storage = initial
+        lowest = initial
+        for t in range(days):
+            doy = (t + start_day) % DAYS_PER_YEAR
+            month = (((t + start_day) // DAYS_PER_YEAR) * MONTHS_PER_YEAR + month_of_day[doy]
+                     - month_of_day[start_day]) % n_months
+            inflow = inflow_af[doy] * inflow_factor[s] * monthly_inflow[s, month]
+            release = release_af[doy] * demand_factor[s]
+            evaporated = evaporation[s] + monthly_evaporation[s, month]
+            available = max(storage + inflow - evaporated - min_pool, 0.0)
+            delivered = min(release, available)
+            if release > delivered:
+                shortage_days[s] += 1
+                shortage_af[s] += release - delivered
+            storage = storage + inflow - evaporated - delivered
+            if storage > capacity:
+                spill_af[s] += storage - capacity
+                storage = capacity
+            lowest = min(lowest, storage)
+            if keep:
+                storage_out[s, t] = storage
+        final[s] = storage
+        min_storage[s] = lowest
+    return final, min_storage, shortage_days, shortage_af, spill_af
+
+
+if njit is not None:
+    _simulate_loop = njit(cache=True)(_simulate_loop)
+
+
+def simulate(forcing, precip_change, temp_increase, crop_area_increase, tech_adapt, years=50,
+             capacity=None, min_pool=None, keep_storage=False, engine=None,
+             monthly_inflow=None, monthly_temperature=None):
+    """
+    Daily mass balance of the reservoir for many scenarios over a multi-year horizon.
+
+    Each day: storage += inflow - evaporation - release, with release curtailed so it
+    never draws storage below the minimum pool (the curtailed volume is a shortage) and
+    anything above capacity spilled. Starting at forcing.start_date, the forcing's
+    day-of-year inflow and release are repeated for every year; precipitation scales inflow, crop area and technology scale release and
+    warming adds evaporation, using the same responses as the dashboard sliders.
+
+    Args:
+        forcing: Forcing from load_forcing(), or one built from other series
+        precip_change, temp_increase, crop_area_increase, tech_adapt: Arrays (or scalars) of
+            slider values, broadcast to one value per scenario (or per monthly trace row)
+        years: Horizon in years of 365 days
+        capacity, min_pool: Acre-feet; default to the forcing's reservoir
+        keep_storage: Also return the (scenarios, days) float32 storage trajectories
+        engine: 'numba', 'numpy' or None for numba when it is installed
+        monthly_inflow: Optional (scenarios, months) inflow multipliers, e.g. a stochastic
+            precipitation trace; the k-th calendar month of the run (starting with the month
+            of forcing.start_date) uses column k modulo `months`
+        monthly_temperature: Optional (scenarios, months) temperature anomalies (°C) adding
+            evaporation on top of the temperature slider
+
+    Returns:
+        SimulationResult of per-scenario arrays (storage is None unless keep_storage)
+    """
+    precip_change, temp_increase, crop_area_increase, tech_adapt = np.broadcast_arrays(
+        *(np.atleast_1d(np.asarray(v, dtype=np.float64)) for v in
+          (precip_change, temp_increase, crop_area_increase, tech_adapt)))
+    inflow_factor, demand_factor, evaporation = scenario_factors(precip_change, temp_increase,
+                                                                 crop_area_increase, tech_adapt)
+    # One scenario with many traces (an ensemble) runs that scenario once per trace
+    n = len(inflow_factor)
+    for trace in (monthly_inflow, monthly_temperature):
+        if trace is not None and np.ndim(trace) == 2:
+            n = np.broadcast_shapes((n,), (np.shape(trace)[0],))[0]
+    inflow_factor, demand_factor, evaporation = (np.ascontiguousarray(np.broadcast_to(factor, (n,)), dtype=np.float64)
+                                                 for factor in (inflow_factor, demand_factor, evaporation))
+    monthly_inflow = np.ones((n, 1)) if monthly_inflow is None else monthly_inflow
+    monthly_temperature = np.zeros((n, 1)) if monthly_temperature is None else monthly_temperature
+    monthly_inflow = np.ascontiguousarray(np.broadcast_to(monthly_inflow, (n, np.shape(monthly_inflow)[-1])),
+                                          dtype=np.float64)
+    monthly_evaporation = np.ascontiguousarray(
+        np.broadcast_to(monthly_temperature, (n, np.shape(monthly_temperature)[-1])) * EVAPORATION_AF_PER_DEGREE,
+        dtype=np.float64)
+
+    capacity = forcing.capacity_af if capacity is None else capacity
+    min_pool = forcing.min_pool_af if min_pool is None else min_pool
+    days = years * DAYS_PER_YEAR
+    start_day = int(day_of_year(pd.Series([forcing.start_date])).iloc[0]) - 1
+    engine = engine or ('numba' if njit is not None else 'numpy')
+    if engine == 'numba' and njit is None:
+        raise ImportError("engine='numba' requires the numba package")
+
+    inflow_af = np.ascontiguousarray(forcing.inflow_af, dtype=np.float64)
+    release_af = np.ascontiguousarray(forcing.release_af, dtype=np.float64)
+    if engine == 'numba':
+        storage_out = np.empty((len(inflow_factor), days if keep_storage else 0), dtype=np.float32)
+        outputs = _simulate_loop(float(forcing.initial_storage), inflow_af, release_af, inflow_factor,
+                                 demand_factor, evaporation, monthly_inflow, monthly_evaporation, MONTH_OF_DAY,
+                                 start_day, days, float(capacity), float(min_pool), storage_out)
+    else:
+        storage_out = np.empty((len(inflow_factor), days), dtype=np.float32) if keep_storage else None
+        outputs = _simulate_numpy(float(forcing.initial_storage), inflow_af, release_af, inflow_factor,
+                                  demand_factor, evaporation, monthly_inflow, monthly_evaporation,
+                                  start_day, days, float(capacity), float(min_pool), storage_out)
+    return SimulationResult(*outputs, storage=storage_out if keep_storage else None)
+
+
+def random_scenarios(n, seed=42):
+    """n scenarios drawn uniformly from the dashboard slider ranges"""
+    rng = np.random.default_rng(seed)
+    return [rng.uniform(low, high, size=n) for low, high, _ in SLIDER_AXES.values()]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Simulate daily reservoir storage for many scenarios.')
+    parser.add_argument('--years', type=int, default=50, help='Horizon in years')
+    parser.add_argument('--scenarios', type=int, default=1000, help='Number of random slider scenarios')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--reservoir', default=DEFAULT_RESERVOIR, help='CDEC station ID of the reservoir (see sites.py)')
+    parser.add_argument('--engine', choices=['numba', 'numpy'], help='Default: numba when installed')
+    parser.add_argument('--output', help='Write per-scenario results to this .parquet or .csv file')
+    args = parser.parse_args()
+
+    forcing = load_forcing(args.reservoir)
+    logging.info(f"{reservoir(args.reservoir).name}: initial storage {forcing.initial_storage:,.0f} AF; "
+                 f"mean inflow {forcing.inflow_af.mean():,.0f} AF/day, release {forcing.release_af.mean():,.0f} AF/day")
+
+    scenarios = random_scenarios(args.scenarios, args.seed)
+    start = time.perf_counter()
+    result = simulate(forcing, *scenarios, years=args.years, engine=args.engine)
+    elapsed = time.perf_counter() - start
+    logging.info(f"Simulated {args.scenarios:,} scenarios × {args.years} years in {elapsed:.2f}s")
+    logging.info(f"Scenarios with shortages: {(result.shortage_days > 0).mean():.1%}; "
+                 f"median final storage {np.median(result.final_storage):,.0f} AF")
+
+    if args.output:
+        frame = pd.DataFrame(dict(zip(SLIDER_AXES, scenarios)))
+        for field in SimulationResult._fields[:-1]:
+            frame[field] = getattr(result, field)
+        if args.output.endswith('.csv'):
+            frame.to_csv(args.output, index=False)
+        else:
+            frame.to_parquet(args.output, index=False)
+        logging.info(f"✅ Results saved to {args.output}")
@@ -0,0 +1,112 @@
+import argparse
+import logging
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# (min, max, step) of each dashboard slider, in simulate_scenarios() argument order
+SLIDER_AXES = {
+    'precip_change': (-50, 50, 1),
+    'temp_increase': (0, 5, 0.1),
+    'crop_area_increase': (0, 100, 5),
+    'tech_adapt': (0, 100, 5),
+}
+
+# Index-style water balance (100 = today's inflow/outflow, 200 = today's demand)
+BASE_INFLOW = 100
+INFLOW_PER_PRECIP_PCT = 0.5
+BASE_OUTFLOW = 100
+OUTFLOW_PER_DEGREE = 1.2
+BASE_DEMAND = 200
+DEMAND_PER_CROP_PCT = 0.8
+
+ScenarioResult = namedtuple('ScenarioResult', ['inflow', 'outflow', 'demand', 'storage'])
+
+
+def simulate_scenarios(precip_change, temp_increase, crop_area_increase, tech_adapt, dtype=np.float64):
+    """
+    Evaluate any number of scenarios in one pass.
+
+    Arguments are scalars or arrays that broadcast against each other, so a full
+    sensitivity surface can be computed from four open axes (see scenario_grid)
+    without materialising every input combination.
+
+    Returns:
+        ScenarioResult of inflow, outflow, demand and storage arrays with the broadcast shape
+    """
+    precip_change, temp_increase, crop_area_increase, tech_adapt = (
+        np.asarray(values, dtype=dtype) for values in (precip_change, temp_increase, crop_area_increase, tech_adapt))
+
+    inflow = BASE_INFLOW + precip_change * INFLOW_PER_PRECIP_PCT
+    outflow = BASE_OUTFLOW - temp_increase * OUTFLOW_PER_DEGREE
+    demand = (BASE_DEMAND + crop_area_increase * DEMAND_PER_CROP_PCT) * (1 - tech_adapt / 100)
+    # storage = inflow - outflow - demand; broadcast_arrays gives every output the full shape
+    inflow, outflow, demand = np.broadcast_arrays(inflow, outflow, demand)
+    storage = inflow - outflow - demand
+    return ScenarioResult(inflow, outflow, demand, storage)
+
+
+def axis_values(minimum, maximum, step):
+    """Slider positions from `minimum` to `maximum` inclusive, with float noise (0.30000000000000004) rounded off"""
+    count = int(round((maximum - minimum) / step)) + 1
+    return np.round(minimum + step * np.arange(count), 10)
+
+
+def scenario_grid(axes=None):
+    """
+    Open (sparse) mesh over the slider axes.
+
+    Args:
+        axes: Dict like SLIDER_AXES of (min, max, step); defaults to the dashboard sliders
+
+    Returns:
+        (values, mesh) - the 1-D values of each axis, and the same arrays reshaped so they
+        broadcast to the full grid when passed to simulate_scenarios()
+    """
+    axes = axes or SLIDER_AXES
+    values = {name: axis_values(*axes[name]) for name in SLIDER_AXES}
+    mesh = np.meshgrid(*values.values(), indexing='ij', sparse=True)
+    return values, mesh
+
+
+def sweep(axes=None, dtype=np.float32):
+    """Simulate every combination of slider values; result arrays are indexed [precip, temp, crop, tech]"""
+    values, mesh = scenario_grid(axes)
+    return values, simulate_scenarios(*mesh, dtype=dtype)
+
+
+def sweep_to_frame(values, result, outputs=('storage',)):
+    """Flatten a sweep into one row per scenario"""
+    columns = np.meshgrid(*values.values(), indexing='ij')
+    frame = pd.DataFrame({name: column.ravel() for name, column in zip(values, columns)})
+    for output in outputs:
+        frame[output] = getattr(result, output).ravel()
+    return frame
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Sweep the scenario model over a grid of slider values.')
+    for name, (minimum, maximum, step) in SLIDER_AXES.items():
+        parser.add_argument(f"--{name.replace('_', '-')}", nargs=3, type=float, metavar=('MIN', 'MAX', 'STEP'),
+                            default=(minimum, maximum, step), help=f'Axis range (default {minimum} {maximum} {step})')
+    parser.add_argument('--outputs', nargs='+', default=['storage'], choices=ScenarioResult._fields,
+                        help='Result columns to write')
+    parser.add_argument('--output', help='Write the flattened sweep to this .parquet or .csv file')
+    args = parser.parse_args()
+
+    axes = {name: tuple(getattr(args, name)) for name in SLIDER_AXES}
+    values, result = sweep(axes)
+    logging.info(f"Simulated {result.storage.size:,} scenarios over axes "
+                 f"{ {name: len(axis) for name, axis in values.items()} }")
+    logging.info(f"Storage change ranges from {result.storage.min():.1f} to {result.storage.max():.1f}")
+
+    if args.output:
+        frame = sweep_to_frame(values, result, args.outputs)
+        if args.output.endswith('.csv'):
+            frame.to_csv(args.output, index=False)
+        else:
+            frame.to_parquet(args.output, index=False)
+        logging.info(f"✅ Sweep saved to {args.output}")
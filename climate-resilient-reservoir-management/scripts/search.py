@@ -0,0 +1,200 @@
+import numpy as np
+import os
+import json
+import time
+import hashlib
+import logging
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+from sklearn.base import clone
+from sklearn.metrics import mean_absolute_error
+from sklearn.model_selection import KFold, ParameterGrid, ParameterSampler
+
+SEARCH_CACHE_PATH = os.path.join('models', 'search_cache.json')
+
+
+class SearchCache:
+    """
+    Cross-validated scores keyed on (data hash, estimator, params, resources, folds).
+
+    Stored as JSON so repeated nightly runs on unchanged data skip configs that
+    were already evaluated.
+    """
+
+    def __init__(self, path=SEARCH_CACHE_PATH):
+        self.path = path
+        self._scores = {}
+        if path and os.path.exists(path):
+            with open(path) as f:
+                self._scores = json.load(f)
+
+    @staticmethod
+    def key(data_hash, params, n_rows, estimator, cv_key):
+        payload = json.dumps({'data': data_hash, 'params': params, 'rows': n_rows,
+                              'estimator': repr(estimator), 'cv': cv_key},
+                             sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def get(self, key):
+        return self._scores.get(key)
+
+    def put(self, key, result):
+        self._scores[key] = result
+
+    def save(self):
+        if not self.path:
+            return
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self._scores, f)
+        os.replace(tmp_path, self.path)
+
+
+def cv_config(cv, splits):
+    """
+    The splitter's settings plus a digest of the folds it produced.
+
+    repr() alone misses anything the splitter doesn't print (e.g. the dates behind
+    DateFolds), so the actual train/test indices are hashed as well.
+    """
+    digest = hashlib.sha256()
+    for train_idx, test_idx in splits:
+        digest.update(np.asarray(train_idx, dtype=np.int64).tobytes())
+        digest.update(b'|')
+        digest.update(np.asarray(test_idx, dtype=np.int64).tobytes())
+        digest.update(b';')
+    return {'splitter': repr(cv), 'folds': digest.hexdigest()}
+
+
+def evaluate_candidate(estimator, params, X, y, splits):
+    """Fit/score one parameter set over every fold; runs inside a worker process"""
+    started = time.process_time()
+    maes = []
+    for train_idx, test_idx in splits:
+        model = clone(estimator).set_params(**params)
+        model.fit(X.iloc[train_idx], y.iloc[train_idx])
+        maes.append(mean_absolute_error(y.iloc[test_idx], model.predict(X.iloc[test_idx])))
+    return {'mae': float(np.mean(maes)), 'cpu_seconds': time.process_time() - started}
+
+
+class BudgetedSearch:
+    """
+    Hyperparameter search with a wall-clock/CPU budget and a process pool.
+
+    Modes:
+        'grid'    - every combination of `param_space`
+        'random'  - `n_candidates` samples from `param_space`
+        'halving' - successive halving: sample `n_candidates`, score them on a small
+                    subset of rows, keep the best 1/`factor` and give the survivors
+                    `factor` times more rows, until one remains or the data runs out
+
+    Configs already in the cache are not re-evaluated. Once the wall-clock or CPU
+    budget is spent no new configs are started and the best scored so far wins.
+    """
+
+    def __init__(self, estimator, param_space, mode='halving', n_candidates=16, factor=3,
+                 min_rows=200, cv=None, n_workers=None, time_budget=None, cpu_budget=None,
+                 cache=None, random_state=42):
+        self.estimator = estimator
+        self.param_space = param_space
+        self.mode = mode
+        self.n_candidates = n_candidates
+        self.factor = factor
+        self.min_rows = min_rows
+        self.cv = cv or KFold(n_splits=3)
+        self.n_workers = n_workers or os.cpu_count()
+        self.time_budget = time_budget
+        self.cpu_budget = cpu_budget
+        self.cache = cache if cache is not None else SearchCache()
+        self.random_state = random_state
+        self.results_ = []
+
+    def _candidates(self):
+        if self.mode == 'grid':
+            return list(ParameterGrid(self.param_space))
+        n_total = len(ParameterGrid(self.param_space))
+        return list(ParameterSampler(self.param_space, n_iter=min(self.n_candidates, n_total),
+                                     random_state=self.random_state))
+
+    def _budget_left(self, started, cpu_used):
+        if self.time_budget is not None and time.monotonic() - started >= self.time_budget:
+            return False
+        if self.cpu_budget is not None and cpu_used >= self.cpu_budget:
+            return False
+        return True
+
+    def _score_round(self, pool, candidates, X, y, data_hash, started, cpu_used):
+        """Score `candidates` on (X, y); returns (scores aligned to candidates, cpu_used)"""
+        splits = list(self.cv.split(X, y))
+        cv_key = cv_config(self.cv, splits)
+        scores = [None] * len(candidates)
+        pending = {}
+        queue = list(enumerate(candidates))
+
+        while queue or pending:
+            while queue and len(pending) < self.n_workers and self._budget_left(started, cpu_used):
+                i, params = queue.pop(0)
+                key = SearchCache.key(data_hash, params, len(X), self.estimator, cv_key)
+                cached = self.cache.get(key)
+                if cached is not None:
+                    scores[i] = cached['mae']
+                    continue
+                future = pool.submit(evaluate_candidate, self.estimator, params, X, y, splits)
+                pending[future] = (i, key)
+            if not pending:
+                break
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                i, key = pending.pop(future)
+                result = future.result()
+                cpu_used += result['cpu_seconds']
+                scores[i] = result['mae']
+                self.cache.put(key, result)
+                self.results_.append({'params': candidates[i], 'rows': len(X), **result})
+        return scores, cpu_used
+
+    def fit(self, X, y, data_hash):
+        """
+        Run the search and return the best params.
+
+        The estimator itself is not refitted here; the caller fits the winner once
+        on its full training set.
+        """
+        started = time.monotonic()
+        cpu_used = 0.0
+        candidates = self._candidates()
+        rng = np.random.RandomState(self.random_state)
+
+        if self.mode == 'halving':
+            n_rows = max(self.min_rows, len(X) // (self.factor ** max(int(np.log(len(candidates)) / np.log(self.factor)), 0)))
+        else:
+            n_rows = len(X)
+
+        best_params, best_mae = None, np.inf
+        with ProcessPoolExecutor(max_workers=self.n_workers) as pool:
+            while candidates:
+                n_rows = min(n_rows, len(X))
+                rows = np.sort(rng.choice(len(X), size=n_rows, replace=False)) if n_rows < len(X) else np.arange(len(X))
+                scores, cpu_used = self._score_round(pool, candidates, X.iloc[rows], y.iloc[rows],
+                                                     data_hash, started, cpu_used)
+                scored = sorted((s, i) for i, s in enumerate(scores) if s is not None)
+                if not scored:
+                    break
+                best_mae, best_params = scored[0][0], candidates[scored[0][1]]
+                logging.info(f"Search round on {n_rows} rows: {len(scored)}/{len(candidates)} configs scored, "
+                             f"best MAE {best_mae:.2f} with {best_params}")
+
+                if self.mode != 'halving' or len(scored) == 1 or n_rows >= len(X) \
+                        or not self._budget_left(started, cpu_used):
+                    break
+                keep = max(1, len(scored) // self.factor)
+                candidates = [candidates[i] for _, i in scored[:keep]]
+                n_rows *= self.factor
+
+        self.cache.save()
+        self.best_params_, self.best_score_ = best_params, best_mae
+        logging.info(f"Search finished in {time.monotonic() - started:.1f}s wall, {cpu_used:.1f}s CPU")
+        if best_params is None:
+            raise RuntimeError("Search budget was exhausted before any configuration was scored")
+        return best_params
@@ -0,0 +1,64 @@
+import os
+from collections import namedtuple
+
+# Registry of the reservoirs and stream gauges the pipeline knows about. Adding a reservoir
+# is one entry here plus its CDEC export in data/raw/; every stage, loader and the model
+# runner look sites up here instead of hard-coding file names or column IDs.
+
+Reservoir = namedtuple('Reservoir', ['site_id', 'name', 'river', 'capacity_af', 'min_pool_af', 'sensor',
+                                     'raw_file', 'gauge'])
+Gauge = namedtuple('Gauge', ['site_id', 'name', 'raw_file'])
+
+RAW_DIR = 'data/raw'
+DEFAULT_RESERVOIR = 'SHA'
+
+# The only USGS extract checked in so far; it stands in as the inflow series for every
+# reservoir until each one has its own gauge file
+DEFAULT_GAUGE = '11446500'
+
+GAUGES = {
+    '11446500': Gauge('11446500', 'American River at Fair Oaks', 'streamflow_data.csv'),
+}
+
+# CDEC daily storage (sensor 15, acre-feet). Capacity and minimum pool are planning
+# defaults in acre-feet; raw_file defaults to cdec_<ID>.csv
+RESERVOIRS = {
+    'SHA': Reservoir('SHA', 'Shasta Lake', 'Sacramento River', 4_552_000, 550_000, 15,
+                     'shasta_reservoir.csv', DEFAULT_GAUGE),
+    'ORO': Reservoir('ORO', 'Lake Oroville', 'Feather River', 3_537_577, 852_000, 15, None, DEFAULT_GAUGE),
+    'FOL': Reservoir('FOL', 'Folsom Lake', 'American River', 977_000, 90_000, 15, None, DEFAULT_GAUGE),
+    'TRI': Reservoir('TRI', 'Trinity Lake', 'Trinity River', 2_447_650, 240_000, 15, None, DEFAULT_GAUGE),
+}
+
+
+def reservoir(site_id):
+    """Look up a reservoir by its CDEC station ID (case-insensitive)"""
+    try:
+        return RESERVOIRS[site_id.upper()]
+    except KeyError:
+        raise KeyError(f"Unknown reservoir '{site_id}'. Known: {', '.join(sorted(RESERVOIRS))}") from None
+
+
+def gauge(site_id):
+    try:
+        return GAUGES[site_id]
+    except KeyError:
+        raise KeyError(f"Unknown gauge '{site_id}'. Known: {', '.join(sorted(GAUGES))}") from None
+
+
+def reservoir_raw_path(site, raw_dir=RAW_DIR):
+    return os.path.join(raw_dir, site.raw_file or f'cdec_{site.site_id}.csv')
+
+
+def gauge_raw_path(site, raw_dir=RAW_DIR):
+    return os.path.join(raw_dir, site.raw_file or f'usgs_{site.site_id}.csv')
+
+
+def model_name(site_id):
+    """Name of a reservoir's storage model artifacts, e.g. 'reservoir_storage_sha'"""
+    return f'reservoir_storage_{reservoir(site_id).site_id.lower()}'
+
+
+def scenario_model_name(site_id):
+    """Name of a reservoir's slider -> storage model artifacts, e.g. 'scenario_storage_sha'"""
+    return f'scenario_storage_{reservoir(site_id).site_id.lower()}'
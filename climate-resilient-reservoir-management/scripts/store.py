@@ -0,0 +1,282 @@
+import pandas as pd
+import os
+import json
+import glob
+import logging
+from datetime import datetime, timezone
+
+# Typed, columnar store for the processed datasets. Every table lives in
+# data/store/<name>/ as one or more Parquet parts (requires pyarrow) and is
+# described by an entry in data/store/manifest.json. Partitioned tables keep
+# their parts in hive-style directories (data/store/<name>/site=SHA/year=2018/)
+# so readers can skip every partition a query doesn't need.
+STORE_DIR = 'data/store'
+MANIFEST_NAME = 'manifest.json'
+PART_TEMPLATE = 'part-{:05d}.parquet'
+
+
+def table_dir(name, store_dir=STORE_DIR):
+    return os.path.join(store_dir, name)
+
+
+def load_manifest(store_dir=STORE_DIR):
+    """Return the store manifest, or an empty one if nothing was written yet"""
+    path = os.path.join(store_dir, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return {'tables': {}}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_manifest(manifest, store_dir=STORE_DIR):
+    """Atomically replace the manifest so readers never see a partial file"""
+    os.makedirs(store_dir, exist_ok=True)
+    path = os.path.join(store_dir, MANIFEST_NAME)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def optimize_dtypes(df, date_columns=None, date_format=None, category_columns=None):
+    """
+    Convert a freshly parsed frame to compact, typed columns.
+
+    Args:
+        df: DataFrame as returned by pd.read_csv
+        date_columns: Columns to parse as datetimes
+        date_format: strptime format shared by all date columns (None lets pandas infer)
+        category_columns: Low-cardinality string columns such as station IDs
+
+    Returns:
+        New DataFrame with parsed dates, categoricals and downcast numerics
+    """
+    df = df.copy()
+    for col in date_columns or []:
+        df[col] = pd.to_datetime(df[col], format=date_format, errors='coerce')
+    # Projected reads may not carry every category column a stage knows about
+    for col in [col for col in category_columns or [] if col in df.columns]:
+        df[col] = df[col].astype('category')
+    for col in df.select_dtypes(include='integer').columns:
+        df[col] = pd.to_numeric(df[col], downcast='integer')
+    for col in df.select_dtypes(include='float').columns:
+        df[col] = pd.to_numeric(df[col], downcast='float')
+    return df
+
+
+def _record_table(name, parts, rows, columns, source, input_state, store_dir, **extra):
+    manifest = load_manifest(store_dir)
+    manifest['tables'][name] = dict({
+        'path': table_dir(name, store_dir),
+        'source': source,
+        'input': input_state,
+        'rows': int(rows),
+        'columns': columns,
+        'parts': parts,
+        'written_at': datetime.now(timezone.utc).isoformat(),
+    }, **extra)
+    save_manifest(manifest, store_dir)
+
+
+def write_table(df, name, source=None, input_state=None, store_dir=STORE_DIR):
+    """Replace table `name` with `df` and record it in the manifest"""
+    path = table_dir(name, store_dir)
+    os.makedirs(path, exist_ok=True)
+    for old_part in glob.glob(os.path.join(path, 'part-*.parquet')):
+        os.remove(old_part)
+
+    part_name = PART_TEMPLATE.format(0)
+    df.to_parquet(os.path.join(path, part_name), index=False)
+    columns = {col: str(dtype) for col, dtype in df.dtypes.items()}
+    _record_table(name, [part_name], len(df), columns, source, input_state, store_dir)
+    logging.info(f"Stored table '{name}' ({len(df)} rows, {df.memory_usage(deep=True).sum() / 1e6:.1f} MB in memory)")
+
+
+def append_table(df, name, input_state=None, store_dir=STORE_DIR):
+    """
+    Add `df` to an existing table as a new Parquet part.
+
+    The rows are cast to the column types recorded in the manifest so every part
+    shares one schema, whatever width the downcast picked for this batch.
+    """
+    entry = table_entry(name, store_dir)
+    if entry is None:
+        raise FileNotFoundError(f"Cannot append to '{name}': table is not in the store at {store_dir}.")
+
+    df = df[list(entry['columns'])].astype(entry['columns'])
+    part_name = PART_TEMPLATE.format(len(entry['parts']))
+    df.to_parquet(os.path.join(table_dir(name, store_dir), part_name), index=False)
+    _record_table(name, entry['parts'] + [part_name], entry['rows'] + len(df), entry['columns'],
+                  entry['source'], input_state, store_dir)
+    logging.info(f"Appended {len(df)} rows to table '{name}' as {part_name}")
+
+
+def table_entry(name, store_dir=STORE_DIR):
+    """Return the manifest entry for `name`, or None if the table doesn't exist"""
+    return load_manifest(store_dir)['tables'].get(name)
+
+
+def table_input_state(name, input_key=None, store_dir=STORE_DIR):
+    """Recorded input fingerprint of a table, or of one of its inputs (`input_key`) for a partitioned table"""
+    entry = table_entry(name, store_dir)
+    if entry is None:
+        return None
+    if input_key is None:
+        return entry['input']
+    return (entry['input'] or {}).get(input_key)
+
+
+def partition_values(part):
+    """{'site': 'SHA', 'year': '2018'} from a part path like 'site=SHA/year=2018/part-00000.parquet'"""
+    return dict(segment.split('=', 1) for segment in part.split('/')[:-1])
+
+
+def matches_filters(values, filters):
+    """
+    Whether a partition's values pass `filters`.
+
+    Each filter value is a scalar (equality), a list or set (membership) or a
+    (low, high) tuple (inclusive range; either end may be None). 'year' compares as int.
+    """
+    for key, wanted in (filters or {}).items():
+        value = values.get(key)
+        if value is None:
+            continue
+        if key == 'year':
+            value = int(value)
+        if isinstance(wanted, tuple):
+            low, high = wanted
+            if (low is not None and value < low) or (high is not None and value > high):
+                return False
+        elif isinstance(wanted, (list, set, frozenset)):
+            if value not in {int(w) if key == 'year' else str(w) for w in wanted}:
+                return False
+        elif value != (int(wanted) if key == 'year' else str(wanted)):
+            return False
+    return True
+
+
+def _partition_groups(df, partition_by):
+    """Yield (partition path, rows) for each partition in `df`; datetime columns partition by year"""
+    keys = []
+    for key, column in partition_by.items():
+        values = df[column]
+        keys.append((values.dt.year.astype('Int64') if pd.api.types.is_datetime64_any_dtype(values)
+                     else values.astype(str)).rename(key))
+    for values, rows in df.groupby(keys, observed=True, sort=True):
+        values = values if isinstance(values, tuple) else (values,)
+        yield '/'.join(f'{key}={value}' for key, value in zip(partition_by, values)), rows
+
+
+def _free_part_name(path, partition, taken):
+    """First part name in `partition` that is neither listed in `taken` nor already on disk"""
+    index = 0
+    while True:
+        part = f'{partition}/{PART_TEMPLATE.format(index)}'
+        if part not in taken and not os.path.exists(os.path.join(path, part)):
+            return part
+        index += 1
+
+
+def write_partitions(df, name, partition_by, replace=None, source=None, input_state=None, input_key=None,
+                     store_dir=STORE_DIR):
+    """
+    Write `df` into a partitioned table, one Parquet part per partition it touches.
+
+    New parts and the manifest are written before any replaced part is deleted, so a
+    failure part-way leaves the previous table readable.
+
+    Args:
+        df: Rows to write
+        name: Table name
+        partition_by: Ordered {partition key: column}, e.g. {'site': 'STATION_ID', 'year': 'DATE'};
+            datetime columns are partitioned by year. Rows with no value for a key are dropped.
+        replace: Filters (see matches_filters) selecting existing partitions to delete first,
+            e.g. {'site': 'SHA'} to rebuild one site and keep the others; None appends
+        input_state, input_key: Fingerprint recorded for this input (one of possibly many
+            raw files feeding the table)
+
+    Raises:
+        ValueError: if `df` lacks columns of the table's schema while other parts keep it
+    """
+    path = table_dir(name, store_dir)
+    entry = table_entry(name, store_dir)
+    stale = []
+    if entry is None or entry.get('partitioning') != list(partition_by):
+        entry = {'parts': [], 'part_rows': {}, 'input': {}, 'columns': None}
+        stale = [os.path.relpath(old_part, path).replace(os.sep, '/')
+                 for old_part in glob.glob(os.path.join(path, '**', '*.parquet'), recursive=True)]
+
+    parts, part_rows = list(entry['parts']), dict(entry['part_rows'])
+    if replace is not None:
+        for part in [part for part in parts if matches_filters(partition_values(part), replace)]:
+            stale.append(part)
+            parts.remove(part)
+            del part_rows[part]
+
+    # The schema is pinned by the first write; it may only change when nothing else keeps the old one
+    columns = entry['columns'] if parts else None
+    if columns is None:
+        columns = {col: str(dtype) for col, dtype in df.dtypes.items()}
+        if entry['columns'] is not None and columns != entry['columns']:
+            logging.info(f"Table '{name}' schema changes from {entry['columns']} to {columns}")
+    missing = [col for col in columns if col not in df.columns]
+    if missing:
+        raise ValueError(f"Rows for table '{name}' lack columns {missing} of its schema {list(columns)}; "
+                         f"project them the same way as the existing parts or rebuild the whole table")
+    df = df[list(columns)].astype(columns)
+
+    taken = set(entry['parts'])
+    for partition, rows in _partition_groups(df, partition_by):
+        part = _free_part_name(path, partition, taken)
+        os.makedirs(os.path.join(path, partition), exist_ok=True)
+        rows.to_parquet(os.path.join(path, part), index=False)
+        taken.add(part)
+        parts.append(part)
+        part_rows[part] = len(rows)
+
+    inputs = dict(entry['input'] or {})
+    if input_key is not None:
+        inputs[input_key] = input_state
+    _record_table(name, parts, sum(part_rows.values()), columns, source, inputs, store_dir,
+                  partitioning=list(partition_by), part_rows=part_rows)
+    # Only now is nothing referring to the replaced parts any more
+    for part in stale:
+        if part not in part_rows and os.path.exists(os.path.join(path, part)):
+            os.remove(os.path.join(path, part))
+    logging.info(f"Wrote {len(df)} rows to table '{name}' ({len(parts)} parts)")
+
+
+def read_table(name, columns=None, filters=None, store_dir=STORE_DIR):
+    """
+    Load table `name` (optionally only `columns`) from the store.
+
+    For a partitioned table, `filters` (see matches_filters), e.g. {'site': ['SHA', 'ORO'],
+    'year': (2018, None)}, selects partitions and only their files are read.
+    """
+    manifest = load_manifest(store_dir)
+    if name not in manifest['tables']:
+        raise FileNotFoundError(f"Table '{name}' is not in the store at {store_dir}. Run scripts/data_processing.py first.")
+    entry = manifest['tables'][name]
+    if not entry.get('partitioning'):
+        return pd.read_parquet(table_dir(name, store_dir), columns=columns)
+
+    parts = [part for part in entry['parts'] if matches_filters(partition_values(part), filters)]
+    dtypes = {col: dtype for col, dtype in entry['columns'].items() if columns is None or col in columns}
+    if not parts:
+        return pd.DataFrame({col: pd.Series(dtype=dtype) for col, dtype in dtypes.items()})
+    frames = [pd.read_parquet(os.path.join(table_dir(name, store_dir), part), columns=columns) for part in parts]
+    # Each part carries only its own categories; re-cast so the result has one categorical per column
+    return pd.concat(frames, ignore_index=True).astype(dtypes)
+
+
+def set_input_state(name, input_state, input_key=None, store_dir=STORE_DIR):
+    """Update the recorded input fingerprint of `name` (or of one of its inputs) without touching its data"""
+    manifest = load_manifest(store_dir)
+    if input_key is None:
+        manifest['tables'][name]['input'] = input_state
+    else:
+        inputs = manifest['tables'][name].get('input') or {}
+        inputs[input_key] = input_state
+        manifest['tables'][name]['input'] = inputs
+    save_manifest(manifest, store_dir)
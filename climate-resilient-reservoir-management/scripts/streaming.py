@@ -0,0 +1,117 @@
+import pandas as pd
+import csv
+import logging
+
+from store import write_table, append_table, write_partitions, set_input_state
+
+# Columns of the wide GHCN daily export that anything downstream actually uses
+GHCN_COLUMNS = ['STATION', 'DATE', 'PRCP', 'TAVG', 'TMAX', 'TMIN']
+GHCN_ELEMENTS = ['PRCP', 'TAVG', 'TMAX', 'TMIN']
+
+DEFAULT_MEMORY_LIMIT_MB = 256
+# pandas needs several times the final frame size while tokenizing a chunk
+PARSE_OVERHEAD = 4
+SAMPLE_ROWS = 1000
+
+
+def projection_indices(path, columns):
+    """
+    Positions of `columns` in the file's header.
+
+    CDEC exports repeat 'DATE' in the header, which name-based usecols can't
+    disambiguate, so the first occurrence of each name is selected by position.
+    """
+    with open(path, newline='') as f:
+        header = [name.strip() for name in next(csv.reader(f))]
+    missing = [col for col in columns if col not in header]
+    if missing:
+        raise KeyError(f"Columns {missing} not found in header of {path}")
+    return [header.index(col) for col in columns]
+
+
+def rows_per_chunk(path, usecols, memory_limit_mb=DEFAULT_MEMORY_LIMIT_MB, read_kwargs=None):
+    """Pick a chunk size whose parsed frame stays within `memory_limit_mb`"""
+    sample = pd.read_csv(path, usecols=usecols, nrows=SAMPLE_ROWS, **(read_kwargs or {}))
+    if sample.empty:
+        return SAMPLE_ROWS
+    bytes_per_row = sample.memory_usage(deep=True).sum() / len(sample)
+    rows = int(memory_limit_mb * 1e6 / (bytes_per_row * PARSE_OVERHEAD))
+    return max(rows, 1)
+
+
+def filter_chunk(chunk, date_column, station_column=None, stations=None, start=None, end=None, elements=None):
+    """Keep only the requested stations, date range and rows reporting any of `elements`"""
+    mask = pd.Series(True, index=chunk.index)
+    if stations:
+        mask &= chunk[station_column].isin(stations)
+    if start is not None:
+        mask &= chunk[date_column] >= pd.Timestamp(start)
+    if end is not None:
+        mask &= chunk[date_column] <= pd.Timestamp(end)
+    if elements:
+        mask &= chunk[elements].notna().any(axis=1)
+    return chunk[mask]
+
+
+def stream_to_store(path, table, clean, columns, date_column, station_column=None, dtypes=None,
+                    stations=None, start=None, end=None, elements=None,
+                    memory_limit_mb=DEFAULT_MEMORY_LIMIT_MB, read_kwargs=None, input_state=None,
+                    partition_by=None, replace=None, input_key=None):
+    """
+    Ingest a large CSV into the store in bounded-size chunks.
+
+    Only `columns` are parsed, each chunk is cleaned and filtered as it arrives and
+    then written as its own Parquet part, so peak memory is set by `memory_limit_mb`
+    rather than by the size of the file.
+
+    Args:
+        path: Raw CSV file
+        table: Store table to (re)build
+        clean: Stage cleaning function applied to every chunk
+        columns: Header names to project
+        date_column, station_column: Columns used by the date-range and station filters
+        dtypes: Optional read_csv dtypes; fix these for value columns so every chunk has one schema
+        stations, start, end, elements: Filters applied while streaming (None keeps everything)
+        memory_limit_mb: Approximate ceiling for one parsed chunk
+        read_kwargs: Extra read_csv arguments (e.g. skiprows)
+        input_state: Fingerprint recorded in the manifest once the table is complete
+        partition_by, replace, input_key: Write into a partitioned table instead (see
+            store.write_partitions); `replace` is applied before the first chunk only
+
+    Returns:
+        Number of rows written
+    """
+    read_kwargs = read_kwargs or {}
+    usecols = projection_indices(path, columns)
+    chunksize = rows_per_chunk(path, usecols, memory_limit_mb, read_kwargs)
+    logging.info(f"Streaming {path} into '{table}' in chunks of {chunksize} rows (~{memory_limit_mb} MB each)")
+
+    # read_csv returns positional usecols in file order
+    ordered_columns = [name for _, name in sorted(zip(usecols, columns))]
+    reader = pd.read_csv(path, usecols=usecols, header=0, names=ordered_columns, dtype=dtypes,
+                         chunksize=chunksize, **read_kwargs)
+
+    total_rows, chunks_read = 0, 0
+    for i, chunk in enumerate(reader):
+        chunks_read += 1
+        chunk = clean(chunk)
+        chunk = filter_chunk(chunk, date_column, station_column, stations, start, end, elements)
+        if partition_by is not None:
+            write_partitions(chunk, table, partition_by, replace=replace if i == 0 else None, source=path)
+        elif i == 0:
+            # The manifest only gets the input fingerprint once the whole file is in
+            write_table(chunk, table, source=path)
+        else:
+            append_table(chunk, table)
+        total_rows += len(chunk)
+
+    if chunks_read == 0:
+        # Header-only file: nothing was written, so there is no table entry to record the input on,
+        # and leaving the input unrecorded makes the next run retry the stage
+        logging.warning(f"{path} has no data rows; '{table}' was left unchanged")
+        return 0
+
+    if input_state is not None:
+        set_input_state(table, input_state, input_key)
+    logging.info(f"Streamed {total_rows} rows into '{table}'")
+    return total_rows
@@ -0,0 +1,174 @@
+"""
+Local stand-in for the CDEC, USGS NWIS and NOAA NCEI data services used by fetch.py.
+
+Run it and point the fetcher at it:
+
+    python scripts/stub_data_server.py --port 8766 --drop-first 2
+    python scripts/fetch.py --base-url http://127.0.0.1:8766 --noaa-stations USC00043157
+
+Every response is synthetic but deterministic for a given query, so Range requests
+return consistent slices. The first `fail_first` requests get a 503, which exercises the
+fetcher's retries; the `drop_first` responses after them close the connection halfway
+through the body, which exercises its resume path.
+
+Tests can start it in-process with serve_in_thread().
+"""
+
+import math
+import time
+import zlib
+import argparse
+import threading
+from datetime import date, timedelta
+from urllib.parse import urlsplit, parse_qs
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CDEC_PATH = '/dynamicapp/req/CSVDataServlet'
+USGS_PATH = '/nwis/dv/'
+NOAA_PATH = '/access/services/data/v1'
+# Every this many days a reading is missing, as in the real feeds
+MISSING_EVERY = 97
+
+
+def _days(start, end):
+    first, last = date.fromisoformat(start), date.fromisoformat(end)
+    return [first + timedelta(days=i) for i in range((last - first).days + 1)]
+
+
+def _seasonal(site, day, mean, amplitude):
+    """Annual cycle with a per-site phase, so different sites give different series"""
+    phase = zlib.crc32(site.encode()) % 365
+    return mean + amplitude * math.sin(2 * math.pi * (day.timetuple().tm_yday + phase) / 365)
+
+
+def cdec_body(query):
+    station, sensor = query['Stations'][0], query['SensorNums'][0]
+    lines = ['STATION_ID,DURATION,SENSOR_NUMBER,SENSOR_TYPE,DATE TIME,OBS DATE,VALUE,DATA_FLAG,UNITS']
+    for i, day in enumerate(_days(query['Start'][0], query['End'][0])):
+        stamp = f"{day:%Y%m%d} 0000"
+        value = '---' if i % MISSING_EVERY == MISSING_EVERY - 1 else f"{_seasonal(station, day, 3_000_000, 800_000):.0f}"
+        lines.append(f"{station},D,{sensor},STORAGE,{stamp},{stamp},{value}, ,AF")
+    return '\r\n'.join(lines) + '\r\n'
+
+
+def usgs_body(query):
+    site = query['sites'][0]
+    column = f"{zlib.crc32(site.encode()) % 90000 + 10000}_00060_00003"
+    lines = ['# Stub NWIS daily values', f'# Site {site}, discharge (cfs), daily mean',
+             '\t'.join(['agency_cd', 'site_no', 'datetime', column, f'{column}_cd']),
+             '\t'.join(['5s', '15s', '20d', '14n', '10s'])]
+    for i, day in enumerate(_days(query['startDT'][0], query['endDT'][0])):
+        value = '' if i % MISSING_EVERY == MISSING_EVERY - 1 else f"{_seasonal(site, day, 4000, 3000):.0f}"
+        lines.append('\t'.join(['USGS', site, day.isoformat(), value, 'A']))
+    return '\n'.join(lines) + '\n'
+
+
+def noaa_body(query):
+    station = query['stations'][0]
+    lines = ['"STATION","DATE","LATITUDE","LONGITUDE","ELEVATION","NAME","PRCP","TAVG","TMAX","TMIN"']
+    for day in _days(query['startDate'][0], query['endDate'][0]):
+        tavg = _seasonal(station, day, 55, 20)
+        rain = max(_seasonal(station + 'P', day, -0.1, 0.6), 0)
+        lines.append(f'"{station}","{day.isoformat()}","40.0","-122.0","500.0","STUB {station}, CA US",'
+                     f'"{rain:.2f}","{tavg:.0f}","{tavg + 12:.0f}","{tavg - 12:.0f}"')
+    return '\n'.join(lines) + '\n'
+
+
+ROUTES = {
+    CDEC_PATH: (cdec_body, 'text/csv'),
+    USGS_PATH: (usgs_body, 'text/plain'),
+    NOAA_PATH: (noaa_body, 'text/csv'),
+}
+
+
+def make_handler(delay=0.0, drop_first=0, fail_first=0):
+    """Handler class for the three services; see the module docstring for `drop_first` and `fail_first`"""
+    state = {'requests': 0, 'ranges': 0}
+    lock = threading.Lock()
+
+    class StubHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send_error(self, status, message):
+            data = message.encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'text/plain')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            url = urlsplit(self.path)
+            with lock:
+                state['requests'] += 1
+                failing = state['requests'] <= fail_first
+                dropping = fail_first < state['requests'] <= fail_first + drop_first
+            if failing:
+                return self._send_error(503, 'try again later')
+            if url.path not in ROUTES:
+                return self._send_error(404, 'not found')
+            build, content_type = ROUTES[url.path]
+            try:
+                body = build(parse_qs(url.query)).encode()
+            except (KeyError, ValueError) as error:
+                return self._send_error(400, f'bad query: {error}')
+
+            start = 0
+            requested = self.headers.get('Range', '')
+            if requested.startswith('bytes='):
+                start = int(requested[len('bytes='):].split('-')[0])
+                if start >= len(body):
+                    self.send_response(416)
+                    self.send_header('Content-Range', f'bytes */{len(body)}')
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                with lock:
+                    state['ranges'] += 1
+
+            time.sleep(delay)
+            self.send_response(206 if start else 200)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Accept-Ranges', 'bytes')
+            self.send_header('Content-Length', str(len(body) - start))
+            if start:
+                self.send_header('Content-Range', f'bytes {start}-{len(body) - 1}/{len(body)}')
+            self.end_headers()
+            payload = body[start:]
+            if dropping:
+                # Promise the whole body, send half and hang up
+                self.wfile.write(payload[:len(payload) // 2])
+                self.wfile.flush()
+                self.close_connection = True
+                return
+            self.wfile.write(payload)
+
+    StubHandler.state = state
+    return StubHandler
+
+
+def serve_in_thread(port=0, delay=0.0, drop_first=0, fail_first=0):
+    """
+    Start the stub on a background thread; returns (server, base_url). Call server.shutdown() when done.
+
+    server.RequestHandlerClass.state counts the requests and the Range requests served.
+    """
+    server = ThreadingHTTPServer(('127.0.0.1', port), make_handler(delay, drop_first, fail_first))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Local stand-in for the CDEC/USGS/NOAA data services.')
+    parser.add_argument('--port', type=int, default=8766)
+    parser.add_argument('--delay', type=float, default=0.0, help='Seconds to wait before each response')
+    parser.add_argument('--drop-first', type=int, default=0, help='Cut off the first N responses halfway')
+    parser.add_argument('--fail-first', type=int, default=0, help='Answer the first N requests with 503')
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(('127.0.0.1', args.port), make_handler(args.delay, args.drop_first, args.fail_first))
+    print(f"Stub data services on http://127.0.0.1:{args.port} ({CDEC_PATH}, {USGS_PATH}, {NOAA_PATH})")
+    server.serve_forever()
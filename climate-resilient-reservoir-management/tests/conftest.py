@@ -0,0 +1,9 @@
+import os
+import sys
+
+# scripts/ and dashboard/ modules import each other by bare name, as when run from the project root
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for folder in ('scripts', 'dashboard'):
+    path = os.path.join(ROOT, folder)
+    if path not in sys.path:
+        sys.path.insert(0, path)
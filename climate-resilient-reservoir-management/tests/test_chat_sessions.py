@@ -0,0 +1,31 @@
+from chat_sessions import ChatSessionStore, estimate_tokens
+
+
+def test_window_trims_summarized_turns_from_the_history():
+    store = ChatSessionStore(history_tokens=3 * estimate_tokens('x' * 40), summary_tokens=10000)
+    session_id = store.ensure()
+
+    ids = []
+    for turn in range(20):
+        ids.append(store.append(session_id, 'user', f'question {turn} ' + 'x' * 29))
+        ids.append(store.append(session_id, 'assistant', f'answer {turn} ' + 'x' * 31))
+        messages = store.window(session_id)
+
+    # Message IDs keep counting even though older turns have left the history
+    assert ids == list(range(1, 41))
+    assert len(store._sessions[session_id]['history']) == 3
+    assert [message['content'].split()[:2] for message in messages[1:]] == [
+        ['answer', '18'], ['question', '19'], ['answer', '19']]
+    assert messages[0]['role'] == 'system' and 'question 0' in messages[0]['content']
+
+
+def test_window_keeps_the_newest_message_even_when_it_is_over_budget():
+    store = ChatSessionStore(history_tokens=10)
+    session_id = store.ensure()
+    store.append(session_id, 'user', 'short')
+    store.append(session_id, 'user', 'x' * 400)
+
+    messages = store.window(session_id)
+
+    assert messages[-1]['content'] == 'x' * 400
+    assert len(store._sessions[session_id]['history']) == 1
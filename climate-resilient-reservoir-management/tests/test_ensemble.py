@@ -0,0 +1,52 @@
+import numpy as np
+import pandas as pd
+
+from ensemble import PERCENTILES, run_ensemble
+from reservoir_sim import DAYS_PER_YEAR, MONTHS_PER_YEAR, Forcing, simulate
+
+
+def make_forcing():
+    days = np.arange(DAYS_PER_YEAR)
+    inflow = 6000 + 4000 * np.sin(2 * np.pi * days / DAYS_PER_YEAR)
+    return Forcing(initial_storage=3_000_000.0, inflow_af=inflow, release_af=np.full(DAYS_PER_YEAR, 5500.0),
+                   start_date=pd.Timestamp('2024-10-01'), capacity_af=4_552_000.0, min_pool_af=90_000.0)
+
+
+def make_history(years=8, seed=0):
+    rng = np.random.default_rng(seed)
+    return rng.uniform(0.4, 1.6, size=(years, MONTHS_PER_YEAR)), rng.normal(0, 1, size=(years, MONTHS_PER_YEAR))
+
+
+def test_simulate_runs_one_scenario_over_many_traces():
+    traces = np.random.default_rng(1).uniform(0.5, 1.5, size=(7, 3 * MONTHS_PER_YEAR))
+    result = simulate(make_forcing(), 10, 1.0, 5, 20, years=2, keep_storage=True, engine='numpy',
+                      monthly_inflow=traces, monthly_temperature=np.zeros_like(traces))
+    assert result.final_storage.shape == (7,)
+    assert result.storage.shape == (7, 2 * DAYS_PER_YEAR)
+    # Different traces give different trajectories
+    assert len(np.unique(result.final_storage)) > 1
+
+
+def test_run_ensemble_yields_bands_for_every_member():
+    members, years = 24, 2
+    progress = list(run_ensemble((0, 1.0, 0, 0), members=members, years=years, forcing=make_forcing(),
+                                 history=make_history(), n_workers=2, chunk_size=8))
+
+    assert [p.done for p in progress] == [8, 16, 24]
+    final = progress[-1]
+    assert final.total == members
+    assert len(final.months) == years * MONTHS_PER_YEAR
+    assert final.months[0] == pd.Timestamp('2024-10-01')
+    assert set(final.bands) == set(PERCENTILES)
+    for band in final.bands.values():
+        assert band.shape == (len(final.months),)
+    assert np.all(final.bands[5] <= final.bands[50]) and np.all(final.bands[50] <= final.bands[95])
+    assert np.all(final.bands[95] <= make_forcing().capacity_af)
+
+
+def test_run_ensemble_is_reproducible_for_a_seed():
+    kwargs = dict(members=10, years=1, forcing=make_forcing(), history=make_history(), n_workers=1, chunk_size=5)
+    first = list(run_ensemble((-10, 2.0, 0, 0), seed=3, **kwargs))[-1]
+    second = list(run_ensemble((-10, 2.0, 0, 0), seed=3, **kwargs))[-1]
+    for p in PERCENTILES:
+        np.testing.assert_allclose(first.bands[p], second.bands[p])
@@ -0,0 +1,145 @@
+import csv
+import asyncio
+import os
+import shutil
+import urllib.error
+import urllib.request
+
+import pytest
+
+import fetch
+from fetch import (FetchResult, cdec_job, usgs_job, noaa_job, download, fetch_all, finalize, partial_path,
+                   PRECIP_RAW_PATH)
+from sites import reservoir, gauge, reservoir_raw_path, gauge_raw_path
+from stub_data_server import serve_in_thread
+
+START, END = '2022-01-01', '2022-12-31'
+NOAA_STATIONS = ['USC00043157', 'USW00023232']
+
+
+@pytest.fixture(autouse=True)
+def workdir(tmp_path, monkeypatch):
+    # Raw and download paths are relative to the project root, as when the scripts run from it
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(fetch, 'RETRY_BACKOFF', 0)
+    return tmp_path
+
+
+@pytest.fixture
+def stub():
+    servers = []
+
+    def start(**options):
+        server, base_url = serve_in_thread(**options)
+        servers.append(server)
+        return server.RequestHandlerClass.state, base_url
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def full_body(url):
+    with urllib.request.urlopen(url) as response:
+        return response.read()
+
+
+def all_jobs(base_url):
+    return ([cdec_job(reservoir('SHA'), START, END, base_url), usgs_job(gauge('11446500'), START, END, base_url)]
+            + [noaa_job(station, START, END, base_url) for station in NOAA_STATIONS])
+
+
+def test_fetch_all_resumes_a_dropped_connection(stub):
+    state, base_url = stub(drop_first=1)
+    job = all_jobs(base_url)[0]
+
+    [result] = asyncio.run(fetch_all([job]))
+
+    assert result.error is None and result.resumed
+    assert state['requests'] == 2 and state['ranges'] == 1
+    with open(job.path, 'rb') as f:
+        assert f.read() == full_body(job.url)
+    # The reported size is the whole file, not just the bytes received after the resume
+    assert result.bytes == os.path.getsize(job.path)
+    assert not os.path.exists(partial_path(job.url, job.path))
+
+
+def test_download_retries_server_errors(stub):
+    state, base_url = stub(fail_first=2)
+    job = all_jobs(base_url)[0]
+
+    size, resumed = download(job.url, job.path, retries=2)
+
+    assert state['requests'] == 3
+    assert not resumed
+    assert size == len(full_body(job.url))
+
+
+def test_download_gives_up_after_its_retries(stub):
+    _, base_url = stub(fail_first=10)
+    job = all_jobs(base_url)[0]
+
+    with pytest.raises(urllib.error.HTTPError) as error:
+        download(job.url, job.path, retries=1)
+    assert error.value.code == 503
+    assert not os.path.exists(job.path)
+
+
+def test_download_accepts_a_complete_partial_file(stub):
+    state, base_url = stub()
+    job = all_jobs(base_url)[0]
+    download(job.url, job.path)
+    body = open(job.path, 'rb').read()
+
+    # Leave the whole body as the partial file of an interrupted run: the Range request gets a 416
+    shutil.move(job.path, partial_path(job.url, job.path))
+
+    size, resumed = download(job.url, job.path)
+
+    assert resumed and size == len(body)
+    assert open(job.path, 'rb').read() == body
+    assert state['ranges'] == 0
+
+
+def test_fetch_and_finalize_write_the_stage_layouts(stub):
+    _, base_url = stub(drop_first=3)
+    results = asyncio.run(fetch_all(all_jobs(base_url)))
+    assert [result.error for result in results] == [None] * 4
+
+    written = finalize(results)
+
+    cdec_path = reservoir_raw_path(reservoir('SHA'))
+    usgs_path = gauge_raw_path(gauge('11446500'))
+    assert written == [cdec_path, usgs_path, PRECIP_RAW_PATH]
+
+    with open(cdec_path, newline='') as f:
+        rows = list(csv.reader(f))
+    assert rows[0] == ['STATION_ID', 'DURATION', 'SENSOR_NUMBER', 'SENSOR_TYPE', 'DATE', 'VALUE', 'DATA_FLAG', 'UNITS']
+    assert len(rows) == 1 + 365
+    assert rows[1][:5] == ['SHA', 'D', '15', 'STORAGE', '20220101']
+    # '---' (missing) readings become empty values
+    assert '---' not in {row[5] for row in rows[1:]} and '' in {row[5] for row in rows[1:]}
+
+    with open(usgs_path, newline='') as f:
+        rows = list(csv.reader(f))
+    assert rows[0][:3] == ['agency_cd', 'site_no', 'datetime']
+    assert rows[1][:3] == ['5s', '15s', '20d']
+    assert rows[2][2] == '01-01-2022' and len(rows) == 2 + 365
+
+    with open(PRECIP_RAW_PATH, newline='') as f:
+        rows = list(csv.DictReader(f))
+    assert list(rows[0])[:6] == fetch.NOAA_LEADING_COLUMNS
+    assert {'PRCP', 'TAVG', 'TMAX', 'TMIN'} <= set(rows[0])
+    assert sorted({row['STATION'] for row in rows}) == NOAA_STATIONS
+    assert rows[0]['DATE'] == '01-01-2022' and len(rows) == 2 * 365
+
+
+def test_finalize_keeps_the_precipitation_export_when_a_station_fails(stub):
+    _, base_url = stub()
+    jobs = all_jobs(base_url)[2:]
+    results = asyncio.run(fetch_all(jobs))
+    results[1] = FetchResult(results[1].job, 0, False, 0.0, ConnectionError('dropped'))
+
+    assert finalize(results) == []
+    assert not os.path.exists(PRECIP_RAW_PATH)
@@ -0,0 +1,113 @@
+import threading
+import time
+
+import pytest
+import requests
+
+from llm_client import LLMClient, JobQueue
+from stub_llm_server import serve_in_thread
+
+PAYLOAD = {'model': 'stub-model', 'messages': [{'role': 'user', 'content': 'How full is Shasta?'}]}
+REPLY = 'Stub reply to: How full is Shasta?'
+
+
+@pytest.fixture
+def stub():
+    servers = []
+
+    def start(**options):
+        server, api_url = serve_in_thread(**options)
+        servers.append(server)
+        return server.RequestHandlerClass.state, api_url
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def client(api_url, **options):
+    return LLMClient(api_url=api_url, api_key='test', backoff_factor=0, **options)
+
+
+def wait_for(queue, job_id, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        status, value = queue.poll(job_id)
+        if status != 'pending':
+            return status, value
+        time.sleep(0.01)
+    raise TimeoutError(job_id)
+
+
+def test_complete_returns_the_assistant_message(stub):
+    state, api_url = stub()
+
+    assert client(api_url).complete(PAYLOAD) == REPLY
+    assert state['requests'] == 1
+
+
+def test_stream_yields_the_reply_word_by_word(stub):
+    _, api_url = stub()
+
+    chunks = list(client(api_url).stream(PAYLOAD))
+
+    assert len(chunks) == len(REPLY.split(' '))
+    assert ''.join(chunks) == REPLY
+
+
+def test_complete_retries_server_errors(stub):
+    state, api_url = stub(fail_first=2)
+
+    assert client(api_url, max_retries=2).complete(PAYLOAD) == REPLY
+    assert state['requests'] == 3
+
+
+def test_complete_gives_up_after_its_retries(stub):
+    state, api_url = stub(fail_first=10)
+
+    with pytest.raises(requests.HTTPError) as error:
+        client(api_url, max_retries=1).complete(PAYLOAD)
+    assert error.value.response.status_code == 503
+    assert state['requests'] == 2
+
+
+def test_job_queue_polls_a_streaming_job_to_completion(stub):
+    _, api_url = stub()
+    queue = JobQueue(max_workers=1)
+
+    job_id = queue.submit_stream(client(api_url).stream, PAYLOAD)
+
+    assert wait_for(queue, job_id) == ('done', REPLY)
+    # A finished job is dropped once its result has been read
+    assert queue.poll(job_id) == ('missing', None)
+
+
+def test_job_queue_cancels_a_queued_job(stub):
+    _, api_url = stub()
+    queue = JobQueue(max_workers=1)
+    release = threading.Event()
+    blocker = queue.submit(release.wait)
+
+    # The only worker is busy, so this call is still queued when it is cancelled
+    job_id = queue.submit(client(api_url).complete, PAYLOAD)
+    assert queue.poll(job_id) == ('pending', None)
+    assert queue.cancel(job_id) is None
+    assert queue.poll(job_id) == ('missing', None)
+
+    release.set()
+    assert wait_for(queue, blocker) == ('done', True)
+
+
+def test_job_queue_cancels_a_running_stream(stub):
+    state, api_url = stub(delay=2.0)
+    queue = JobQueue(max_workers=1)
+
+    job_id = queue.submit_stream(client(api_url).stream, PAYLOAD)
+    while not queue.poll(job_id)[1]:
+        time.sleep(0.01)
+    partial = queue.cancel(job_id)
+
+    assert partial and REPLY.startswith(partial) and partial != REPLY
+    assert queue.poll(job_id) == ('missing', None)
+    assert state['requests'] == 1
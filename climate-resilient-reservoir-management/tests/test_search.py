@@ -0,0 +1,46 @@
+import numpy as np
+import pandas as pd
+from sklearn.linear_model import Ridge
+from sklearn.model_selection import KFold
+
+from search import BudgetedSearch, SearchCache
+
+PARAM_GRID = {'alpha': [0.1, 1.0, 10.0]}
+
+
+def make_frame(rows=120, seed=0):
+    rng = np.random.default_rng(seed)
+    X = pd.DataFrame(rng.normal(size=(rows, 3)), columns=['a', 'b', 'c'])
+    y = pd.Series(X['a'] * 2 - X['b'] + rng.normal(scale=0.1, size=rows))
+    return X, y
+
+
+def run_search(cache_path, estimator=None, cv=None):
+    search = BudgetedSearch(estimator or Ridge(), PARAM_GRID, mode='grid', cv=cv or KFold(n_splits=3),
+                            n_workers=1, cache=SearchCache(cache_path))
+    best = search.fit(*make_frame(), data_hash='frame-v1')
+    return search, best
+
+
+def test_second_search_is_served_from_the_cache(tmp_path):
+    cache_path = str(tmp_path / 'search_cache.json')
+    first, best = run_search(cache_path)
+    assert len(first.results_) == len(PARAM_GRID['alpha'])
+
+    second, cached_best = run_search(cache_path)
+
+    # Every config was scored by the first run, so nothing is evaluated again
+    assert second.results_ == []
+    assert cached_best == best
+    assert second.best_score_ == first.best_score_
+
+
+def test_cache_misses_when_the_estimator_or_folds_change(tmp_path):
+    cache_path = str(tmp_path / 'search_cache.json')
+    run_search(cache_path)
+
+    other_estimator, _ = run_search(cache_path, estimator=Ridge(fit_intercept=False))
+    other_folds, _ = run_search(cache_path, cv=KFold(n_splits=4))
+
+    assert len(other_estimator.results_) == len(PARAM_GRID['alpha'])
+    assert len(other_folds.results_) == len(PARAM_GRID['alpha'])